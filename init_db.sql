@@ -1,9 +1,6 @@
 CREATE DATABASE IF NOT EXISTS syslogs;
-USE syslogs;
 
-CREATE TABLE IF NOT EXISTS stats (
-  id BIGINT AUTO_INCREMENT PRIMARY KEY,
-  timestamp DATETIME NOT NULL,
-  cpu_usage DOUBLE,
-  memory_usage DOUBLE
-);
\ No newline at end of file
+-- Tables are created and upgraded by the versioned migration tool, the single
+-- source of the schema (the mysql role runs it on every deploy):
+--   DB_USER=root DB_PASS=... python3 roles/mysql/files/migrate_schema.py migrate
+--   python3 roles/mysql/files/migrate_schema.py status
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations for the syslogs database (single source of the DDL).
+
+  migrate_schema.py migrate [--target N]  -> apply pending migrations in order
+  migrate_schema.py status                -> applied / pending versions
+  migrate_schema.py measure               -> bytes per row and range-scan time of
+                                             stats vs stats_old (kept after v2)
+  migrate_schema.py drop-old              -> drop stats_old once you are happy
+
+Versions:
+  1  baseline: hosts, wide stats (host + spread columns), metrics, metric_values,
+     process_stats, 1m/1h/1d rollups. Idempotent over any older hand-made or
+     role-created stats table (INT/FLOAT or BIGINT/DOUBLE).
+  2  compact stats: epoch seconds as INT UNSIGNED, percentages as SMALLINT
+     UNSIGNED hundredths, clustered PRIMARY KEY (host_id, ts, id). The old
+     column names stay readable as VIRTUAL columns (no storage). Rows are copied
+     online in id batches while agents keep writing, then the tables are swapped
+     with one atomic RENAME; the old table is kept as stats_old.
+
+The console, /api/export and rollup.py read the v2 columns, so v2 is the
+lowest version the applications run against (roles/mysql refuses a lower
+stats_schema_version); --target 1 only stages a migration. The agent
+(log_stats.py) writes either layout, so it keeps writing during the copy.
+"""
+import os
+import sys
+import time
+import argparse
+from datetime import datetime
+
+import pymysql
+
+import stats_partitions
+
+DB_HOST = os.getenv("DB_HOST", "127.0.0.1")
+DB_USER = os.getenv("DB_USER", "root")
+DB_PASS = os.getenv("DB_PASS", "")
+DB_NAME = os.getenv("DB_NAME", "syslogs")
+
+COPY_BATCH = int(os.getenv("COPY_BATCH", "50000"))
+COPY_PAUSE = float(os.getenv("COPY_PAUSE", "0.05"))  # seconds between batches, keeps the copy polite
+
+BASELINE = [
+    # one row per reporting agent; stats rows reference it by a 2-byte id
+    """CREATE TABLE IF NOT EXISTS hosts (
+        id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        first_seen DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE KEY uq_name (name)
+    )""",
+    """CREATE TABLE IF NOT EXISTS stats (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        host_id SMALLINT UNSIGNED NOT NULL DEFAULT 0,
+        timestamp DATETIME NOT NULL,
+        cpu_usage DOUBLE,
+        memory_usage DOUBLE,
+        cpu_min FLOAT, cpu_max FLOAT, cpu_last FLOAT,
+        mem_min FLOAT, mem_max FLOAT, mem_last FLOAT,
+        INDEX idx_host_ts (host_id, timestamp)
+    )""",
+    # dictionary for metric_values; extra agent metrics, one row per value,
+    # clustered by (host, metric, time) so one series is a contiguous range
+    """CREATE TABLE IF NOT EXISTS metrics (
+        id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(64) NOT NULL,
+        UNIQUE KEY uq_name (name)
+    )""",
+    """CREATE TABLE IF NOT EXISTS metric_values (
+        host_id SMALLINT UNSIGNED NOT NULL,
+        metric_id SMALLINT UNSIGNED NOT NULL,
+        timestamp DATETIME NOT NULL,
+        value FLOAT,
+        PRIMARY KEY (host_id, metric_id, timestamp)
+    )""",
+    # optional top-N processes by CPU and RSS per stored row (agent TOP_PROCESSES)
+    """CREATE TABLE IF NOT EXISTS process_stats (
+        host_id SMALLINT UNSIGNED NOT NULL,
+        timestamp DATETIME NOT NULL,
+        pid INT UNSIGNED NOT NULL,
+        name VARCHAR(32) NOT NULL,
+        cpu_pct FLOAT,
+        rss_kb INT UNSIGNED,
+        PRIMARY KEY (host_id, timestamp, pid)
+    )""",
+    # rollups maintained by rollup.py from a stats.id high-water mark
+    """CREATE TABLE IF NOT EXISTS stats_1m (
+        host_id SMALLINT UNSIGNED NOT NULL,
+        bucket DATETIME NOT NULL,
+        n INT UNSIGNED NOT NULL,
+        cpu_min FLOAT, cpu_max FLOAT, cpu_sum DOUBLE, cpu_sumsq DOUBLE,
+        mem_min FLOAT, mem_max FLOAT, mem_sum DOUBLE, mem_sumsq DOUBLE,
+        PRIMARY KEY (host_id, bucket),
+        INDEX idx_bucket (bucket)
+    )""",
+    "CREATE TABLE IF NOT EXISTS stats_1h LIKE stats_1m",
+    "CREATE TABLE IF NOT EXISTS stats_1d LIKE stats_1m",
+    """CREATE TABLE IF NOT EXISTS rollup_state (
+        name VARCHAR(32) PRIMARY KEY,
+        last_id BIGINT NOT NULL
+    )""",
+]
+
+# columns older stats tables may lack: (column, definition)
+BASELINE_STATS_COLUMNS = [
+    ("host_id", "SMALLINT UNSIGNED NOT NULL DEFAULT 0 AFTER id"),
+    ("cpu_min", "FLOAT"), ("cpu_max", "FLOAT"), ("cpu_last", "FLOAT"),
+    ("mem_min", "FLOAT"), ("mem_max", "FLOAT"), ("mem_last", "FLOAT"),
+]
+
+SPREAD = ("cpu_min", "cpu_max", "cpu_last", "mem_min", "mem_max", "mem_last")
+
+# ~26 bytes of row data instead of ~55; id stays (secondary key) for the
+# rollup high-water mark, and id in the primary key keeps same-second rows apart
+COMPACT_STATS = """
+    CREATE TABLE {name} (
+        host_id SMALLINT UNSIGNED NOT NULL DEFAULT 0,
+        ts INT UNSIGNED NOT NULL,
+        id INT UNSIGNED NOT NULL AUTO_INCREMENT,
+        cpu_x100 SMALLINT UNSIGNED, mem_x100 SMALLINT UNSIGNED,
+        cpu_min_x100 SMALLINT UNSIGNED, cpu_max_x100 SMALLINT UNSIGNED, cpu_last_x100 SMALLINT UNSIGNED,
+        mem_min_x100 SMALLINT UNSIGNED, mem_max_x100 SMALLINT UNSIGNED, mem_last_x100 SMALLINT UNSIGNED,
+        timestamp DATETIME AS ('1970-01-01' + INTERVAL ts SECOND) VIRTUAL,
+        cpu_usage DOUBLE AS (cpu_x100 / 100) VIRTUAL,
+        memory_usage DOUBLE AS (mem_x100 / 100) VIRTUAL,
+        {spread_virtual},
+        PRIMARY KEY (host_id, ts, id),
+        KEY idx_id (id),
+        KEY idx_ts (ts)
+    )
+"""
+
+COPY_SQL = """
+    INSERT INTO {target} (id, host_id, ts, cpu_x100, mem_x100, {spread_x100})
+    SELECT id, host_id, TIMESTAMPDIFF(SECOND, '1970-01-01', timestamp),
+           ROUND(cpu_usage * 100), ROUND(memory_usage * 100), {spread_round}
+    FROM {source}
+    WHERE id > %s AND id <= %s AND timestamp IS NOT NULL
+"""
+
+
+def has_column(cur, table, column):
+    cur.execute("SELECT COUNT(*) AS n FROM information_schema.COLUMNS "
+                "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND COLUMN_NAME = %s", (DB_NAME, table, column))
+    return cur.fetchone()["n"] > 0
+
+
+def has_index(cur, table, index):
+    cur.execute("SELECT COUNT(*) AS n FROM information_schema.STATISTICS "
+                "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND INDEX_NAME = %s", (DB_NAME, table, index))
+    return cur.fetchone()["n"] > 0
+
+
+def has_table(cur, table):
+    cur.execute("SELECT COUNT(*) AS n FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s", (DB_NAME, table))
+    return cur.fetchone()["n"] > 0
+
+
+def max_id(cur, table):
+    cur.execute(f"SELECT COALESCE(MAX(id), 0) AS m FROM {table}")
+    return int(cur.fetchone()["m"])
+
+
+def baseline(cur):
+    for ddl in BASELINE:
+        cur.execute(ddl)
+    if has_column(cur, "stats", "ts"):
+        return  # already compact (v2 applied by hand)
+    missing = [f"ADD COLUMN {col} {ddl}" for col, ddl in BASELINE_STATS_COLUMNS if not has_column(cur, "stats", col)]
+    if not has_index(cur, "stats", "idx_host_ts"):
+        missing.append("ADD INDEX idx_host_ts (host_id, timestamp)")
+    if missing:
+        cur.execute(f"ALTER TABLE stats {', '.join(missing)}")
+
+
+def copy_range(cur, source, target, lo, hi):
+    """Copy wide rows with lo < id <= hi from source into the compact target in COPY_BATCH slices."""
+    sql = COPY_SQL.format(source=source, target=target,
+                          spread_x100=", ".join(f"{c}_x100" for c in SPREAD),
+                          spread_round=", ".join(f"ROUND({c} * 100)" for c in SPREAD))
+    copied = 0
+    while lo < hi:
+        top = min(hi, lo + COPY_BATCH)
+        cur.execute(sql, (lo, top))
+        copied += cur.rowcount
+        lo = top
+        time.sleep(COPY_PAUSE)
+    return copied
+
+
+def compact_stats(cur):
+    if has_column(cur, "stats", "ts"):
+        return
+    if has_table(cur, "stats_old"):
+        sys.exit("stats_old exists from an earlier run; inspect it and drop it first")
+
+    cur.execute("DROP TABLE IF EXISTS stats_new")
+    spread_virtual = ",\n        ".join(f"{c} DOUBLE AS ({c}_x100 / 100) VIRTUAL" for c in SPREAD)
+    cur.execute(COMPACT_STATS.format(name="stats_new", spread_virtual=spread_virtual))
+    if stats_partitions.partitions(cur, "stats"):
+        stats_partitions.convert(cur, "stats_new", datetime.utcnow().date())
+
+    # online copy: chase the agents' inserts until the remaining gap is one batch
+    done, copied = 0, 0
+    while True:
+        top = max_id(cur, "stats")
+        if top - done <= COPY_BATCH:
+            break
+        copied += copy_range(cur, "stats", "stats_new", done, top)
+        done = top
+        print(f"stats: copied {copied} rows (up to id {done})")
+
+    # swap: hold the rollup lock so no ids are folded while the tables move,
+    # and start new ids well above anything that may still land in the old table
+    cur.execute("SELECT GET_LOCK('stats_rollup', 60) AS ok")
+    try:
+        top = max_id(cur, "stats")
+        copied += copy_range(cur, "stats", "stats_new", done, top)
+        cur.execute(f"ALTER TABLE stats_new AUTO_INCREMENT = {top + 100000}")
+        cur.execute("RENAME TABLE stats TO stats_old, stats_new TO stats")
+        # rows an agent inserted between the last copy and the rename
+        copied += copy_range(cur, "stats_old", "stats", top, max_id(cur, "stats_old"))
+    finally:
+        cur.execute("SELECT RELEASE_LOCK('stats_rollup')")
+    print(f"stats: compact layout live, {copied} rows copied, previous table kept as stats_old")
+
+
+MIGRATIONS = [
+    (1, "baseline schema", baseline),
+    (2, "compact stats layout", compact_stats),
+]
+
+
+def applied_version(cur):
+    cur.execute("CREATE TABLE IF NOT EXISTS schema_version ("
+                "version INT PRIMARY KEY, applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP)")
+    cur.execute("SELECT COALESCE(MAX(version), 0) AS v FROM schema_version")
+    return int(cur.fetchone()["v"])
+
+
+def migrate(cur, target):
+    current = applied_version(cur)
+    for version, name, fn in MIGRATIONS:
+        if current < version <= target:
+            started = time.monotonic()
+            fn(cur)
+            cur.execute("INSERT INTO schema_version (version) VALUES (%s)", (version,))
+            print(f"applied {version}: {name} ({time.monotonic() - started:.1f}s)")
+    if applied_version(cur) >= target:
+        print(f"schema at version {applied_version(cur)}")
+
+
+def status(cur):
+    current = applied_version(cur)
+    for version, name, _ in MIGRATIONS:
+        print(f"{version:>3}  {'applied' if version <= current else 'pending':<8} {name}")
+
+
+def measure(cur):
+    """Bytes per row (data + indexes) and a last-24h range scan for stats and stats_old."""
+    for table in ("stats_old", "stats"):
+        if not has_table(cur, table):
+            continue
+        cur.execute(f"ANALYZE TABLE {table}")
+        cur.fetchall()
+        cur.execute("SELECT TABLE_ROWS AS n, DATA_LENGTH AS d, INDEX_LENGTH AS i "
+                    "FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s",
+                    (DB_NAME, table))
+        t = cur.fetchone()
+        rows = max(1, int(t["n"] or 0))
+        window = ("ts >= UNIX_TIMESTAMP() - 86400" if has_column(cur, table, "ts")
+                  else "timestamp >= UTC_TIMESTAMP() - INTERVAL 1 DAY")
+        best = None
+        for _ in range(3):
+            started = time.perf_counter()
+            cur.execute(f"SELECT COUNT(*) AS n, AVG(cpu_usage) AS cpu FROM {table} WHERE {window}")
+            cur.fetchall()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"{table:<10} ~{rows} rows  data {int(t['d']) / rows:6.1f} B/row  "
+              f"data+index {(int(t['d']) + int(t['i'])) / rows:6.1f} B/row  24h scan {best * 1000:8.1f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("command", choices=["migrate", "status", "measure", "drop-old"])
+    ap.add_argument("--target", type=int, default=MIGRATIONS[-1][0], help="stop at this version")
+    args = ap.parse_args()
+
+    conn = pymysql.connect(host=DB_HOST, user=DB_USER, password=DB_PASS, database=DB_NAME,
+                           cursorclass=pymysql.cursors.DictCursor, autocommit=True)
+    try:
+        with conn.cursor() as cur:
+            if args.command == "migrate":
+                migrate(cur, args.target)
+            elif args.command == "status":
+                status(cur)
+            elif args.command == "measure":
+                measure(cur)
+            else:
+                cur.execute("DROP TABLE IF EXISTS stats_old")
+                print("dropped stats_old")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Daily RANGE partitioning and partition-drop retention for the time-series tables.
+
+  stats_partitions.py convert   -> partition tables that are not partitioned yet
+  stats_partitions.py maintain  -> pre-create the next AHEAD_DAYS day partitions and
+                                   drop the ones older than RETENTION_DAYS
+  stats_partitions.py status    -> partitions with their row estimates
+  stats_partitions.py explain   -> partitions a last-hour window query touches
+
+Layout per table, on TO_DAYS(timestamp) (UTC, as written by the agent), or
+directly on ts for tables keyed by epoch seconds (compact stats, schema v2):
+  p_hist     everything before the conversion day
+  pYYYYMMDD  one partition per day
+  pmax       MAXVALUE catch-all; stays empty, new days are split off it
+Dropping a partition is instant and leaves no fragmentation, unlike DELETE.
+"""
+import os
+import sys
+import calendar
+import argparse
+from datetime import date, datetime, timedelta
+
+import pymysql
+
+DB_HOST = os.getenv("DB_HOST", "127.0.0.1")
+DB_USER = os.getenv("DB_USER", "root")
+DB_PASS = os.getenv("DB_PASS", "")
+DB_NAME = os.getenv("DB_NAME", "syslogs")
+
+TABLES = os.getenv("PARTITION_TABLES", "stats,metric_values,process_stats").split(",")
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "30"))
+AHEAD_DAYS = int(os.getenv("AHEAD_DAYS", "7"))
+
+
+def to_days(d: date) -> int:
+    """MySQL TO_DAYS() of a date."""
+    return d.toordinal() + 365
+
+
+def to_epoch(d: date) -> int:
+    """UNIX seconds of midnight UTC."""
+    return calendar.timegm(d.timetuple())
+
+
+def scheme(cur, table):
+    """(partition column, RANGE expression, date -> bound) for the table's time column."""
+    cur.execute("SELECT COUNT(*) AS n FROM information_schema.COLUMNS "
+                "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND COLUMN_NAME = 'ts'", (DB_NAME, table))
+    if cur.fetchone()["n"]:
+        return "ts", "ts", to_epoch
+    return "timestamp", "TO_DAYS(timestamp)", to_days
+
+
+def day_partition(d: date, bound=to_days) -> str:
+    return f"p{d:%Y%m%d} VALUES LESS THAN ({bound(d + timedelta(days=1))})"
+
+
+def table_exists(cur, table):
+    cur.execute("SELECT COUNT(*) AS n FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s", (DB_NAME, table))
+    return cur.fetchone()["n"] > 0
+
+
+def partitions(cur, table):
+    """[(name, upper bound as int or None for MAXVALUE)], empty if not partitioned."""
+    cur.execute("SELECT PARTITION_NAME AS name, PARTITION_DESCRIPTION AS bound "
+                "FROM information_schema.PARTITIONS "
+                "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+                "ORDER BY PARTITION_ORDINAL_POSITION", (DB_NAME, table))
+    return [(r["name"], None if r["bound"] == "MAXVALUE" else int(r["bound"])) for r in cur.fetchall()]
+
+
+def primary_key(cur, table):
+    cur.execute("SELECT COLUMN_NAME AS col FROM information_schema.STATISTICS "
+                "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND INDEX_NAME = 'PRIMARY' "
+                "ORDER BY SEQ_IN_INDEX", (DB_NAME, table))
+    return [r["col"] for r in cur.fetchall()]
+
+
+def convert(cur, table, today):
+    if partitions(cur, table):
+        print(f"{table}: already partitioned")
+        return
+    column, expr, bound = scheme(cur, table)
+    days = [today + timedelta(days=i) for i in range(AHEAD_DAYS + 1)]
+    parts = [f"p_hist VALUES LESS THAN ({bound(today)})"]
+    parts += [day_partition(d, bound) for d in days]
+    parts.append("pmax VALUES LESS THAN MAXVALUE")
+
+    # every unique key of a partitioned table must contain the partitioning column
+    alter = []
+    pk = primary_key(cur, table)
+    if column not in pk:
+        alter += ["MODIFY timestamp DATETIME NOT NULL", "DROP PRIMARY KEY",
+                  "ADD PRIMARY KEY (%s)" % ", ".join(pk + [column])]
+    cur.execute(f"ALTER TABLE {table} {', '.join(alter)} "
+                f"PARTITION BY RANGE ({expr}) ({', '.join(parts)})")
+    print(f"{table}: converted to {len(parts)} partitions")
+
+
+def maintain(cur, table, today):
+    parts = partitions(cur, table)
+    if not parts:
+        print(f"{table}: not partitioned, run 'convert' first", file=sys.stderr)
+        return
+
+    # pre-create future days by splitting them off the (empty) MAXVALUE partition
+    _, _, bound = scheme(cur, table)
+    last_bound = max((b for _, b in parts if b is not None), default=bound(today))
+    wanted = [today + timedelta(days=i) for i in range(AHEAD_DAYS + 1)]
+    new_days = [d for d in wanted if bound(d) >= last_bound]
+    if new_days and parts[-1][1] is None:
+        split = ", ".join([day_partition(d, bound) for d in new_days] + ["pmax VALUES LESS THAN MAXVALUE"])
+        cur.execute(f"ALTER TABLE {table} REORGANIZE PARTITION {parts[-1][0]} INTO ({split})")
+        print(f"{table}: added {len(new_days)} day partitions")
+
+    cutoff = bound(today - timedelta(days=RETENTION_DAYS))
+    expired = [name for name, bound in parts if bound is not None and bound <= cutoff]
+    if expired:
+        cur.execute(f"ALTER TABLE {table} DROP PARTITION {', '.join(expired)}")
+        print(f"{table}: dropped {', '.join(expired)}")
+
+
+def status(cur, table):
+    cur.execute("SELECT PARTITION_NAME AS name, PARTITION_DESCRIPTION AS bound, TABLE_ROWS AS n "
+                "FROM information_schema.PARTITIONS WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s "
+                "ORDER BY PARTITION_ORDINAL_POSITION", (DB_NAME, table))
+    for r in cur.fetchall():
+        print(f"{table:<14} {r['name'] or '(not partitioned)':<12} {r['bound'] or '':<10} ~{r['n']} rows")
+
+
+def explain(cur):
+    """Partition pruning check for the window queries used by snapshot.py and /chart/line."""
+    sql = ("SELECT timestamp, cpu_usage, memory_usage FROM stats "
+           "WHERE timestamp >= NOW() - INTERVAL 1 HOUR ORDER BY timestamp ASC LIMIT 120")
+    if scheme(cur, "stats")[0] == "ts":
+        sql = ("SELECT timestamp, cpu_usage, memory_usage FROM stats "
+               "WHERE ts >= UNIX_TIMESTAMP() - 3600 ORDER BY ts ASC LIMIT 120")
+    try:
+        cur.execute("EXPLAIN " + sql)
+        rows = cur.fetchall()
+        if rows and "partitions" not in rows[0]:
+            raise pymysql.err.ProgrammingError
+    except pymysql.err.ProgrammingError:
+        cur.execute("EXPLAIN PARTITIONS " + sql)  # MariaDB / MySQL 5.6
+        rows = cur.fetchall()
+    for r in rows:
+        print(f"stats last hour -> partitions: {r.get('partitions')}, rows: {r.get('rows')}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("command", choices=["convert", "maintain", "status", "explain"])
+    args = ap.parse_args()
+
+    today = datetime.utcnow().date()
+    conn = pymysql.connect(host=DB_HOST, user=DB_USER, password=DB_PASS, database=DB_NAME,
+                           cursorclass=pymysql.cursors.DictCursor, autocommit=True)
+    try:
+        with conn.cursor() as cur:
+            if args.command == "explain":
+                explain(cur)
+                return
+            for table in TABLES:
+                if not table_exists(cur, table):
+                    continue
+                if args.command == "convert":
+                    convert(cur, table, today)
+                elif args.command == "maintain":
+                    maintain(cur, table, today)
+                else:
+                    status(cur, table)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
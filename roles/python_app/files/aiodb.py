@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+asyncio data access: an async connection pool for code that runs many DB
+calls on one event loop (log_stats.py's multi-target flush, DB_TARGETS).
+
+  pool = Pool(lambda: connect(host=..., user=..., password=..., database=...), max_size=8)
+  async with pool.connection() as conn:
+      rows = await conn.fetchall("SELECT ...", params)
+      async with conn.transaction():
+          await conn.executemany("INSERT ...", params)
+
+Drivers (chosen by connect()):
+  aiomysql  DB_BACKEND=mysql with the optional aiomysql package: the
+            connections' sockets are read on the event loop, no threads
+  thread    otherwise (SQLite, or MySQL without aiomysql): each connection is a
+            storage.connect() connection driven by its own single thread, so
+            a slow statement holds that connection, never the loop
+
+Both have the same awaitable surface: fetchall / fetchone / execute /
+executemany with %s placeholders and dict rows, begin / commit / rollback and
+`async with conn.transaction()`.
+
+Pool mirrors dbpool.Pool: LIFO reuse, a ping after ping_after idle seconds,
+idle eviction above min_size, recycling after max_lifetime, and
+dbpool.PoolTimeout after waiting timeout seconds at max_size. A connection
+whose block raised a DB error or was cancelled is closed, not returned; a
+cancelled transaction is not rolled back first (that would wait for the
+statement being cancelled), closing the connection ends it. A pool
+belongs to the event loop that uses it.
+
+Scope: only the agent's flush runs on asyncio. The console (chart, KPI and
+ad-hoc queries) stays on dbpool: its Flask views are synchronous WSGI, an
+asyncio pool cannot be shared with them without a loop per worker, and the
+gevent worker (CONSOLE_SERVER) already serves many concurrent requests per
+process with blocking calls.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, List, Optional
+
+try:
+    import aiomysql
+except ImportError:  # optional: thread driver only
+    aiomysql = None
+
+import dbpool
+import storage
+
+DRIVER = "aiomysql" if storage.BACKEND == "mysql" and aiomysql is not None else "thread"
+
+
+class _Connection:
+    driver = ""
+
+    @asynccontextmanager
+    async def transaction(self):
+        await self.begin()
+        try:
+            yield self
+        except asyncio.CancelledError:
+            # a statement may still be running: a rollback would wait behind it.
+            # Pool.connection() discards the connection, which ends the transaction
+            raise
+        except BaseException:
+            await self.rollback()
+            raise
+        await self.commit()
+
+
+class ThreadConnection(_Connection):
+    """A storage connection whose calls run on its own thread."""
+    driver = "thread"
+
+    def __init__(self, raw, executor: ThreadPoolExecutor):
+        self.raw = raw
+        self._executor = executor
+
+    @classmethod
+    async def open(cls, **kwargs) -> "ThreadConnection":
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="aiodb")
+        try:
+            raw = await asyncio.get_running_loop().run_in_executor(
+                executor, lambda: storage.connect(dict_rows=True, **kwargs))
+        except BaseException:
+            executor.shutdown(wait=False)
+            raise
+        return cls(raw, executor)
+
+    def run(self, fn: Callable, *args) -> Awaitable:
+        """fn(raw_connection, *args) on the connection's thread."""
+        return asyncio.get_running_loop().run_in_executor(self._executor, fn, self.raw, *args)
+
+    @staticmethod
+    def _fetch(raw, sql, args, one):
+        with storage.dict_cursor(raw) as cur:
+            cur.execute(sql, args)
+            return cur.fetchone() if one else cur.fetchall()
+
+    @staticmethod
+    def _execute(raw, sql, args, many):
+        with raw.cursor() as cur:
+            return cur.executemany(sql, args) if many else cur.execute(sql, args)
+
+    async def fetchall(self, sql: str, args=None) -> List[Dict]:
+        return await self.run(self._fetch, sql, args, False)
+
+    async def fetchone(self, sql: str, args=None) -> Optional[Dict]:
+        return await self.run(self._fetch, sql, args, True)
+
+    async def execute(self, sql: str, args=None) -> int:
+        return await self.run(self._execute, sql, args, False)
+
+    async def executemany(self, sql: str, seq) -> int:
+        return await self.run(self._execute, sql, list(seq), True)
+
+    async def begin(self):
+        await self.run(lambda raw: raw.begin())
+
+    async def commit(self):
+        await self.run(lambda raw: raw.commit())
+
+    async def rollback(self):
+        await self.run(lambda raw: raw.rollback())
+
+    async def ping(self):
+        await self.run(lambda raw: raw.ping(reconnect=False))
+
+    def server_info(self) -> str:
+        return self.raw.get_server_info() if storage.BACKEND == "mysql" else "sqlite"
+
+    def close(self):
+        self._executor.submit(self.raw.close)
+        self._executor.shutdown(wait=False)
+
+
+class AioMySQLConnection(_Connection):
+    """An aiomysql connection (autocommit, like storage.connect())."""
+    driver = "aiomysql"
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    @classmethod
+    async def open(cls, host="127.0.0.1", user="", password="", database="syslogs", port=3306,
+                   connect_timeout=10, path=None) -> "AioMySQLConnection":
+        return cls(await aiomysql.connect(host=host, port=port, user=user, password=password, db=database,
+                                          autocommit=True, connect_timeout=connect_timeout))
+
+    async def fetchall(self, sql: str, args=None) -> List[Dict]:
+        async with self.raw.cursor(aiomysql.DictCursor) as cur:
+            await cur.execute(sql, args)
+            return await cur.fetchall()
+
+    async def fetchone(self, sql: str, args=None) -> Optional[Dict]:
+        async with self.raw.cursor(aiomysql.DictCursor) as cur:
+            await cur.execute(sql, args)
+            return await cur.fetchone()
+
+    async def execute(self, sql: str, args=None) -> int:
+        async with self.raw.cursor() as cur:
+            return await cur.execute(sql, args)
+
+    async def executemany(self, sql: str, seq) -> int:
+        # aiomysql folds INSERT ... VALUES into multi-row statements, like pymysql
+        async with self.raw.cursor() as cur:
+            return await cur.executemany(sql, list(seq))
+
+    async def begin(self):
+        await self.raw.begin()
+
+    async def commit(self):
+        await self.raw.commit()
+
+    async def rollback(self):
+        await self.raw.rollback()
+
+    async def ping(self):
+        await self.raw.ping(reconnect=False)
+
+    def server_info(self) -> str:
+        return self.raw.get_server_info()
+
+    def close(self):
+        self.raw.close()
+
+
+async def connect(**kwargs) -> _Connection:
+    """A connection on DRIVER; arguments as storage.connect() (host, user, password, database, port, path)."""
+    if DRIVER == "aiomysql":
+        return await AioMySQLConnection.open(**kwargs)
+    return await ThreadConnection.open(**kwargs)
+
+
+class _Entry:
+    __slots__ = ("conn", "created", "returned")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created = self.returned = time.monotonic()
+
+
+class Pool:
+    def __init__(self, factory: Callable[[], Awaitable[_Connection]], min_size: int = 1, max_size: int = 8,
+                 max_idle: float = 300, max_lifetime: float = 3600, ping_after: float = 1.0,
+                 timeout: float = 5.0):
+        self.factory = factory
+        self.min_size = min(min_size, max_size)
+        self.max_size = max(1, max_size)
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.ping_after = ping_after
+        self.timeout = timeout
+        self._idle: List[_Entry] = []
+        self._size = 0  # open connections, idle + checked out
+        self._cond = asyncio.Condition()
+        self._stats = dict(created=0, closed=0, checkouts=0, waits=0, wait_ms=0.0, timeouts=0,
+                           ping_failures=0, evicted=0, recycled=0, discarded=0)
+
+    async def _open(self) -> _Entry:
+        """Open a connection into an already reserved slot, freeing the slot on failure."""
+        try:
+            entry = _Entry(await self.factory())
+        except BaseException:
+            async with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        self._stats["created"] += 1
+        return entry
+
+    async def _discard(self, entry: _Entry, reason: str = None, keep_slot: bool = False):
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+        self._stats["closed"] += 1
+        if reason:
+            self._stats[reason] += 1
+        if not keep_slot:
+            async with self._cond:
+                self._size -= 1
+                self._cond.notify()
+
+    async def _checkout(self) -> _Entry:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        waited = None
+        stale = []
+        async with self._cond:
+            self._stats["checkouts"] += 1
+            while True:
+                now = time.monotonic()
+                entry = None
+                while self._idle and entry is None:
+                    entry = self._idle.pop()
+                    if now - entry.created >= self.max_lifetime:
+                        stale.append(entry)
+                        entry = None
+                if entry is not None:
+                    break
+                if self._size < self.max_size:
+                    self._size += 1  # reserve the slot, connect outside the lock
+                    break
+                if waited is None:
+                    waited = loop.time()
+                    self._stats["waits"] += 1
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise dbpool.PoolTimeout(f"no DB connection free within {self.timeout:g}s")
+                try:
+                    await asyncio.wait_for(self._cond.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+            if waited is not None:
+                self._stats["wait_ms"] += (loop.time() - waited) * 1000
+        for e in stale:
+            await self._discard(e, "recycled")
+
+        if entry is None:
+            return await self._open()
+        if time.monotonic() - entry.returned >= self.ping_after:
+            try:
+                await entry.conn.ping()
+            except Exception:
+                await self._discard(entry, "ping_failures", keep_slot=True)
+                return await self._open()
+        return entry
+
+    async def _checkin(self, entry: _Entry):
+        now = time.monotonic()
+        if now - entry.created >= self.max_lifetime:
+            await self._discard(entry, "recycled")
+            return
+        entry.returned = now
+        evict = []
+        async with self._cond:
+            self._idle.append(entry)
+            # least recently returned first, never below min_size
+            while (len(self._idle) > 1 and self._size - len(evict) > self.min_size
+                   and now - self._idle[0].returned >= self.max_idle):
+                evict.append(self._idle.pop(0))
+            self._cond.notify()
+        for e in evict:
+            await self._discard(e, "evicted")
+
+    @asynccontextmanager
+    async def connection(self):
+        entry = await self._checkout()
+        try:
+            yield entry.conn
+        except (*storage.Error, asyncio.CancelledError):
+            # a statement may still be running on it
+            await self._discard(entry, "discarded")
+            raise
+        except BaseException:
+            await self._checkin(entry)
+            raise
+        else:
+            await self._checkin(entry)
+
+    def stats(self) -> Dict:
+        out = dict(self._stats, size=self._size, idle=len(self._idle), in_use=self._size - len(self._idle),
+                   min_size=self.min_size, max_size=self.max_size, driver=DRIVER)
+        out["wait_ms"] = round(out["wait_ms"], 1)
+        return out
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for e in idle:
+            await self._discard(e)
+
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Columnar archive of closed days of stats, for offline analytics.
+
+  archive.py export   -> write every closed UTC day not archived yet (oldest first,
+                         up to yesterday); run daily, before partition retention
+                         drops the day from the database
+  archive.py ls       -> archived days with row counts and size on disk
+
+Layout, one directory per day under ARCHIVE_DIR:
+  YYYY-MM-DD/meta.json     day, epoch start, rows, column dtypes, host names
+  YYYY-MM-DD/<column>.bin  one little-endian typed array per column, rows
+                           sorted by (ts, host_id); percentages stay in the
+                           compact hundredths form, NULL stored as 0xFFFF
+  YYYY-MM-DD/index.bin     uint32[1441]: first row of each minute, then rows,
+                           so a time range maps to a row slice without a scan
+Days are written to a temporary directory and renamed into place, so readers
+never see a partial day.
+
+Archive(dir).load(start, end) memory-maps the column files and returns NumPy
+arrays; a range inside one day without a host filter is a zero-copy view of the
+file. series() buckets a range like rollup.series().
+"""
+
+import os
+import sys
+import json
+import shutil
+import calendar
+import argparse
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+import storage
+
+DB_HOST = os.getenv("DB_HOST", "127.0.0.1")
+DB_USER = os.getenv("DB_USER", "devops")
+DB_PASS = os.getenv("DB_PASS", "")
+DB_NAME = os.getenv("DB_NAME", "syslogs")
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive"))
+
+COLUMNS = [
+    ("ts", "<u4"), ("host_id", "<u2"),
+    ("cpu_x100", "<u2"), ("mem_x100", "<u2"),
+    ("cpu_min_x100", "<u2"), ("cpu_max_x100", "<u2"), ("cpu_last_x100", "<u2"),
+    ("mem_min_x100", "<u2"), ("mem_max_x100", "<u2"), ("mem_last_x100", "<u2"),
+]
+DTYPES = dict(COLUMNS)
+NULL_X100 = 0xFFFF
+MINUTES = 1440
+
+
+def epoch(d: date) -> int:
+    return calendar.timegm(d.timetuple())
+
+
+def percent(values: np.ndarray) -> np.ndarray:
+    """Hundredths column -> float percentages with NaN for NULL (a copy)."""
+    out = values.astype(np.float64) / 100
+    out[values == NULL_X100] = np.nan
+    return out
+
+
+class Day:
+    """One archived day; columns are memory-mapped on first use."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.rows = self.meta["rows"]
+        self.start = self.meta["start"]
+        self.hosts = {name: int(hid) for hid, name in self.meta["hosts"].items()}
+        self._maps: Dict[str, np.ndarray] = {}
+
+    def column(self, name: str) -> np.ndarray:
+        if name not in self._maps:
+            dtype = "<u4" if name == "index" else self.meta["columns"][name]
+            shape = MINUTES + 1 if name == "index" else self.rows
+            if shape:
+                self._maps[name] = np.memmap(os.path.join(self.path, name + ".bin"), dtype=dtype, mode="r", shape=(shape,))
+            else:
+                self._maps[name] = np.empty(0, dtype=dtype)
+        return self._maps[name]
+
+    def _row_at(self, t: int) -> int:
+        """First row with ts >= t: minute index, then a binary search inside the minute."""
+        if t <= self.start:
+            return 0
+        if t >= self.start + MINUTES * 60:
+            return self.rows
+        index, ts = self.column("index"), self.column("ts")
+        m = (t - self.start) // 60
+        lo, hi = int(index[m]), int(index[m + 1])
+        return lo + int(np.searchsorted(ts[lo:hi], t))
+
+    def bounds(self, lo: int, hi: int) -> slice:
+        """Row slice holding lo <= ts < hi (epoch seconds)."""
+        return slice(self._row_at(lo), self._row_at(hi))
+
+
+class Archive:
+    def __init__(self, root: str = ARCHIVE_DIR):
+        self.root = root
+        self._days: Dict[date, Day] = {}
+
+    def days(self) -> List[date]:
+        if not os.path.isdir(self.root):
+            return []
+        out = []
+        for name in os.listdir(self.root):
+            try:
+                d = datetime.strptime(name, "%Y-%m-%d").date()
+            except ValueError:
+                continue  # temporary export directories and strays
+            if os.path.exists(os.path.join(self.root, name, "meta.json")):
+                out.append(d)
+        return sorted(out)
+
+    def day(self, d: date) -> Day:
+        if d not in self._days:
+            self._days[d] = Day(os.path.join(self.root, d.isoformat()))
+        return self._days[d]
+
+    def covered_until(self) -> Optional[datetime]:
+        """End (exclusive, UTC) of the archived days, or None when the archive is empty."""
+        days = self.days()
+        return datetime.combine(days[-1] + timedelta(days=1), datetime.min.time()) if days else None
+
+    def load(self, start: datetime, end: datetime, host: Optional[str] = None,
+             columns: Sequence[str] = ("ts", "cpu_x100", "mem_x100")) -> Dict[str, np.ndarray]:
+        """
+        Archived rows with start <= ts < end (UTC), one array per column. Within
+        one day and without `host` the arrays are views of the mapped files.
+        """
+        lo, hi = calendar.timegm(start.timetuple()), calendar.timegm(end.timetuple())
+        parts = []
+        for d in self.days():
+            if epoch(d) + 86400 <= lo or epoch(d) >= hi:
+                continue
+            day = self.day(d)
+            rows = day.bounds(lo, hi)
+            part = {c: day.column(c)[rows] for c in columns}
+            if host is not None:
+                if host not in day.hosts:
+                    continue
+                keep = day.column("host_id")[rows] == day.hosts[host]
+                part = {c: a[keep] for c, a in part.items()}
+            parts.append(part)
+        if len(parts) == 1:
+            return parts[0]
+        return {c: (np.concatenate([p[c] for p in parts]) if parts else np.empty(0, DTYPES[c])) for c in columns}
+
+    def series(self, start: datetime, end: datetime, resolution: float,
+               host: Optional[str] = None) -> List[Dict]:
+        """Same rows as rollup.series() (t, n, avg/min/max/std of cpu and memory) from the archive."""
+        res = max(1, int(resolution))
+        cols = ("ts", "cpu_x100", "cpu_min_x100", "cpu_max_x100", "mem_x100", "mem_min_x100", "mem_max_x100")
+        data = self.load(start, end, host, cols)
+        if not len(data["ts"]):
+            return []
+        keys, inv = np.unique(data["ts"].astype(np.int64) // res, return_inverse=True)
+        out = [{"t": datetime.utcfromtimestamp(int(k) * res), "n": int(n)}
+               for k, n in zip(keys, np.bincount(inv, minlength=len(keys)))]
+        for name, mean, low, high in (("cpu", "cpu_x100", "cpu_min_x100", "cpu_max_x100"),
+                                      ("mem", "mem_x100", "mem_min_x100", "mem_max_x100")):
+            v = percent(data[mean])
+            ok = ~np.isnan(v)
+            n = np.bincount(inv[ok], minlength=len(keys))
+            s = np.bincount(inv[ok], weights=v[ok], minlength=len(keys))
+            sq = np.bincount(inv[ok], weights=v[ok] ** 2, minlength=len(keys))
+            # per-interval spread when the agent wrote it, like COALESCE(cpu_min, cpu_usage)
+            vmin, vmax = percent(data[low]), percent(data[high])
+            vmin, vmax = np.where(np.isnan(vmin), v, vmin), np.where(np.isnan(vmax), v, vmax)
+            mn, mx = np.full(len(keys), np.inf), np.full(len(keys), -np.inf)
+            np.fmin.at(mn, inv, vmin)
+            np.fmax.at(mx, inv, vmax)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                avg = s / n
+                std = np.sqrt(np.maximum(sq / n - avg ** 2, 0))
+            for i, row in enumerate(out):
+                has = n[i] > 0
+                row[f"{name}_avg"] = round(float(avg[i]), 2) if has else None
+                row[f"{name}_min"] = float(mn[i]) if np.isfinite(mn[i]) else None
+                row[f"{name}_max"] = float(mx[i]) if np.isfinite(mx[i]) else None
+                row[f"{name}_std"] = round(float(std[i]), 2) if has else None
+        return out
+
+
+def export_day(conn, d: date, root: str = ARCHIVE_DIR) -> int:
+    """Write one UTC day of stats to root/YYYY-MM-DD; returns the row count."""
+    lo = epoch(d)
+    names = [c for c, _ in COLUMNS]
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT {', '.join(names)} FROM stats WHERE ts >= %s AND ts < %s ORDER BY ts, host_id",
+                    (lo, lo + 86400))
+        rows = cur.fetchall()
+        cur.execute("SELECT id, name FROM hosts")
+        hosts = {str(hid): name for hid, name in cur.fetchall()}
+    data = np.array([[NULL_X100 if v is None else v for v in r] for r in rows], dtype=np.int64)
+    data = data.reshape(len(rows), len(names))
+
+    tmp = os.path.join(root, f".{d.isoformat()}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for i, (name, dtype) in enumerate(COLUMNS):
+        data[:, i].astype(dtype).tofile(os.path.join(tmp, name + ".bin"))
+    index = np.searchsorted(data[:, 0], lo + 60 * np.arange(MINUTES + 1))
+    index[-1] = len(rows)
+    index.astype("<u4").tofile(os.path.join(tmp, "index.bin"))
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({"day": d.isoformat(), "start": lo, "rows": len(rows),
+                   "columns": DTYPES, "null": NULL_X100, "hosts": hosts}, f)
+    os.rename(tmp, os.path.join(root, d.isoformat()))
+    return len(rows)
+
+
+def export(conn, root: str = ARCHIVE_DIR) -> int:
+    """Archive every closed day after the last archived one; returns the number of days written."""
+    os.makedirs(root, exist_ok=True)
+    done = Archive(root).days()
+    if done:
+        first = done[-1] + timedelta(days=1)
+    else:
+        with conn.cursor() as cur:
+            cur.execute("SELECT MIN(ts) FROM stats")
+            oldest = cur.fetchone()[0]
+        if oldest is None:
+            return 0
+        first = datetime.utcfromtimestamp(int(oldest)).date()
+    today = datetime.utcnow().date()
+    written = 0
+    d = first
+    while d < today:
+        n = export_day(conn, d, root)
+        print(f"archive: {d} {n} rows", file=sys.stderr)
+        written += 1
+        d += timedelta(days=1)
+    return written
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("command", choices=["export", "ls"])
+    args = ap.parse_args()
+    if args.command == "ls":
+        arch = Archive()
+        for d in arch.days():
+            path = os.path.join(arch.root, d.isoformat())
+            size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+            print(f"{d}  {arch.day(d).rows:>9} rows  {size / 1024:>9.1f} KiB")
+        return
+    conn = storage.connect(host=DB_HOST, user=DB_USER, password=DB_PASS, database=DB_NAME)
+    try:
+        export(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
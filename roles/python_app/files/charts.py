@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Server-side PNG charts for the consoles, safe to render from many request
+threads.
+
+  renderer = Renderer(workers=2, ttl=15, watermark=max_stats_id)
+  png = renderer.get(("line", points, host), fetch, line_png)  # fetch() -> line_png's arguments
+
+- Figures are built with matplotlib's object-oriented API (a Figure and its
+  own Agg canvas), never pyplot: pyplot's "current figure" is global state
+  shared by every thread, and figures it creates stay registered until
+  plt.close().
+- Rendering runs in a bounded pool of `workers` threads, so a burst of chart
+  requests costs at most that many renders at once; the rest queue, and wait
+  at most `timeout` seconds.
+- PNGs are cached in a resultcache.ResultCache under the chart's key: served
+  until the stats high-water mark moves (a new collection) or ttl passes, and
+  concurrent misses for the same chart query and render once. The data is
+  fetched on the request thread, so render threads never hold a DB connection.
+
+stats() returns render counts and times plus the cache's hit/miss counters.
+"""
+
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Sequence, Tuple
+
+from matplotlib.figure import Figure
+
+import resultcache
+
+
+def _png(fig: Figure) -> bytes:
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png")
+    return buf.getvalue()
+
+
+def line_png(ts: Sequence, series: Sequence[Tuple[str, Sequence]], size=(8, 3)) -> bytes:
+    """One line per (label, values) over the shared time axis `ts`."""
+    fig = Figure(figsize=size)
+    ax = fig.subplots()
+    for label, values in series:
+        ax.plot(ts, values, label=label)
+    ax.legend()
+    fig.autofmt_xdate(rotation=45, ha="right")
+    fig.tight_layout()
+    return _png(fig)
+
+
+def pie_png(values: Sequence[float], labels: Sequence[str], size=(3.5, 3.5)) -> bytes:
+    fig = Figure(figsize=size)
+    ax = fig.subplots()
+    ax.pie(values, labels=labels, autopct="%1.1f%%", startangle=140)
+    fig.tight_layout()
+    return _png(fig)
+
+
+class Renderer:
+    def __init__(self, workers: int = 2, ttl: float = 15, watermark: Callable[[], Any] = lambda: None,
+                 check_every: float = 1.0, max_entries: int = 128, timeout: float = 30):
+        self.workers = workers
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chart")
+        self._cache = resultcache.ResultCache(ttl=ttl, watermark=watermark, check_every=check_every,
+                                              max_entries=max_entries, wait_timeout=timeout)
+        self._lock = threading.Lock()
+        self._stats = dict(renders=0, render_ms=0.0, render_max_ms=0.0, queue_ms=0.0)
+
+    def _render(self, draw: Callable[[], bytes], submitted: float) -> bytes:
+        started = time.perf_counter()
+        png = draw()
+        ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._stats["renders"] += 1
+            self._stats["render_ms"] += ms
+            self._stats["render_max_ms"] = max(self._stats["render_max_ms"], ms)
+            self._stats["queue_ms"] += (started - submitted) * 1000
+        return png
+
+    def render(self, draw: Callable[..., bytes], *args) -> bytes:
+        """draw(*args) -> PNG bytes on the render pool, uncached."""
+        return self._pool.submit(self._render, lambda: draw(*args), time.perf_counter()).result(self.timeout)
+
+    def get(self, key: Hashable, fetch: Callable[[], tuple], draw: Callable[..., bytes]) -> bytes:
+        """Cached PNG for `key`; on a miss, draw(*fetch()) with draw on the render pool."""
+        return self._cache.get(key, lambda: self.render(draw, *fetch()))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            s = dict(self._stats)
+        n = s["renders"] or 1
+        return dict(renders=s["renders"], workers=self.workers, render_avg_ms=round(s["render_ms"] / n, 1),
+                    render_max_ms=round(s["render_max_ms"], 1), queue_avg_ms=round(s["queue_ms"] / n, 1),
+                    cache=self._cache.stats())
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Thread-safe DB connection pool for the web consoles.
+
+  pool = Pool(factory, min_size=1, max_size=8)
+  with pool.connection() as conn, conn.cursor() as cur:
+      ...
+
+- LIFO reuse: the most recently returned connection goes out first, so extra
+  connections opened under a burst go idle and are evicted.
+- Health check on checkout: connections idle for ping_after seconds or more
+  are pinged; a dead one is replaced by a fresh connection.
+- Idle eviction above min_size after max_idle seconds, and recycling after
+  max_lifetime seconds (ahead of the server's wait_timeout). Both run on
+  checkout/checkin, so no background thread is needed.
+- At max_size, checkout waits up to timeout seconds, then raises PoolTimeout.
+- A connection whose block raised a DB error is closed, not returned.
+- max_size=0 disables pooling: one connection per checkout (for comparison).
+
+stats() returns the counters exposed at /api/pool.
+"""
+
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+import storage
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class _Entry:
+    __slots__ = ("conn", "created", "returned")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created = self.returned = time.monotonic()
+
+
+class Pool:
+    def __init__(self, factory: Callable, min_size: int = 1, max_size: int = 8,
+                 max_idle: float = 300, max_lifetime: float = 3600,
+                 ping_after: float = 1.0, timeout: float = 5.0):
+        self.factory = factory
+        self.min_size = min(min_size, max_size)
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.ping_after = ping_after
+        self.timeout = timeout
+        self._idle = deque()
+        self._size = 0  # open connections, idle + checked out
+        self._cond = threading.Condition()
+        self._stats = dict(created=0, closed=0, checkouts=0, waits=0, wait_ms=0.0, timeouts=0,
+                           ping_failures=0, evicted=0, recycled=0, discarded=0)
+        try:
+            for _ in range(self.min_size):
+                self._idle.append(self._open())
+                self._size += 1
+        except storage.Error:
+            pass  # DB not reachable yet; connections are opened on demand
+
+    def _open(self) -> _Entry:
+        entry = _Entry(self.factory())
+        with self._cond:
+            self._stats["created"] += 1
+        return entry
+
+    def _discard(self, entry: _Entry, reason: str = None, keep_slot: bool = False):
+        """Close a connection; its slot is freed unless the caller reuses it for a replacement."""
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._stats["closed"] += 1
+            if reason:
+                self._stats[reason] += 1
+            if not keep_slot:
+                self._size -= 1
+                self._cond.notify()
+
+    def _replace(self) -> _Entry:
+        """Open a connection into an already reserved slot, freeing the slot on failure."""
+        try:
+            return self._open()
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def _checkout(self) -> _Entry:
+        deadline = time.monotonic() + self.timeout
+        waited = None
+        stale = []
+        with self._cond:
+            self._stats["checkouts"] += 1
+            while True:
+                now = time.monotonic()
+                entry = None
+                while self._idle and entry is None:
+                    entry = self._idle.pop()
+                    if now - entry.created >= self.max_lifetime:
+                        stale.append(entry)
+                        entry = None
+                if entry is not None:
+                    break
+                if self._size < self.max_size or self.max_size == 0:
+                    self._size += 1  # reserve the slot, connect outside the lock
+                    break
+                if waited is None:
+                    waited = now
+                    self._stats["waits"] += 1
+                if now >= deadline:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(f"no DB connection free within {self.timeout:g}s")
+                self._cond.wait(deadline - now)
+            if waited is not None:
+                self._stats["wait_ms"] += (time.monotonic() - waited) * 1000
+        for e in stale:
+            self._discard(e, "recycled")
+
+        if entry is None:
+            return self._replace()
+        if time.monotonic() - entry.returned >= self.ping_after:
+            try:
+                entry.conn.ping(reconnect=False)
+            except Exception:
+                self._discard(entry, "ping_failures", keep_slot=True)
+                return self._replace()
+        return entry
+
+    def _checkin(self, entry: _Entry):
+        now = time.monotonic()
+        if self.max_size == 0:
+            self._discard(entry)
+            return
+        if now - entry.created >= self.max_lifetime:
+            self._discard(entry, "recycled")
+            return
+        entry.returned = now
+        evict = []
+        with self._cond:
+            self._idle.append(entry)
+            # least recently returned first, never below min_size
+            while (len(self._idle) > 1 and self._size - len(evict) > self.min_size
+                   and now - self._idle[0].returned >= self.max_idle):
+                evict.append(self._idle.popleft())
+            self._cond.notify()
+        for e in evict:
+            self._discard(e, "evicted")
+
+    @contextmanager
+    def connection(self):
+        entry = self._checkout()
+        try:
+            yield entry.conn
+        except storage.Error:
+            self._discard(entry, "discarded")
+            raise
+        except BaseException:
+            self._checkin(entry)
+            raise
+        else:
+            self._checkin(entry)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            out = dict(self._stats)
+            out.update(size=self._size, idle=len(self._idle), in_use=self._size - len(self._idle),
+                       min_size=self.min_size, max_size=self.max_size)
+        out["wait_ms"] = round(out["wait_ms"], 1)
+        return out
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+        for e in idle:
+            self._discard(e)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Chart downsampling: pick a bounded subset of a time series' points that still
+looks like the whole series, spikes included.
+
+  idx = select(x, [cpu, mem], points=600)              # LTTB, at most 600 rows
+  idx = select(x, [cpu, mem], width=800)               # min/max per pixel column
+  rows = [rows[i] for i in idx]
+
+- lttb(): Largest-Triangle-Three-Buckets. The interior points are split into
+  n - 2 equal-count buckets; from each, the point forming the largest triangle
+  with the point kept from the previous bucket and the mean of the next bucket
+  is kept. First and last points are always kept. Each bucket's areas are one
+  NumPy expression over its slice, so the work is linear in the input with one
+  Python step per output point.
+- minmax(): splits the x range into `buckets` equal-width columns (one per
+  pixel) and keeps the minimum and maximum of each, fully vectorised
+  (reduceat over the contiguous columns). At most 2 * buckets + 2 points, and
+  the drawn envelope is the same as the raw series' at that width.
+- select(): several series sharing one x axis (a chart's lines share its
+  timestamps) get the union of their per-series picks, within the same bound;
+  NaN (NULL) values are skipped.
+
+x must be monotonic (ascending or descending), as rows ordered by time are.
+"""
+
+from typing import List, Sequence
+
+import numpy as np
+
+METHODS = ("lttb", "minmax")
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """Indices of at most n points of (x, y) chosen by LTTB, ascending."""
+    size = len(x)
+    if n >= size or size <= 2:
+        return np.arange(size)
+    if n < 3:
+        return np.array([0, size - 1]) if n == 2 else np.array([0])
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # bucket i covers interior points [edges[i], edges[i + 1])
+    edges = (np.arange(n - 1) * (size - 2) // (n - 2) + 1).astype(np.intp)
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[1:-1], edges[:-1] - 1) / counts
+    mean_y = np.add.reduceat(y[1:-1], edges[:-1] - 1) / counts
+    # third vertex for bucket i: the next bucket's mean, the last point for the last bucket
+    cx = np.append(mean_x[1:], x[-1])
+    cy = np.append(mean_y[1:], y[-1])
+    out = np.empty(n, dtype=np.intp)
+    out[0], out[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - cx[i]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (cy[i] - ay))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def _first_per_group(idx: np.ndarray, group: np.ndarray) -> np.ndarray:
+    g = group[idx]
+    return idx[np.r_[True, g[1:] != g[:-1]]] if len(idx) else idx
+
+
+def minmax(x: np.ndarray, y: np.ndarray, buckets: int) -> np.ndarray:
+    """Indices of the min and max of each of `buckets` equal-width x columns, plus the ends, ascending."""
+    size = len(x)
+    if size <= 2 * buckets + 2 or buckets < 1:
+        return np.arange(size)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    span = (x[-1] - x[0]) or 1.0
+    col = np.minimum(((x - x[0]) * (buckets / span)).astype(np.intp), buckets - 1)
+    new = np.r_[True, col[1:] != col[:-1]]
+    starts = np.flatnonzero(new)
+    group = np.cumsum(new) - 1
+    # fmin/fmax skip NaN; an all-NaN column has no match below and contributes nothing
+    lo = np.fmin.reduceat(y, starts)[group]
+    hi = np.fmax.reduceat(y, starts)[group]
+    picks = [np.array([0, size - 1]), _first_per_group(np.flatnonzero(y == lo), group),
+             _first_per_group(np.flatnonzero(y == hi), group)]
+    return np.unique(np.concatenate(picks))
+
+
+def select(x: Sequence, ys: Sequence[Sequence], points: int = 0, width: int = 0,
+           method: str = "lttb") -> np.ndarray:
+    """
+    Row indices to plot for series `ys` over `x`, ascending. With `width`,
+    min/max per pixel column (at most 2 * len(ys) * width + 2 rows); otherwise
+    `method` within `points` rows. All rows when they already fit.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    size = len(x)
+    k = max(1, len(ys))
+    if width:
+        method, budget = "minmax", int(width)
+    elif not points or size <= points:
+        return np.arange(size)
+    elif method == "minmax":
+        budget = max(1, (points - 2) // (2 * k))
+    else:
+        budget = max(3, points // k)
+    picks: List[np.ndarray] = []
+    for y in ys:
+        y = np.asarray(y, dtype=np.float64)
+        keep = np.flatnonzero(~np.isnan(y))
+        if len(keep) == 0:
+            continue
+        pick = lttb(x[keep], y[keep], budget) if method == "lttb" else minmax(x[keep], y[keep], budget)
+        picks.append(keep[pick])
+    if not picks:
+        return np.arange(min(size, points or size))
+    return np.unique(np.concatenate(picks))
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Streaming export of stats rows as CSV or NDJSON, in constant memory.
+
+  for chunk in export.stream(get_db, "csv", start, end, host_id=None, after=None):
+      ...
+
+- Rows are read in keyset pages of page_rows, ordered by (ts, host_id, id):
+  the order of idx_ts (InnoDB appends the primary key to it) and, with a host
+  filter, of the primary key itself, so every page is an index range read
+  starting where the last one stopped, never an OFFSET scan.
+- Each page is read through an unbuffered server-side cursor
+  (storage.stream_cursor: pymysql SSCursor; sqlite3 cursors are lazy anyway)
+  and emitted in chunks of about chunk_bytes, so neither the result nor a
+  page is held in memory.
+- A connection is checked out per page, so a long export does not hold one
+  connection (or one read view) for its whole duration.
+- `after` is a key "ts,host_id,id" from the last exported row: a cut-off
+  export resumes from there.
+"""
+
+import csv
+import io
+import json
+import time
+from typing import Callable, Iterator, Optional, Tuple
+
+import storage
+
+COLUMNS = ("id", "host_id", "ts", "timestamp", "cpu_usage", "memory_usage",
+           "cpu_min", "cpu_max", "mem_min", "mem_max")
+
+# timestamp is derived from ts in Python (once per distinct second), not parsed per row
+PAGE_SQL = (
+    "SELECT " + ", ".join(c for c in COLUMNS if c != "timestamp") + " FROM stats "
+    "WHERE ts >= %s AND ts < %s{host}{after} "
+    "ORDER BY ts, host_id, id LIMIT %s"
+)
+AFTER_SQL = " AND (ts > %s OR (ts = %s AND (host_id > %s OR (host_id = %s AND id > %s))))"
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+Key = Tuple[int, int, int]
+
+
+def parse_key(value: str) -> Key:
+    """'ts,host_id,id' -> (ts, host_id, id); ValueError when malformed."""
+    parts = value.split(",")
+    if len(parts) != 3 or not all(p.isdigit() for p in parts):
+        raise ValueError("after must be 'ts,host_id,id' from the last exported row")
+    return int(parts[0]), int(parts[1]), int(parts[2])
+
+
+def rows(connection: Callable, start: int, end: int, host_id: Optional[int] = None,
+         after: Optional[Key] = None, limit: Optional[int] = None,
+         page_rows: int = 10000, fetch_rows: int = 1000) -> Iterator[tuple]:
+    """Row tuples in COLUMNS order with start <= ts < end, after the key `after`."""
+    left = limit
+    last_ts, stamp = None, None
+    while left is None or left > 0:
+        n = page_rows if left is None else min(page_rows, left)
+        # the key's ts is the range bound, so each page starts at its first row
+        params = [max(start, after[0]) if after is not None else start, end]
+        if host_id is not None:
+            params.append(host_id)
+        if after is not None:
+            ts, hid, rid = after
+            params += [ts, ts, hid, hid, rid]
+        params.append(n)
+        sql = PAGE_SQL.format(host=" AND host_id = %s" if host_id is not None else "",
+                              after=AFTER_SQL if after is not None else "")
+        got = 0
+        with connection() as conn, storage.stream_cursor(conn) as cur:
+            cur.execute(sql, params)
+            while True:
+                batch = cur.fetchmany(fetch_rows)
+                if not batch:
+                    break
+                for r in batch:
+                    if r[2] != last_ts:
+                        last_ts, stamp = r[2], time.strftime(storage.TS_FMT, time.gmtime(r[2]))
+                    yield r[:3] + (stamp,) + r[3:]
+                got += len(batch)
+                last = batch[-1]
+        if got:
+            after = (last[2], last[1], last[0])
+        if left is not None:
+            left -= got
+        if got < n:
+            return
+
+
+def stream(connection: Callable, fmt: str, start: int, end: int, host_id: Optional[int] = None,
+           after: Optional[Key] = None, limit: Optional[int] = None, chunk_bytes: int = 65536,
+           **kw) -> Iterator[bytes]:
+    """Encoded export body in chunks of about chunk_bytes."""
+    buf = io.StringIO()
+    if fmt == "csv":
+        writer = csv.writer(buf, lineterminator="\n")
+        writer.writerow(COLUMNS)
+        emit = writer.writerow
+    else:
+        emit = lambda r: buf.write(json.dumps(dict(zip(COLUMNS, r)), separators=(",", ":")) + "\n")  # noqa: E731
+    for r in rows(connection, start, end, host_id, after, limit, **kw):
+        emit(r)
+        if buf.tell() >= chunk_bytes:
+            yield buf.getvalue().encode()
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode()
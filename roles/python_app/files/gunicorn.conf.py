@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Gunicorn settings for the SQL console, read from the same environment
+(/opt/system-monitor/.env) as the app. sql_console.py execs gunicorn with this
+file when CONSOLE_SERVER is gthread or gevent:
+
+  gevent   CONSOLE_WORKERS processes, each serving up to CONSOLE_CONNECTIONS
+           requests as greenlets; pymysql's socket I/O is cooperative after
+           monkey patching, so a request waiting on the DB (or holding an SSE
+           stream open) costs a greenlet, not a thread. The default.
+  gthread  CONSOLE_WORKERS processes x CONSOLE_THREADS threads. Every open
+           request holds a thread, so the console turns /api/stream off
+           (CONSOLE_SSE) and dashboards poll /api/delta instead: otherwise
+           CONSOLE_WORKERS x CONSOLE_THREADS open dashboards would take every
+           thread
+
+Each worker has its own connection pool, result cache and stream poller, so
+DB connections and poller queries scale with CONSOLE_WORKERS.
+
+CONSOLE_PRELOAD=1 imports the app once in the master before forking (faster
+starts, shared memory); connections the import opened are closed before the
+workers fork. SIGHUP (systemctl reload sql-console) replaces the workers
+gracefully, letting in-flight requests finish within CONSOLE_GRACEFUL_TIMEOUT;
+with preloading, new code needs a restart instead.
+"""
+
+import os
+
+SERVER = os.getenv("CONSOLE_SERVER", "gevent")
+# the app picks its SSE default from the server it runs under
+os.environ.setdefault("CONSOLE_SERVER", SERVER)
+
+if SERVER == "gevent":
+    # before anything imports socket/ssl/threading, including the preloaded app
+    from gevent import monkey
+    monkey.patch_all()
+
+bind = f"{os.getenv('APP_HOST', '0.0.0.0')}:{os.getenv('APP_PORT', '8082')}"
+workers = int(os.getenv("CONSOLE_WORKERS", "4"))
+worker_class = "gevent" if SERVER == "gevent" else "gthread"
+threads = int(os.getenv("CONSOLE_THREADS", "8"))
+worker_connections = int(os.getenv("CONSOLE_CONNECTIONS", "1000"))
+preload_app = os.getenv("CONSOLE_PRELOAD", "1") == "1"
+# gthread/gevent workers heartbeat from their own loop, so long SSE streams and
+# exports are not cut by this; it only catches a stuck worker
+timeout = int(os.getenv("CONSOLE_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("CONSOLE_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+# dashboard polls carry their SQL in the query string (GET /api/query?sql=)
+limit_request_line = 8190
+accesslog = os.getenv("CONSOLE_ACCESS_LOG") or None
+errorlog = "-"
+proc_name = "sql-console"
+
+
+def when_ready(server):
+    # preloaded app: DB connections opened at import must not be shared by forks
+    if preload_app:
+        import sql_console
+        sql_console.POOL.close()
@@ -1,26 +1,668 @@
 #!/usr/bin/env python3
-import os, time
+"""
+System metrics agent: samples CPU/memory and writes them to the stats table.
+
+Modes:
+  log_stats.py            -> one sample, then exit (driven by system-monitor.timer)
+  log_stats.py --daemon   -> long-running loop, one row every COLLECT_INTERVAL
+                             seconds aligned to the wall clock, single persistent
+                             DB connection (reconnects only on failure)
+  log_stats.py --spool-status -> print the local spool counters and exit
+
+With SAMPLE_INTERVAL < COLLECT_INTERVAL the daemon reads CPU/memory at the
+higher rate in memory and stores one row per COLLECT_INTERVAL holding the mean
+(cpu_usage/memory_usage) plus min, max and last of each metric, so short spikes
+stay visible without adding rows.
+
+Samples that cannot be inserted go to a local ring file (SPOOL_FILE) and are
+replayed in bulk once the DB is back (by a background thread in daemon mode).
+Only the stats rows are spooled: the extra metrics (metric_values) and process
+rows (process_stats) of a batch that could not be written are dropped, and the
+log line says how many.
+
+DB_TARGETS (comma-separated host[:port][/database], or SQLite file paths) writes
+every row to several databases instead of DB_HOST. The daemon flushes each
+batch to all of them concurrently on one asyncio event loop (aiodb.py), so one
+slow or unreachable target does not delay the others; each target has its own
+spool (SPOOL_FILE, SPOOL_FILE.1, ...) and replay thread. A target that has not
+taken the batch within TARGET_TIMEOUT seconds is cut off and the batch goes to
+its spool. One-shot runs write to the targets in turn.
+
+Rows go to the compact stats layout (schema v2: epoch ts, percentages in
+hundredths) once migrate_schema.py has swapped it in, and to the wide layout
+before that; the layout is checked on every (re)connect, so agents keep writing
+straight through the online migration. DB_BACKEND=sqlite writes to a local
+SQLite file instead of MySQL (see storage.py).
+"""
+import os, sys, json, time, heapq, socket, signal, asyncio, calendar, argparse, threading
 from datetime import datetime
-import psutil, pymysql
+import psutil
+import aiodb
+import storage
+from spool import Spool
 
 DB_HOST = os.getenv("DB_HOST", "127.0.0.1")
 DB_USER = os.getenv("DB_USER", "devops")
 DB_PASS = os.getenv("DB_PASS", "DevOpsPass456")
 DB_NAME = os.getenv("DB_NAME", "syslogs")
 
-def main():
-  cpu = psutil.cpu_percent(interval=1)
-  mem = psutil.virtual_memory().percent
-  ts = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-  for _ in range(5):
+HOST_NAME = os.getenv("HOST_NAME") or socket.gethostname()
+
+# write to several databases (None: DB_HOST / DB_NAME only)
+DB_TARGETS = [t.strip() for t in os.getenv("DB_TARGETS", "").split(",") if t.strip()]
+TARGETS = DB_TARGETS or [None]
+TARGET_TIMEOUT = float(os.getenv("TARGET_TIMEOUT", "5"))  # seconds per target and flush
+
+COLLECT_INTERVAL = float(os.getenv("COLLECT_INTERVAL", "15"))
+SAMPLE_INTERVAL = float(os.getenv("SAMPLE_INTERVAL", "0"))  # 0 = same as the storage interval
+EXTRA_METRICS = os.getenv("EXTRA_METRICS", "1") == "1"
+TOP_PROCESSES = int(os.getenv("TOP_PROCESSES", "0"))
+TOP_PROC_BUDGET = float(os.getenv("TOP_PROC_BUDGET", "0.25"))  # seconds per process scan
+STATE_DIR = os.getenv("STATE_DIR", os.path.dirname(os.path.abspath(__file__)))
+CPU_STATE_FILE = os.getenv("CPU_STATE_FILE", os.path.join(STATE_DIR, ".cpu_state.json"))
+
+SPOOL_FILE = os.getenv("SPOOL_FILE", os.path.join(STATE_DIR, "spool.bin"))
+# 7 days of rows; a record is 72 B (epoch + 8 doubles), so ~2.9 MB at 15s
+SPOOL_CAPACITY = int(os.getenv("SPOOL_CAPACITY", str(int(7 * 86400 // COLLECT_INTERVAL))))
+SPOOL_DRAIN_BATCH = int(os.getenv("SPOOL_DRAIN_BATCH", "500"))
+SPOOL_ONESHOT_BATCHES = int(os.getenv("SPOOL_ONESHOT_BATCHES", "4"))
+
+# daemon mode write batching: flush after FLUSH_ROWS samples or once the oldest
+# buffered sample is FLUSH_LATENCY seconds old, whichever comes first
+FLUSH_ROWS = int(os.getenv("FLUSH_ROWS", "1"))
+FLUSH_LATENCY = float(os.getenv("FLUSH_LATENCY", "60"))
+
+# one stored row: timestamp + values; cpu_usage/memory_usage are interval means
+ROW_COLUMNS = ("timestamp", "cpu_usage", "memory_usage",
+               "cpu_min", "cpu_max", "cpu_last", "mem_min", "mem_max", "mem_last")
+INSERT_SQL = "INSERT INTO stats (host_id, %s) VALUES (%s)" % (
+  ", ".join(ROW_COLUMNS), ",".join(["%s"] * (len(ROW_COLUMNS) + 1)))
+# schema v2: same row order, ts in epoch seconds and percentages as SMALLINT hundredths
+COMPACT_COLUMNS = ("ts", "cpu_x100", "mem_x100",
+                   "cpu_min_x100", "cpu_max_x100", "cpu_last_x100", "mem_min_x100", "mem_max_x100", "mem_last_x100")
+COMPACT_INSERT_SQL = "INSERT INTO stats (host_id, %s) VALUES (%s)" % (
+  ", ".join(COMPACT_COLUMNS), ",".join(["%s"] * (len(COMPACT_COLUMNS) + 1)))
+METRIC_SQL = storage.INSERT_IGNORE + " INTO metric_values (host_id, metric_id, timestamp, value) VALUES (%s,%s,%s,%s)"
+PROC_SQL = (storage.INSERT_IGNORE + " INTO process_stats (host_id, timestamp, pid, name, cpu_pct, rss_kb) "
+            "VALUES (%s,%s,%s,%s,%s,%s)")
+
+# per target: ids differ between databases
+_host_ids = {}
+_metric_ids = {}
+
+
+def connect_args(target=None):
+  """storage.connect() arguments for DB_HOST, or for one DB_TARGETS entry."""
+  args = dict(host=DB_HOST, user=DB_USER, password=DB_PASS, database=DB_NAME, connect_timeout=5)
+  if target is None:
+    return args
+  if storage.BACKEND == "sqlite":
+    return dict(args, path=target)
+  addr, _, database = target.partition("/")
+  host, _, port = addr.partition(":")
+  args.update(host=host, database=database or DB_NAME)
+  if port:
+    args["port"] = int(port)
+  return args
+
+
+def connect(target=None):
+  return storage.connect(**connect_args(target))
+
+
+def compact_layout(conn):
+  """True once stats has the schema v2 layout (epoch ts column)."""
+  return storage.has_column(conn, "stats", "ts")
+
+
+def compact_row(row):
+  """ROW_COLUMNS tuple -> COMPACT_COLUMNS tuple."""
+  ts = calendar.timegm(datetime.strptime(row[0], "%Y-%m-%d %H:%M:%S").timetuple())
+  return (ts,) + tuple(None if v is None else int(round(v * 100)) for v in row[1:])
+
+
+HOST_SQL = "SELECT id FROM hosts WHERE name=%s"
+# IGNORE: another agent may have registered the same name concurrently
+REGISTER_HOST_SQL = storage.INSERT_IGNORE + " INTO hosts (name) VALUES (%s)"
+REGISTER_METRIC_SQL = storage.INSERT_IGNORE + " INTO metrics (name) VALUES (%s)"
+
+
+def metric_ids_sql(names):
+  return "SELECT name, id FROM metrics WHERE name IN (%s)" % ",".join(["%s"] * len(names))
+
+
+def host_id(conn, target=None):
+  """hosts.id for HOST_NAME; registered on first use, then cached for the process lifetime."""
+  if target not in _host_ids:
+    with conn.cursor() as cur:
+      cur.execute(HOST_SQL, (HOST_NAME,))
+      row = cur.fetchone()
+      if row is None:
+        cur.execute(REGISTER_HOST_SQL, (HOST_NAME,))
+        cur.execute(HOST_SQL, (HOST_NAME,))
+        row = cur.fetchone()
+    _host_ids[target] = row[0]
+  return _host_ids[target]
+
+
+def metric_ids(conn, names, target=None):
+  """metrics.id for each name; unknown names are registered, all ids cached."""
+  ids = _metric_ids.setdefault(target, {})
+  missing = [n for n in names if n not in ids]
+  if missing:
+    with conn.cursor() as cur:
+      cur.executemany(REGISTER_METRIC_SQL, [(n,) for n in missing])
+      cur.execute(metric_ids_sql(missing), missing)
+      ids.update(cur.fetchall())
+  return ids
+
+
+def batch_statements(compact, hid, ids, rows, extras=(), procs=()):
+  """(sql, parameter rows) pairs inserting one batch; shared by Writer and FanoutWriter."""
+  if compact:
+    out = [(COMPACT_INSERT_SQL, [(hid,) + compact_row(r) for r in rows])]
+  else:
+    out = [(INSERT_SQL, [(hid,) + tuple(r) for r in rows])]
+  if extras:
+    out.append((METRIC_SQL, [(hid, ids[n], ts, v) for ts, m in extras for n, v in m.items()]))
+  if procs:
+    out.append((PROC_SQL, [(hid, ts) + tuple(p) for ts, top in procs for p in top]))
+  return out
+
+
+def cpu_busy(t):
+  """(total, busy) seconds of a cpu_times() tuple, counted the way psutil.cpu_percent does."""
+  total = sum(t)
+  # guest time is already included in user/nice on Linux
+  total -= getattr(t, "guest", 0.0) + getattr(t, "guest_nice", 0.0)
+  idle = t.idle + getattr(t, "iowait", 0.0)
+  return total, total - idle
+
+
+def cpu_snapshot():
+  """(total, busy) CPU seconds across all cores."""
+  return cpu_busy(psutil.cpu_times())
+
+
+def _rate(cur, prev, dt):
+  # counters can reset (device re-attach, wrap); report 0 rather than a negative rate
+  return round(max(0, cur - prev) / dt, 1)
+
+
+class MetricsCollector:
+  """
+  Extra host metrics in one psutil pass per call. The counter objects (per-core
+  CPU times, disk and network I/O) are kept between calls so every counter is
+  reported as a rate over the interval since the previous call.
+  """
+
+  def __init__(self):
+    self.prev = None
+    self.prev_time = None
+    self.collect()
+
+  def collect(self):
+    now = time.monotonic()
+    cores = psutil.cpu_times(percpu=True)
+    disk = psutil.disk_io_counters()
+    net = psutil.net_io_counters()
+    load1, load5, load15 = psutil.getloadavg()
+    out = {"load1": round(load1, 2), "load5": round(load5, 2), "load15": round(load15, 2),
+           "swap_pct": psutil.swap_memory().percent}
+
+    if self.prev is not None and now > self.prev_time:
+      dt = now - self.prev_time
+      p_cores, p_disk, p_net = self.prev
+      for i, (c, pc) in enumerate(zip(cores, p_cores)):
+        (total, busy), (p_total, p_busy) = cpu_busy(c), cpu_busy(pc)
+        if total > p_total:
+          out[f"cpu{i}_pct"] = round(min(100.0, max(0.0, (busy - p_busy) / (total - p_total) * 100)), 1)
+      if disk is not None and p_disk is not None:
+        out["disk_read_Bps"] = _rate(disk.read_bytes, p_disk.read_bytes, dt)
+        out["disk_write_Bps"] = _rate(disk.write_bytes, p_disk.write_bytes, dt)
+        out["disk_read_iops"] = _rate(disk.read_count, p_disk.read_count, dt)
+        out["disk_write_iops"] = _rate(disk.write_count, p_disk.write_count, dt)
+      if net is not None and p_net is not None:
+        out["net_rx_Bps"] = _rate(net.bytes_recv, p_net.bytes_recv, dt)
+        out["net_tx_Bps"] = _rate(net.bytes_sent, p_net.bytes_sent, dt)
+        out["net_rx_pps"] = _rate(net.packets_recv, p_net.packets_recv, dt)
+        out["net_tx_pps"] = _rate(net.packets_sent, p_net.packets_sent, dt)
+
+    self.prev = (cores, disk, net)
+    self.prev_time = now
+    return out
+
+
+class CpuSampler:
+  """
+  Non-blocking CPU utilisation from the delta between two cpu_times() snapshots.
+
+  Each call reports the average since the previous call, i.e. the whole sampling
+  interval. With `state_file` the previous snapshot is persisted so one-shot runs
+  measure the interval since the last timer tick.
+  """
+
+  def __init__(self, state_file=None):
+    self.state_file = state_file
+    self.prev = self._load() if state_file else cpu_snapshot()
+
+  def percent(self):
+    cur = cpu_snapshot()
+    prev, self.prev = self.prev, cur
+    if prev is not None:
+      d_total, d_busy = cur[0] - prev[0], cur[1] - prev[1]
+      if d_total > 0:
+        return round(min(100.0, max(0.0, d_busy / d_total * 100)), 1)
+    # no usable previous snapshot (first run, reboot): short blocking measurement
+    return psutil.cpu_percent(interval=0.1)
+
+  def _load(self):
+    try:
+      with open(self.state_file) as f:
+        st = json.load(f)
+      if st.get("boot") == psutil.boot_time():
+        return st["total"], st["busy"]
+    except (OSError, ValueError, KeyError):
+      pass
+    return None
+
+  def save(self):
+    if not self.state_file or self.prev is None:
+      return
+    tmp = self.state_file + ".tmp"
+    try:
+      with open(tmp, "w") as f:
+        json.dump({"boot": psutil.boot_time(), "total": self.prev[0], "busy": self.prev[1]}, f)
+      os.replace(tmp, self.state_file)
+    except OSError as e:
+      print(f"log_stats: cannot save CPU state: {e}", file=sys.stderr)
+
+
+def read_metrics(cpu_sampler):
+  return cpu_sampler.percent(), psutil.virtual_memory().percent
+
+
+class Downsampler:
+  """Folds readings taken within one storage interval into a single ROW_COLUMNS row."""
+
+  def __init__(self):
+    self.n = 0
+    self.acc = {}
+
+  def add(self, cpu, mem):
+    for key, v in (("cpu", cpu), ("mem", mem)):
+      a = self.acc.get(key)
+      if a is None:
+        self.acc[key] = [v, v, v, v]  # min, max, sum, last
+      else:
+        a[0] = min(a[0], v)
+        a[1] = max(a[1], v)
+        a[2] += v
+        a[3] = v
+    self.n += 1
+
+  def emit(self):
+    ts = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    c, m = self.acc["cpu"], self.acc["mem"]
+    row = (ts, round(c[2] / self.n, 1), round(m[2] / self.n, 1), c[0], c[1], c[3], m[0], m[1], m[3])
+    self.n = 0
+    self.acc = {}
+    return row
+
+
+def sample(cpu_sampler):
+  """A stored row from a single reading (min = max = mean = last)."""
+  agg = Downsampler()
+  agg.add(*read_metrics(cpu_sampler))
+  return agg.emit()
+
+
+class TopProcesses:
+  """
+  Top-N processes by CPU and by RSS, as (pid, name, cpu_pct, rss_kb) rows.
+
+  process_iter() keeps its Process objects between calls, so cpu_percent is a
+  cheap delta since the previous scan, and only the stored attributes are read.
+  A scan slower than `budget` seconds makes the next ones skip ticks, which
+  bounds the agent's cost on hosts with thousands of processes.
+  """
+  ATTRS = ["name", "cpu_percent", "memory_info"]
+
+  def __init__(self, n, budget=TOP_PROC_BUDGET):
+    self.n = n
+    self.budget = budget
+    self.skip = 0
+    self.last_cost = 0.0
+    self.scan()  # first scan only sets the cpu_percent baselines
+
+  def collect(self):
+    if self.skip:
+      self.skip -= 1
+      return None
+    return self.scan()
+
+  def scan(self):
+    started = time.monotonic()
+    procs = []
+    for p in psutil.process_iter(self.ATTRS):
+      info = p.info
+      mem = info["memory_info"]
+      procs.append((p.pid, (info["name"] or "?")[:32], info["cpu_percent"] or 0.0, mem.rss // 1024 if mem else 0))
+    top = {r[0]: r for r in heapq.nlargest(self.n, procs, key=lambda r: r[2])}
+    top.update((r[0], r) for r in heapq.nlargest(self.n, procs, key=lambda r: r[3]))
+    self.last_cost = time.monotonic() - started
+    self.skip = int(self.last_cost // self.budget) if self.budget > 0 else 0
+    return list(top.values())
+
+
+class Writer:
+  """Holds one DB connection across samples; reconnects only after a failure."""
+
+  def __init__(self, target=None):
+    self.target = target
+    self.conn = None
+    self.compact = False
+    self.reconnects = 0
+
+  def write(self, row):
+    return self.write_many([row])
+
+  def write_many(self, rows, extras=(), procs=()):
+    """
+    Insert stats rows plus (timestamp, {metric: value}) extras and
+    (timestamp, [process rows]) procs in one transaction.
+    """
+    # second attempt covers a connection the server dropped while we slept
+    for _ in range(2):
+      try:
+        if self.conn is None:
+          self.conn = connect(self.target)
+          self.compact = compact_layout(self.conn)
+          self.reconnects += 1
+        hid = host_id(self.conn, self.target)
+        ids = metric_ids(self.conn, sorted({n for _, m in extras for n in m}), self.target) if extras else {}
+        self.conn.begin()
+        with self.conn.cursor() as cur:
+          # pymysql folds these into multi-row INSERTs
+          for sql, params in batch_statements(self.compact, hid, ids, rows, extras, procs):
+            cur.executemany(sql, params)
+        self.conn.commit()
+        return True
+      except (*storage.Error, OSError) as e:
+        print(f"log_stats: insert failed{target_label(self.target)}: {e}", file=sys.stderr)
+        self.close()
+    return False
+
+  def write_targets(self, rows, extras=(), procs=()):
+    """write_many(); returns the targets the batch did not reach."""
+    return [] if self.write_many(rows, extras, procs) else [self.target]
+
+  def close(self):
+    if self.conn is not None:
+      try:
+        self.conn.close()
+      except Exception:
+        pass
+      self.conn = None
+
+
+class FanoutWriter:
+  """
+  Writes each batch to all DB_TARGETS concurrently: one aiodb connection per
+  target, driven from this thread's event loop, so the flush takes as long as
+  the slowest target rather than the sum of all of them, and at most `timeout`
+  seconds: a target still connecting or writing then is cancelled and counted
+  as missed. Its connection is closed without waiting for the statement in
+  flight, which ends the uncommitted transaction.
+  """
+
+  def __init__(self, targets, timeout=TARGET_TIMEOUT):
+    self.targets = list(targets)
+    self.timeout = timeout
+    self.loop = asyncio.new_event_loop()
+    self.pools = {t: aiodb.Pool(lambda t=t: aiodb.connect(**connect_args(t)), min_size=0, max_size=1)
+                  for t in self.targets}
+    self.layout = {}  # target -> (connection, compact) checked on every new connection
+
+  async def _host_id(self, conn, target):
+    if target not in _host_ids:
+      row = await conn.fetchone(HOST_SQL, (HOST_NAME,))
+      if row is None:
+        await conn.execute(REGISTER_HOST_SQL, (HOST_NAME,))
+        row = await conn.fetchone(HOST_SQL, (HOST_NAME,))
+      _host_ids[target] = row["id"]
+    return _host_ids[target]
+
+  async def _metric_ids(self, conn, names, target):
+    ids = _metric_ids.setdefault(target, {})
+    missing = [n for n in names if n not in ids]
+    if missing:
+      await conn.executemany(REGISTER_METRIC_SQL, [(n,) for n in missing])
+      ids.update((r["name"], r["id"]) for r in await conn.fetchall(metric_ids_sql(missing), missing))
+    return ids
+
+  async def _write(self, target, rows, extras, procs):
+    # second attempt covers a connection the server dropped while we slept
+    for _ in range(2):
+      try:
+        async with self.pools[target].connection() as conn:
+          known, compact = self.layout.get(target, (None, False))
+          if known is not conn:
+            compact = (await conn.fetchone(*storage.has_column_sql("stats", "ts")))["n"] > 0
+            self.layout[target] = (conn, compact)
+          hid = await self._host_id(conn, target)
+          ids = await self._metric_ids(conn, sorted({n for _, m in extras for n in m}), target) if extras else {}
+          async with conn.transaction():
+            for sql, params in batch_statements(compact, hid, ids, rows, extras, procs):
+              await conn.executemany(sql, params)
+        return True
+      except (*storage.Error, OSError, aiodb.dbpool.PoolTimeout) as e:
+        print(f"log_stats: insert failed{target_label(target)}: {e}", file=sys.stderr)
+    return False
+
+  async def _write_bounded(self, target, rows, extras, procs):
     try:
-      conn = pymysql.connect(host=DB_HOST, user=DB_USER, password=DB_PASS, database=DB_NAME, autocommit=True, connect_timeout=5)
-      with conn.cursor() as cur:
-        cur.execute("INSERT INTO stats (timestamp, cpu_usage, memory_usage) VALUES (%s,%s,%s)", (ts, cpu, mem))
-      conn.close()
+      return await asyncio.wait_for(self._write(target, rows, extras, procs), self.timeout)
+    except asyncio.TimeoutError:
+      print(f"log_stats: insert timed out after {self.timeout:g}s{target_label(target)}", file=sys.stderr)
+      return False
+
+  async def _write_all(self, rows, extras, procs):
+    return await asyncio.gather(*(self._write_bounded(t, rows, extras, procs) for t in self.targets))
+
+  def write_targets(self, rows, extras=(), procs=()):
+    """Write the batch to every target at once; returns the targets it did not reach."""
+    done = self.loop.run_until_complete(self._write_all(rows, extras, procs))
+    return [t for t, ok in zip(self.targets, done) if not ok]
+
+  def close(self):
+    for pool in self.pools.values():
+      self.loop.run_until_complete(pool.close())
+    self.loop.close()
+
+
+def target_label(target):
+  return "" if target is None else f" ({target})"
+
+
+def open_spool(target=None):
+  i = TARGETS.index(target)
+  return Spool(SPOOL_FILE if i == 0 else f"{SPOOL_FILE}.{i}", width=len(ROW_COLUMNS) - 1, capacity=SPOOL_CAPACITY)
+
+
+def drain(spool, writer, max_batches=None, stop=None):
+  """Replay spooled samples oldest-first in SPOOL_DRAIN_BATCH-row INSERTs."""
+  started = time.monotonic()
+  replayed = batches = 0
+  while max_batches is None or batches < max_batches:
+    if stop is not None and stop.is_set():
+      break
+    rows, upto = spool.peek(SPOOL_DRAIN_BATCH)
+    if not rows or not writer.write_many(rows):
       break
-    except Exception:
-      time.sleep(2)
+    spool.commit(upto)
+    replayed += len(rows)
+    batches += 1
+  if replayed:
+    elapsed = max(time.monotonic() - started, 1e-6)
+    print(f"log_stats: spool drained {replayed} rows in {elapsed:.2f}s "
+          f"({replayed / elapsed:.0f} rows/s), depth {spool.depth()}", file=sys.stderr)
+  return replayed
+
+
+class Drainer(threading.Thread):
+  """Replays the spool on its own connection so a backlog never delays fresh samples."""
+
+  def __init__(self, spool, stop, interval, target=None):
+    super().__init__(name="spool-drainer", daemon=True)
+    self.spool = spool
+    self.target = target
+    self.stop = stop
+    self.interval = interval
+    self.wake = threading.Event()
+
+  def kick(self):
+    self.wake.set()
+
+  def run(self):
+    writer = Writer(self.target)
+    try:
+      while not self.stop.is_set():
+        self.wake.wait(self.interval)
+        self.wake.clear()
+        if self.spool.depth():
+          drain(self.spool, writer, stop=self.stop)
+    finally:
+      writer.close()
+
+
+class Batcher:
+  """Buffers samples and writes them as one multi-row INSERT; spools the batch for each target it missed
+  (the stats rows only: its extras and process rows are dropped)."""
+
+  def __init__(self, writer, spools, max_rows=FLUSH_ROWS, max_latency=FLUSH_LATENCY):
+    self.writer = writer
+    self.spools = spools  # target -> Spool
+    self.max_rows = max(1, max_rows)
+    self.max_latency = max_latency
+    self.rows = []
+    self.extras = []
+    self.procs = []
+    self.deadline = None
+
+  def add(self, row, extra=None, procs=None):
+    if not self.rows:
+      self.deadline = time.time() + self.max_latency
+    self.rows.append(row)
+    if extra:
+      self.extras.append((row[0], extra))
+    if procs:
+      self.procs.append((row[0], procs))
+
+  def due(self, now):
+    return bool(self.rows) and (len(self.rows) >= self.max_rows or now >= self.deadline)
+
+  def flush(self):
+    """Write the buffered batch; returns the targets that are reachable (their spools can drain)."""
+    if not self.rows:
+      return list(self.spools)
+    rows, extras, procs = self.rows, self.extras, self.procs
+    self.rows, self.extras, self.procs, self.deadline = [], [], [], None
+    failed = self.writer.write_targets(rows, extras, procs)
+    for target in failed:
+      spool = self.spools[target]
+      spool.append(rows)
+      print(f"log_stats: DB unavailable{target_label(target)}, {len(rows)} samples spooled "
+            f"(depth {spool.depth()}), {sum(len(e) for _, e in extras)} metric values and "
+            f"{sum(len(p) for _, p in procs)} process rows dropped", file=sys.stderr)
+    return [t for t in self.spools if t not in failed]
+
+
+def next_tick(now, interval):
+  """First multiple of `interval` (epoch seconds) strictly after `now`."""
+  return (now // interval + 1) * interval
+
+
+def daemon(interval=COLLECT_INTERVAL, sample_interval=SAMPLE_INTERVAL):
+  stop = threading.Event()
+  for sig in (signal.SIGTERM, signal.SIGINT):
+    signal.signal(sig, lambda *_: stop.set())
+
+  writer = FanoutWriter(DB_TARGETS) if DB_TARGETS else Writer()
+  spools = {t: open_spool(t) for t in TARGETS}
+  drainers = {t: Drainer(spools[t], stop, interval, t) for t in TARGETS}
+  for drainer in drainers.values():
+    drainer.start()
+  batcher = Batcher(writer, spools)
+  cpu_sampler = CpuSampler()
+  collector = MetricsCollector() if EXTRA_METRICS else None
+  top = TopProcesses(TOP_PROCESSES) if TOP_PROCESSES > 0 else None
+  agg = Downsampler()
+  sample_interval = min(sample_interval or interval, interval)
+  tick = next_tick(time.time(), sample_interval)
+  store_tick = next_tick(time.time(), interval)
+  try:
+    while True:
+      wake = min(tick, batcher.deadline) if batcher.rows else tick
+      if stop.wait(max(0.0, wake - time.time())):
+        break
+      now = time.time()
+      if now >= tick:
+        agg.add(*read_metrics(cpu_sampler))
+        # skip ticks we overslept instead of bursting to catch up
+        tick = next_tick(max(tick, now), sample_interval)
+        if now >= store_tick:
+          batcher.add(agg.emit(), collector.collect() if collector else None, top.collect() if top else None)
+          store_tick = next_tick(max(store_tick, now), interval)
+      if batcher.due(time.time()):
+        for target in batcher.flush():
+          if spools[target].depth():
+            drainers[target].kick()
+  finally:
+    batcher.flush()
+    for drainer in drainers.values():
+      drainer.kick()
+    for drainer in drainers.values():
+      drainer.join(timeout=5)
+    writer.close()
+    for spool in spools.values():
+      spool.close()
+
+
+def main():
+  cpu_sampler = CpuSampler(state_file=CPU_STATE_FILE)
+  row = sample(cpu_sampler)
+  cpu_sampler.save()
+  for target in TARGETS:
+    writer = Writer(target)
+    spool = open_spool(target)
+    try:
+      if writer.write(row):
+        # bounded so a long backlog never stretches a timer run past its interval
+        drain(spool, writer, max_batches=SPOOL_ONESHOT_BATCHES)
+      else:
+        spool.append([row])
+        print(f"log_stats: DB unavailable{target_label(target)}, sample spooled (depth {spool.depth()})",
+              file=sys.stderr)
+    finally:
+      writer.close()
+      spool.close()
+
 
 if __name__ == "__main__":
-  main()
+  ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  ap.add_argument("--daemon", action="store_true", help="run continuously instead of taking a single sample")
+  ap.add_argument("--interval", type=float, default=COLLECT_INTERVAL, help="seconds between stored rows in daemon mode")
+  ap.add_argument("--sample-interval", type=float, default=SAMPLE_INTERVAL,
+                  help="seconds between in-memory readings in daemon mode (<= --interval)")
+  ap.add_argument("--spool-status", action="store_true", help="print spool depth/counters as JSON and exit")
+  args = ap.parse_args()
+  if args.spool_status:
+    if DB_TARGETS:
+      print(json.dumps({t: open_spool(t).stats() for t in DB_TARGETS}))
+    else:
+      print(json.dumps(open_spool().stats()))
+  elif args.daemon:
+    daemon(args.interval, args.sample_interval)
+  else:
+    main()
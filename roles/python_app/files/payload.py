@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compact response encodings for the console.
+
+  columnar(cols, rows) -> {"columns": [...], "types": [...], "data": {col: [...]}, "count": n}
+  compress(body, request.headers.get("Accept-Encoding", "")) -> (body, "br" | "gzip" | None)
+
+- columnar(): column names once, then one array per column instead of one
+  dict per row. Types are "int", "float", "str", or "epoch" for DATETIME
+  columns, which are sent as UTC epoch seconds instead of date strings.
+- compress(): brotli when the client accepts it and the optional brotli
+  module is installed, else gzip, else the body unchanged.
+"""
+
+import calendar
+import gzip
+import re
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # well below the default 11: per-request compression must stay cheap
+
+
+def _type(values) -> str:
+    v = next((v for v in values if v is not None), None)
+    if isinstance(v, bool) or isinstance(v, int):
+        return "int"
+    if isinstance(v, (float, Decimal)):
+        return "float"
+    if isinstance(v, (datetime, date)):
+        return "epoch"
+    return "str"
+
+
+def columnar(cols: Sequence[str], rows: List[Dict]) -> Dict:
+    data, types = {}, []
+    for c in cols:
+        values = [r[c] for r in rows]
+        t = _type(values)
+        if t == "epoch":
+            values = [None if v is None else calendar.timegm(v.timetuple()) for v in values]
+        elif t == "float":
+            values = [None if v is None else float(v) for v in values]
+        elif t == "str":
+            values = [None if v is None else str(v) for v in values]
+        data[c] = values
+        types.append(t)
+    return {"columns": list(cols), "types": types, "data": data, "count": len(rows)}
+
+
+def accepts(accept_encoding: str, coding: str) -> bool:
+    """True when Accept-Encoding lists `coding` (or *) without q=0."""
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip() in (coding, "*"):
+            m = re.search(r"q\s*=\s*([0-9.]+)", params)
+            return not m or float(m.group(1)) > 0
+    return False
+
+
+def compress(body: bytes, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+    if brotli is not None and accepts(accept_encoding, "br"):
+        return brotli.compress(body, quality=BROTLI_QUALITY), "br"
+    if accepts(accept_encoding, "gzip"):
+        return gzip.compress(body, GZIP_LEVEL), "gzip"
+    return body, None
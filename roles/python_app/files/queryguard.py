@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cost guard for ad-hoc console queries, so one query cannot pin the database
+the agents are writing to.
+
+  guard = Guard(max_concurrent=4, queue_timeout=2, timeout_ms=5000, warn_rows=100000, max_rows=2000000)
+  with guard.admit():                         # Busy -> 429 with Retry-After
+      with get_db() as conn:
+          notes = guard.check(conn, sql)      # Rejected -> 400; notes are warnings
+          with guard.limited(conn, sql) as s, conn.cursor() as cur:
+              cur.execute(s)                  # TimedOut -> 400
+
+- admit(): at most max_concurrent guarded queries run at once; others wait up
+  to queue_timeout seconds, then get Busy with a retry_after estimated from
+  recent query times.
+- check(): a pre-flight EXPLAIN. MySQL's row estimates are multiplied across
+  the plan (nested-loop fan-out); above max_rows the query is rejected, above
+  warn_rows it runs with a warning naming full scans, filesorts and temporary
+  tables. SQLite has no estimates: every full table SCAN in the plan counts
+  the table's size (MAX(rowid), or for WITHOUT ROWID tables the
+  sqlite_stat1 count or a COUNT(*) cached for count_ttl seconds).
+- limited(): a per-statement execution limit. MySQL gets a
+  MAX_EXECUTION_TIME optimizer hint, MariaDB SET STATEMENT
+  max_statement_time, and SQLite a progress handler that interrupts the
+  statement at the deadline.
+"""
+
+import math
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+import storage
+
+# MySQL ER_QUERY_TIMEOUT, MariaDB ER_STATEMENT_TIMEOUT
+TIMEOUT_ERRORS = (3024, 1969)
+
+TABLE_REF = re.compile(r"(?is)\b(?:from|join)\s+(\w+)(?:\s+(?:as\s+)?(\w+))?")
+SQL_WORDS = {"where", "join", "inner", "left", "right", "cross", "on", "group", "order", "limit",
+             "having", "union", "natural", "using"}
+
+# without any of these, a scan returns the first LIMIT rows it reads and stops
+PLAIN_SCAN_BREAKERS = re.compile(r"(?is)\b(where|join|group|order|having|distinct|union)\b|\(\s*select\b")
+
+
+def limit_sql(sql: str, timeout_ms: int, mariadb: bool = False) -> str:
+    """A MySQL/MariaDB SELECT rewritten to stop after timeout_ms."""
+    if mariadb:
+        return f"SET STATEMENT max_statement_time = {timeout_ms / 1000:g} FOR {sql}"
+    return re.sub(r"(?is)^\s*select\b", f"SELECT /*+ MAX_EXECUTION_TIME({timeout_ms}) */", sql, 1)
+
+
+def is_timeout(e: Exception) -> bool:
+    """True for the error a statement stopped by its time limit raises."""
+    code = e.args[0] if e.args and isinstance(e.args[0], int) else None
+    return code in TIMEOUT_ERRORS or "interrupted" in str(e)
+
+
+class Busy(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"too many queries running; retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class Rejected(Exception):
+    pass
+
+
+class TimedOut(Exception):
+    pass
+
+
+class Guard:
+    def __init__(self, max_concurrent: int = 4, queue_timeout: float = 2.0, timeout_ms: int = 5000,
+                 warn_rows: int = 100000, max_rows: int = 2000000, count_ttl: float = 60.0):
+        self.max_concurrent = max_concurrent
+        self.queue_timeout = queue_timeout
+        self.timeout_ms = timeout_ms
+        self.warn_rows = warn_rows
+        self.max_rows = max_rows
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._avg_s = 0.0  # moving average of guarded query time
+        self._running = self._waiting = 0
+        self._stats = dict(admitted=0, busy=0, rejected=0, warned=0, timed_out=0)
+        self.count_ttl = count_ttl
+        self._counts: Dict[str, tuple] = {}  # SQLite WITHOUT ROWID table -> (rows, counted at)
+
+    # ---- admission ----
+    @contextmanager
+    def admit(self):
+        with self._lock:
+            self._waiting += 1
+        ok = self._slots.acquire(timeout=self.queue_timeout)
+        with self._lock:
+            self._waiting -= 1
+            if not ok:
+                self._stats["busy"] += 1
+                # queued work ahead of a retry, spread over the slots (the time limit until measured)
+                avg = self._avg_s or self.timeout_ms / 1000
+                wait = avg * (self._running + self._waiting) / self.max_concurrent
+                raise Busy(max(1, math.ceil(wait)))
+            self._running += 1
+            self._stats["admitted"] += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._running -= 1
+                self._avg_s = elapsed if not self._avg_s else 0.8 * self._avg_s + 0.2 * elapsed
+            self._slots.release()
+
+    # ---- pre-flight EXPLAIN ----
+    def estimate(self, conn, sql: str):
+        """(estimated rows examined, plan notes) for one SELECT."""
+        notes: List[str] = []
+        with storage.dict_cursor(conn) as cur:
+            if storage.BACKEND == "sqlite":
+                cur.execute("EXPLAIN QUERY PLAN " + sql)
+                plan = [r["detail"] for r in cur.fetchall()]
+                # the plan names tables by their alias
+                tables = {(alias or name).lower(): name for name, alias in TABLE_REF.findall(sql)
+                          if (alias or "").lower() not in SQL_WORDS}
+                scans, built = 1, 0
+                for detail in plan:
+                    m = re.match(r"(SCAN|SEARCH) (\w+)", detail)
+                    table = tables.get(m.group(2).lower(), m.group(2)) if m else None
+                    full = m and m.group(1) == "SCAN" and "INDEX" not in detail
+                    if full or (m and "AUTOMATIC" in detail):
+                        n = self._sqlite_rows(cur, table)
+                        if n is None:
+                            continue  # a subquery or CTE, not a table
+                        if full:
+                            scans *= n  # nested loop over every row
+                        else:
+                            built += n  # one pass to build a temporary index
+                        notes.append(f"{'full scan' if full else 'automatic index'} of {table} (~{n} rows)")
+                    if "TEMP B-TREE" in detail:
+                        notes.append(detail.lower())
+                return scans + built if scans > 1 or built else 1, notes
+            cur.execute("EXPLAIN " + sql)
+            plan = cur.fetchall()
+        est = 1.0
+        for r in plan:
+            rows = float(r.get("rows") or 1)
+            est *= max(1.0, rows * float(r.get("filtered") or 100) / 100)
+            extra = r.get("Extra") or ""
+            if r.get("type") == "ALL":
+                notes.append(f"full scan of {r.get('table')} (~{int(rows)} rows)")
+            for what in ("Using filesort", "Using temporary"):
+                if what in extra and rows > self.warn_rows:
+                    notes.append(f"{what.lower()} over ~{int(rows)} rows of {r.get('table')}")
+        return int(est), notes
+
+    def _sqlite_rows(self, cur, table: str):
+        """Rows in a SQLite table (at least 1), or None when `table` is not one."""
+        try:
+            cur.execute(f"SELECT COALESCE(MAX(_rowid_), 0) AS n FROM {table}")
+            return max(1, cur.fetchone()["n"])
+        except storage.Error:
+            pass
+        cur.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = %s COLLATE NOCASE", (table,))
+        if cur.fetchone() is None:
+            return None
+        # WITHOUT ROWID (metric_values, process_stats): ANALYZE's count, else a cached COUNT(*)
+        try:
+            cur.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s COLLATE NOCASE LIMIT 1", (table,))
+            r = cur.fetchone()
+        except storage.Error:
+            r = None  # never analyzed
+        if r and r["stat"]:
+            return max(1, int(r["stat"].split()[0]))
+        key = table.lower()
+        with self._lock:
+            n, at = self._counts.get(key, (0, 0.0))
+        if time.monotonic() - at > self.count_ttl:
+            cur.execute(f"SELECT COUNT(*) AS n FROM {table}")
+            n = cur.fetchone()["n"]
+            with self._lock:
+                self._counts[key] = (n, time.monotonic())
+        return max(1, n)
+
+    def check(self, conn, sql: str) -> List[str]:
+        """Warnings for an acceptable query; Rejected when the estimate exceeds max_rows."""
+        est, notes = self.estimate(conn, sql)
+        m = re.search(r"(?is)\blimit\s+(\d+)", sql)
+        if m and not PLAIN_SCAN_BREAKERS.search(sql):
+            est = min(est, int(m.group(1)))  # a bare scan stops at the LIMIT
+        if est > self.max_rows:
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise Rejected(f"query would examine ~{est} rows (limit {self.max_rows}): "
+                           + "; ".join(notes or ["no index fits"])
+                           + ". Narrow it with a ts range or host_id.")
+        if est > self.warn_rows:
+            notes.insert(0, f"~{est} rows examined")
+            with self._lock:
+                self._stats["warned"] += 1
+            return notes
+        return []
+
+    # ---- execution time limit ----
+    @contextmanager
+    def limited(self, conn, sql: str):
+        """Yields `sql` rewritten (or the connection armed) to stop after timeout_ms."""
+        if storage.BACKEND == "sqlite":
+            deadline = time.monotonic() + self.timeout_ms / 1000
+            conn.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+            limited = sql
+        else:
+            limited = limit_sql(sql, self.timeout_ms, "mariadb" in conn.get_server_info().lower())
+        try:
+            yield limited
+        except storage.Error as e:
+            if is_timeout(e):
+                with self._lock:
+                    self._stats["timed_out"] += 1
+                raise TimedOut(f"query stopped after the {self.timeout_ms} ms execution limit") from None
+            raise
+        finally:
+            if storage.BACKEND == "sqlite":
+                conn.set_progress_handler(None, 0)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, running=self._running, waiting=self._waiting,
+                        max_concurrent=self.max_concurrent, avg_ms=round(self._avg_s * 1000, 1))
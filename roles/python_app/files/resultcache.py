@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shared query result cache with request coalescing for the console.
+
+  cache = ResultCache(ttl=15, watermark=lambda: stats_watermark())
+  cols, rows, summary = cache.get(sql, lambda: run(sql))
+
+- An entry is served while it is younger than ttl (the agents' collection
+  interval) and the stats high-water mark (in the console: MAX(stats.id) and
+  the row count just below it) has not moved since it was computed; new rows
+  invalidate every entry at once.
+- The high-water mark itself is read at most once per check_every seconds,
+  however many requests arrive, so DB load does not grow with viewers. The
+  read runs outside the lock: requests arriving meanwhile use the previous
+  value instead of queueing behind it.
+- Concurrent misses for the same key are coalesced: one thread runs the
+  query, the others wait for its result (or its exception) up to
+  wait_timeout seconds, then run it themselves.
+- At most max_entries keys are kept (least recently used evicted).
+- changed_at() is when the high-water mark last moved, for Last-Modified.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+
+class _Flight:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResultCache:
+    def __init__(self, ttl: float, watermark: Callable[[], Any], check_every: float = 1.0,
+                 max_entries: int = 256, wait_timeout: float = 30.0):
+        self.ttl = ttl
+        self.check_every = check_every
+        self.max_entries = max_entries
+        self.wait_timeout = wait_timeout
+        self._watermark_fn = watermark
+        self._lock = threading.Lock()
+        self._wm_lock = threading.Lock()
+        self._wm = None
+        self._wm_at = float("-inf")
+        self._wm_reading = False  # a thread is reading the high-water mark
+        self._wm_changed = time.time()  # wall-clock time the high-water mark last moved
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (value, watermark, stored_at)
+        self._inflight: Dict[Hashable, _Flight] = {}
+        self._stats = dict(hits=0, misses=0, coalesced=0, expired=0, invalidated=0,
+                           watermark_checks=0, errors=0, wait_timeouts=0)
+
+    def watermark(self):
+        """Current high-water mark, re-read from the DB at most every check_every seconds."""
+        with self._wm_lock:
+            if self._wm_reading or time.monotonic() - self._wm_at < self.check_every:
+                return self._wm
+            self._wm_reading = True
+        try:
+            wm = self._watermark_fn()
+        except BaseException:
+            with self._wm_lock:
+                self._wm_reading = False
+            raise
+        with self._wm_lock:
+            if wm != self._wm:
+                self._wm_changed = time.time()
+            self._wm = wm
+            self._wm_at = time.monotonic()
+            self._wm_reading = False
+        with self._lock:
+            self._stats["watermark_checks"] += 1
+        return wm
+
+    def changed_at(self) -> float:
+        """Epoch seconds when watermark() last returned a new value (for Last-Modified)."""
+        return self._wm_changed
+
+    def get(self, key: Hashable, compute: Callable[[], Any]):
+        wm = self.watermark()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, entry_wm, stored = entry
+                if entry_wm == wm and time.monotonic() - stored < self.ttl:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return value
+                self._stats["invalidated" if entry_wm != wm else "expired"] += 1
+                del self._entries[key]
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self._stats["misses"] += 1
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            if flight.done.wait(self.wait_timeout):
+                if flight.error is not None:
+                    raise flight.error
+                return flight.value
+            # the leader is stuck: run the query here rather than wait on
+            with self._lock:
+                self._stats["wait_timeouts"] += 1
+            return compute()
+
+        try:
+            flight.value = compute()
+        except BaseException as e:
+            flight.error = e
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        else:
+            with self._lock:
+                self._entries[key] = (flight.value, wm, time.monotonic())
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return flight.value
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.done.set()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            out = dict(self._stats, entries=len(self._entries), inflight=len(self._inflight),
+                       ttl=self.ttl, watermark=self._wm)
+        served = out["hits"] + out["coalesced"] + out["misses"]
+        out["hit_ratio"] = round((out["hits"] + out["coalesced"]) / served, 3) if served else None
+        return out
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Incrementally maintained 1m / 1h / 1d rollups of stats, plus the query layer on top.
+
+  rollup.py update          -> fold stats rows newer than the high-water mark into
+                               stats_1m, stats_1h and stats_1d (one pass, then exit)
+  rollup.py update --loop   -> same, every ROLLUP_INTERVAL seconds
+
+Each rollup row holds count, min, max, sum and sum of squares per (host, bucket)
+for cpu and memory, so any coarser bucket, mean or stddev can be derived exactly
+by summing rows. Progress is tracked as the last folded stats.id in
+rollup_state, so late rows (e.g. replayed from an agent spool) still land in
+their original bucket. Concurrent updaters are serialised with GET_LOCK.
+
+Agents insert concurrently, so a lower auto-increment id can commit after a
+higher one; folding up to MAX(id) at read time would skip it for good. Each
+pass therefore folds only up to a MAX(id) recorded at least ROLLUP_SETTLE
+seconds earlier (rollup_state 'stats_seen' / 'stats_seen_at', DB clock), by
+when every transaction holding a lower id has finished. Rollups trail raw
+stats by about one ROLLUP_INTERVAL more, and a first pass only records.
+
+series() answers (start, end, resolution) from the coarsest source whose bucket
+is no wider than the requested resolution, falling back to raw stats below 1m
+(ranged on the epoch ts column so the clustered (host_id, ts) key is used).
+summary() aggregates a whole window into one row from the same sources, and
+percentiles() pushes a histogram of the raw rows into the DB. With
+DB_BACKEND=sqlite there are no rollup tables and series() always reads raw
+stats.
+"""
+
+import os
+import sys
+import math
+import time
+import calendar
+import argparse
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import storage
+
+DB_HOST = os.getenv("DB_HOST", "127.0.0.1")
+DB_USER = os.getenv("DB_USER", "devops")
+DB_PASS = os.getenv("DB_PASS", "")
+DB_NAME = os.getenv("DB_NAME", "syslogs")
+
+ROLLUP_INTERVAL = float(os.getenv("ROLLUP_INTERVAL", "60"))
+ROLLUP_CHUNK = int(os.getenv("ROLLUP_CHUNK", "100000"))  # stats ids per pass
+# seconds an observed MAX(id) must age before folding up to it (longer than any agent transaction)
+ROLLUP_SETTLE = int(os.getenv("ROLLUP_SETTLE", "30"))
+
+# (table, bucket seconds, DATE_FORMAT pattern), finest first
+LEVELS = [
+    ("stats_1m", 60, "%%Y-%%m-%%d %%H:%%i:00"),
+    ("stats_1h", 3600, "%%Y-%%m-%%d %%H:00:00"),
+    ("stats_1d", 86400, "%%Y-%%m-%%d 00:00:00"),
+]
+
+# min/max use the per-interval spread columns when the agent wrote them
+FOLD_SQL = """
+    SELECT host_id, DATE_FORMAT(timestamp, '{fmt}') AS bucket, COUNT(*) AS n,
+           MIN(COALESCE(cpu_min, cpu_usage)), MAX(COALESCE(cpu_max, cpu_usage)),
+           SUM(cpu_usage), SUM(cpu_usage * cpu_usage),
+           MIN(COALESCE(mem_min, memory_usage)), MAX(COALESCE(mem_max, memory_usage)),
+           SUM(memory_usage), SUM(memory_usage * memory_usage)
+    FROM stats
+    WHERE id > %s AND id <= %s
+    GROUP BY host_id, bucket
+"""
+
+MERGE_SQL = """
+    INSERT INTO {table} (host_id, bucket, n, cpu_min, cpu_max, cpu_sum, cpu_sumsq,
+                         mem_min, mem_max, mem_sum, mem_sumsq)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        n = n + VALUES(n),
+        cpu_min = LEAST(cpu_min, VALUES(cpu_min)), cpu_max = GREATEST(cpu_max, VALUES(cpu_max)),
+        cpu_sum = cpu_sum + VALUES(cpu_sum), cpu_sumsq = cpu_sumsq + VALUES(cpu_sumsq),
+        mem_min = LEAST(mem_min, VALUES(mem_min)), mem_max = GREATEST(mem_max, VALUES(mem_max)),
+        mem_sum = mem_sum + VALUES(mem_sum), mem_sumsq = mem_sumsq + VALUES(mem_sumsq)
+"""
+
+
+def get_db(dict_rows=False):
+    return storage.connect(
+        host=DB_HOST,
+        user=DB_USER,
+        password=DB_PASS,
+        database=DB_NAME,
+        dict_rows=dict_rows,
+    )
+
+
+STATE_SQL = ("INSERT INTO rollup_state (name, last_id) VALUES (%s, %s) "
+             "ON DUPLICATE KEY UPDATE last_id = VALUES(last_id)")
+
+
+def update(conn) -> int:
+    """Fold settled stats rows above the high-water mark; returns the number of rows folded."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT GET_LOCK('stats_rollup', 0)")
+        if not cur.fetchone()[0]:
+            return 0  # another updater is running
+        try:
+            cur.execute("SELECT name, last_id FROM rollup_state "
+                        "WHERE name IN ('stats', 'stats_seen', 'stats_seen_at')")
+            state = {name: value for name, value in cur.fetchall()}
+            last = state.get("stats", 0)
+            cur.execute("SELECT COALESCE(MAX(id), 0), UNIX_TIMESTAMP() FROM stats")
+            head, now = cur.fetchone()
+            # ids up to an old enough observation are settled: fold those, then observe again
+            settled = "stats_seen" in state and now - state.get("stats_seen_at", 0) >= ROLLUP_SETTLE
+            top = state["stats_seen"] if settled else last
+            if settled or "stats_seen" not in state:
+                conn.begin()
+                cur.execute(STATE_SQL, ("stats_seen", head))
+                cur.execute(STATE_SQL, ("stats_seen_at", now))
+                conn.commit()
+            folded = 0
+            while last < top:
+                hi = min(top, last + ROLLUP_CHUNK)
+                deltas = []
+                for table, _, fmt in LEVELS:
+                    cur.execute(FOLD_SQL.format(fmt=fmt), (last, hi))
+                    deltas.append((table, cur.fetchall()))
+                conn.begin()
+                for table, rows in deltas:
+                    if rows:
+                        cur.executemany(MERGE_SQL.format(table=table), rows)
+                cur.execute(STATE_SQL, ("stats", hi))
+                conn.commit()
+                folded += sum(r[2] for r in deltas[0][1])
+                last = hi
+            return folded
+        finally:
+            cur.execute("SELECT RELEASE_LOCK('stats_rollup')")
+
+
+def pick_source(resolution: float) -> Tuple[str, str, int]:
+    """(table, time column, bucket seconds) of the coarsest source no wider than `resolution`."""
+    source = ("stats", "ts", 0)
+    if storage.BACKEND == "sqlite":
+        return source
+    for table, seconds, _ in LEVELS:
+        if seconds <= resolution:
+            source = (table, "bucket", seconds)
+    return source
+
+
+def _aggregate(table: str, tcol: str, start: datetime, end: datetime,
+               host_id: Optional[int]) -> Tuple[str, str, list]:
+    """(SELECT list of n and cpu/mem avg/min/max/std, WHERE clause, params) over one source."""
+    if table == "stats":
+        agg = ("COUNT(*)", "MIN(COALESCE(cpu_min, cpu_usage))", "MAX(COALESCE(cpu_max, cpu_usage))",
+               "SUM(cpu_usage)", "SUM(cpu_usage * cpu_usage)",
+               "MIN(COALESCE(mem_min, memory_usage))", "MAX(COALESCE(mem_max, memory_usage))",
+               "SUM(memory_usage)", "SUM(memory_usage * memory_usage)")
+    else:
+        agg = ("SUM(n)", "MIN(cpu_min)", "MAX(cpu_max)", "SUM(cpu_sum)", "SUM(cpu_sumsq)",
+               "MIN(mem_min)", "MAX(mem_max)", "SUM(mem_sum)", "SUM(mem_sumsq)")
+    n, cmin, cmax, csum, csq, mmin, mmax, msum, msq = agg
+    columns = f"""{n} AS n,
+               ROUND({csum} / {n}, 2) AS cpu_avg, {cmin} AS cpu_min, {cmax} AS cpu_max,
+               ROUND(SQRT(GREATEST({csq} / {n} - POW({csum} / {n}, 2), 0)), 2) AS cpu_std,
+               ROUND({msum} / {n}, 2) AS mem_avg, {mmin} AS mem_min, {mmax} AS mem_max,
+               ROUND(SQRT(GREATEST({msq} / {n} - POW({msum} / {n}, 2), 0)), 2) AS mem_std"""
+    where = f"{tcol} >= %s AND {tcol} < %s"
+    params: list = [start, end]
+    if tcol == "ts":
+        params = [calendar.timegm(start.timetuple()), calendar.timegm(end.timetuple())]
+    if host_id is not None:
+        where += " AND host_id = %s"
+        params.append(host_id)
+    return columns, where, params
+
+
+def series(cur, start: datetime, end: datetime, resolution: float,
+           host_id: Optional[int] = None) -> List[Dict]:
+    """
+    One row per `resolution`-second bucket in [start, end): n, and avg/min/max/std
+    for cpu and memory. `cur` must be a DictCursor.
+    """
+    table, tcol, _ = pick_source(resolution)
+    res = max(1, int(resolution))
+    columns, where, params = _aggregate(table, tcol, start, end, host_id)
+    bucket = f"FROM_UNIXTIME(FLOOR(UNIX_TIMESTAMP({tcol}) / {res}) * {res})"
+    if tcol == "ts":
+        # epoch seconds are UTC; build the DATETIME without the session time zone
+        bucket = storage.epoch_datetime(f"FLOOR(ts / {res}) * {res}")
+    cur.execute(f"""
+        SELECT {bucket} AS t,
+               {columns}
+        FROM {table}
+        WHERE {where}
+        GROUP BY t
+        ORDER BY t
+    """, params)
+    rows = cur.fetchall()
+    if storage.BACKEND == "sqlite":
+        for r in rows:
+            r["t"] = datetime.strptime(r["t"], storage.TS_FMT)
+    return rows
+
+
+def summary(cur, start: datetime, end: datetime, resolution: float,
+            host_id: Optional[int] = None) -> Dict:
+    """
+    n and avg/min/max/std for cpu and memory over all of [start, end), in one
+    aggregate row, read from the same source series() would use at `resolution`
+    (rollup buckets sum exactly; the window edges are rounded to that source's
+    bucket). `cur` must be a DictCursor.
+    """
+    table, tcol, _ = pick_source(resolution)
+    columns, where, params = _aggregate(table, tcol, start, end, host_id)
+    cur.execute(f"SELECT {columns} FROM {table} WHERE {where}", params)
+    row = cur.fetchone()
+    row["n"] = int(row["n"] or 0)
+    return row
+
+
+def percentiles(cur, start: datetime, end: datetime, host_id: Optional[int] = None,
+                ps: Sequence[float] = (50, 95, 99), step: int = 10) -> Dict:
+    """
+    Nearest-rank percentiles of cpu and memory over raw stats in [start, end),
+    e.g. {"cpu_p95": 71.4, ...}, rounded down to `step` hundredths (0.1 point).
+
+    Rollups cannot be merged into percentiles, so this reads raw rows, but the DB
+    returns a histogram (one row per `step` hundredths, at most 10000/step + 1
+    rows) rather than the rows themselves.
+    """
+    where = "ts >= %s AND ts < %s"
+    params: list = [calendar.timegm(start.timetuple()), calendar.timegm(end.timetuple())]
+    if host_id is not None:
+        where += " AND host_id = %s"
+        params.append(host_id)
+    out: Dict = {}
+    for name, col in (("cpu", "cpu_x100"), ("mem", "mem_x100")):
+        cur.execute(f"SELECT FLOOR({col} / {step}) AS b, COUNT(*) AS n FROM stats "
+                    f"WHERE {where} AND {col} IS NOT NULL GROUP BY b ORDER BY b", params)
+        hist = [(int(r["b"]), int(r["n"])) for r in cur.fetchall()]
+        total = sum(n for _, n in hist)
+        for p in ps:
+            out[f"{name}_p{p:g}"] = None
+            if not total:
+                continue
+            rank, seen = max(1, math.ceil(p / 100 * total)), 0
+            for b, n in hist:
+                seen += n
+                if seen >= rank:
+                    out[f"{name}_p{p:g}"] = round(b * step / 100, 2)
+                    break
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("command", choices=["update"])
+    ap.add_argument("--loop", action="store_true", help=f"repeat every ROLLUP_INTERVAL ({ROLLUP_INTERVAL:g}s)")
+    args = ap.parse_args()
+    if storage.BACKEND == "sqlite":
+        sys.exit("rollup: not used with DB_BACKEND=sqlite (series() reads raw stats)")
+    conn = get_db()
+    try:
+        while True:
+            started = time.monotonic()
+            folded = update(conn)
+            if folded:
+                print(f"rollup: folded {folded} rows in {time.monotonic() - started:.2f}s", file=sys.stderr)
+            if not args.loop:
+                break
+            time.sleep(max(0.0, ROLLUP_INTERVAL - (time.monotonic() - started)))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Fixed-size on-disk ring buffer for samples the agent could not write to MySQL.
+
+File layout: one header followed by `capacity` fixed-width records.
+  header : magic, capacity, width, head (next write seq), tail (next read seq),
+           dropped (overwritten before replay), drained (replayed so far)
+  record : epoch seconds (int64) + `width` doubles (NaN stands for NULL)
+
+Sequences only grow; slot = seq % capacity. When the ring is full the oldest
+sample is overwritten, so the file never grows past its initial size.
+Access is serialised with a thread lock plus flock() (timer runs may overlap),
+opening included: the header check and any (re)initialisation run under the
+flock, in place, so no run resets or moves a file another run is writing.
+A file written with a different record width (or the original SMSPOOL1
+cpu/memory layout) is converted in place: its unreplayed samples are carried
+over, with NULL for columns it did not have. A file in no known layout is
+copied to <path>.old before being reinitialised.
+"""
+import os, sys, math, fcntl, struct, calendar, threading
+from contextlib import contextmanager
+from datetime import datetime
+
+MAGIC = b"SMSPOOL2"
+HDR = struct.Struct("<8sQQQQQQ")
+# first layout: no width field, records of epoch + cpu + memory
+MAGIC_V1 = b"SMSPOOL1"
+HDR_V1 = struct.Struct("<8sQQQQQ")
+TS_FMT = "%Y-%m-%d %H:%M:%S"
+
+
+class Spool:
+
+  def __init__(self, path, width, capacity=40320):
+    self.path = path
+    self.width = width
+    self.rec = struct.Struct("<q%dd" % width)
+    self.lock = threading.Lock()
+    self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    with self._locked():
+      raw = os.pread(self.fd, HDR.size, 0)
+      if len(raw) == HDR.size and raw[:8] == MAGIC and HDR.unpack(raw)[2] == width:
+        self.capacity = HDR.unpack(raw)[1]
+        return
+      records, dropped, drained = self._carry_over(raw)
+      if len(records) > capacity:
+        dropped += len(records) - capacity
+        records = records[-capacity:]
+      self.capacity = capacity
+      os.ftruncate(self.fd, 0)
+      os.ftruncate(self.fd, HDR.size + capacity * self.rec.size)
+      for seq, rec in enumerate(records):
+        os.pwrite(self.fd, self.rec.pack(*rec), self._offset(seq))
+      self._write_hdr(len(records), 0, dropped, drained)
+
+  def _carry_over(self, raw):
+    """Unreplayed (epoch, values...) records of a file in another layout, in this width, plus its counters."""
+    if len(raw) == HDR.size and raw[:8] == MAGIC:
+      _, cap, width, head, tail, dropped, drained = HDR.unpack(raw)
+      hdr_size = HDR.size
+    elif len(raw) >= HDR_V1.size and raw[:8] == MAGIC_V1:
+      _, cap, head, tail, dropped, drained = HDR_V1.unpack(raw[:HDR_V1.size])
+      width, hdr_size = 2, HDR_V1.size
+    else:
+      if raw:
+        size = os.fstat(self.fd).st_size
+        with open(self.path + ".old", "wb") as f:
+          f.write(os.pread(self.fd, size, 0))
+        print(f"spool: {self.path} has an unknown layout, copied to {self.path}.old", file=sys.stderr)
+      return [], 0, 0
+    rec = struct.Struct("<q%dd" % width)
+    records = []
+    for seq in range(max(tail, head - cap), head):
+      epoch, *values = rec.unpack(os.pread(self.fd, rec.size, hdr_size + (seq % cap) * rec.size))
+      records.append((epoch, *(values + [math.nan] * self.width)[:self.width]))
+    print(f"spool: {self.path}: carried {len(records)} samples over from record width {width} to {self.width}",
+          file=sys.stderr)
+    return records, dropped, drained
+
+  def _pack(self, row):
+    ts, values = row[0], row[1:]
+    epoch = calendar.timegm(datetime.strptime(ts, TS_FMT).timetuple())
+    return self.rec.pack(epoch, *(math.nan if v is None else v for v in values))
+
+  def _unpack(self, buf):
+    epoch, *values = self.rec.unpack(buf)
+    ts = datetime.utcfromtimestamp(epoch).strftime(TS_FMT)
+    return (ts, *(None if math.isnan(v) else v for v in values))
+
+  @contextmanager
+  def _locked(self):
+    with self.lock:
+      fcntl.flock(self.fd, fcntl.LOCK_EX)
+      try:
+        yield
+      finally:
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+  def _read_hdr(self):
+    return HDR.unpack(os.pread(self.fd, HDR.size, 0))[3:]
+
+  def _write_hdr(self, head, tail, dropped, drained):
+    os.pwrite(self.fd, HDR.pack(MAGIC, self.capacity, self.width, head, tail, dropped, drained), 0)
+
+  def _offset(self, seq):
+    return HDR.size + (seq % self.capacity) * self.rec.size
+
+  def append(self, rows):
+    """Add samples; overwrites the oldest ones once the ring is full."""
+    with self._locked():
+      head, tail, dropped, drained = self._read_hdr()
+      for row in rows:
+        os.pwrite(self.fd, self._pack(row), self._offset(head))
+        head += 1
+      if head - tail > self.capacity:
+        dropped += head - tail - self.capacity
+        tail = head - self.capacity
+      self._write_hdr(head, tail, dropped, drained)
+
+  def peek(self, limit):
+    """Oldest `limit` samples plus the sequence to pass to commit() once stored."""
+    with self._locked():
+      head, tail, _, _ = self._read_hdr()
+      upto = min(head, tail + limit)
+      rows = [self._unpack(os.pread(self.fd, self.rec.size, self._offset(seq))) for seq in range(tail, upto)]
+    return rows, upto
+
+  def commit(self, upto):
+    """Forget everything before `upto` (returned by peek)."""
+    with self._locked():
+      head, tail, dropped, drained = self._read_hdr()
+      if upto > tail:
+        drained += upto - tail
+        tail = upto
+      self._write_hdr(head, tail, dropped, drained)
+
+  def depth(self):
+    with self._locked():
+      head, tail, _, _ = self._read_hdr()
+    return head - tail
+
+  def stats(self):
+    with self._locked():
+      head, tail, dropped, drained = self._read_hdr()
+    return {"path": self.path, "depth": head - tail, "capacity": self.capacity,
+            "dropped": dropped, "drained": drained}
+
+  def close(self):
+    os.close(self.fd)
@@ -6,51 +6,214 @@ Combined SQL console + interactive dashboard.
 Exposes:
   GET  /              -> dashboard UI (query editor + KPIs + chart)
   POST /api/query     -> { sql: "SELECT ..." } -> rows + summary
-  GET  /api/query     -> re-run last query (for auto-refresh)
+                         { host: "app1" }     -> default query for one host
+                         { ..., format: "columnar" } -> column arrays instead
+                         of row dicts (see payload.py)
+                         { ..., points: n | width: px } -> every row, plus
+                         "chart": the indices of at most n rows that keep the
+                         float columns' shape over the time column (LTTB; min/max
+                         per pixel column with width; see downsample.py)
+                         { ..., downsample: "lttb" | "minmax", points | width }
+                         -> only the picked rows; the LIMIT may then go up
+                         to DOWNSAMPLE_MAX_ROWS
+  GET  /api/query     -> ?sql=SELECT ... runs that query (DEFAULT_QUERY without
+                         one; ?host= the per-host query); the dashboard's
+                         auto-refresh. ?format=columnar, ?points=&width=&
+                         downsample= as above. Nothing is remembered between
+                         requests, so polls may land on any worker.
+                         Sends a weak ETag and Last-Modified derived from the
+                         stats watermark (MAX(id) and the row count of the
+                         ID_OVERLAP ids below it, so a late commit of a lower
+                         id changes it too); unchanged polls get 304
+  GET  /api/delta     -> ?after=<stats.id>[&host=] rows appended since the cursor,
+                         plus the new cursor; the dashboard's live views (the
+                         default and per-host queries) poll this instead of
+                         re-running their query. Rows from ID_OVERLAP ids
+                         behind the cursor are re-sent ("from" is the lower
+                         bound), so a lower id that commits after a higher
+                         one still arrives; clients skip ids they have
+  GET  /api/stream    -> ?host=&after=<stats.id> server-sent events: new stats
+                         rows as one shared poller finds them (see stream.py);
+                         reconnects resume from Last-Event-ID. 503 when
+                         CONSOLE_SSE is off (the default under gthread)
+  GET  /api/stream/stats -> subscriber and fan-out counters
+  GET  /api/export    -> ?format=csv|ndjson[&start=&end=<epoch s>][&host=]
+                         [&after=<ts,host_id,id>][&limit=] every matching stats
+                         row, streamed in keyset pages through an unbuffered
+                         cursor (see export.py); not capped at 1000 rows
+  GET  /api/hosts     -> reporting agents (id, name) for the host picker
+  GET  /api/series    -> ?window=<s>&points=<n>[&host=] bucketed avg/min/max/std,
+                         served from the coarsest fitting rollup (see rollup.py)
+  GET  /api/summary   -> ?window=<s>[&host=][&bucket=<s>] count and cpu/memory
+                         avg/min/max/std over the whole window (plus p50/p95/p99
+                         for windows up to SUMMARY_PCT_WINDOW), aggregated in
+                         SQL; with bucket, also per-bucket rows as /api/series.
+                         The dashboard's KPI cards read this
+  GET  /api/pool      -> DB connection pool counters (see dbpool.py)
+  GET  /api/cache     -> query result cache counters (see resultcache.py)
+  GET  /api/guard     -> query cost guard counters (see queryguard.py)
+Storage: MySQL, or a local SQLite file with DB_BACKEND=sqlite (see storage.py).
+Compression: JSON responses over COMPRESS_MIN bytes are brotli- or
+gzip-compressed when the client accepts it (see payload.py).
+Serving: CONSOLE_SERVER=dev runs Flask's development server; gevent (one
+greenlet per request, the deployed default) and gthread (threaded workers)
+exec gunicorn with gunicorn.conf.py. Under gthread an open SSE stream would
+hold a worker thread for as long as the dashboard stays open, so /api/stream
+is off there and live views poll /api/delta.
 Safeguards:
   - Only allows SELECT (no INSERT/UPDATE/DELETE/DDL)
-  - Requires a LIMIT (caps to 1000)
+  - Requires a LIMIT (caps to 1000, or DOWNSAMPLE_MAX_ROWS when downsample is asked for)
+  - At most QUERY_CONCURRENCY queries at once; the rest queue for up to
+    QUERY_QUEUE_TIMEOUT seconds, then get 429 with Retry-After
+  - Pre-flight EXPLAIN: rejected above QUERY_MAX_ROWS estimated rows examined,
+    returned with "warnings" above QUERY_WARN_ROWS
+  - Each query is stopped after QUERY_TIMEOUT_MS
 """
 
 import os
 import re
-from typing import Tuple, List, Dict
+import sys
+import time
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Tuple, List, Dict, Optional
 
-from flask import Flask, request, jsonify, render_template, abort
-import pymysql
+from flask import Flask, Response, request, jsonify, render_template, abort
+
+import dbpool
+import downsample
+import export
+import payload
+import queryguard
+import resultcache
+import rollup
+import storage
+import stream
 
 APP_HOST = os.getenv("APP_HOST", "0.0.0.0")
 APP_PORT = int(os.getenv("APP_PORT", "8082"))
+# dev: Flask's built-in server; gthread / gevent: gunicorn (see gunicorn.conf.py)
+CONSOLE_SERVER = os.getenv("CONSOLE_SERVER", "dev")
+# /api/stream: off under gthread, where each open stream holds a worker thread
+CONSOLE_SSE = os.getenv("CONSOLE_SSE", "0" if CONSOLE_SERVER == "gthread" else "1") == "1"
 
 DB_HOST = os.getenv("DB_HOST", "127.0.0.1")
 DB_USER = os.getenv("DB_USER", "devops")
 DB_PASS = os.getenv("DB_PASS", "")
 DB_NAME = os.getenv("DB_NAME", "syslogs")
 
+# connection pool; DB_POOL_MAX=0 opens one connection per request (no pooling)
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "8"))
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "3600"))
+DB_POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER", "1"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+
+# /api/query results are shared between viewers until the agents' next write
+# (the stats watermark moves) or COLLECT_INTERVAL passes; QUERY_CACHE=0 disables
+QUERY_CACHE = os.getenv("QUERY_CACHE", "1") == "1"
+COLLECT_INTERVAL = float(os.getenv("COLLECT_INTERVAL", "15"))
+CACHE_CHECK_EVERY = float(os.getenv("CACHE_CHECK_EVERY", "1"))
+
+# cost guard for /api/query (see queryguard.py): concurrent queries, queueing,
+# per-statement time limit and EXPLAIN row-estimate thresholds
+QUERY_CONCURRENCY = int(os.getenv("QUERY_CONCURRENCY", "4"))
+QUERY_QUEUE_TIMEOUT = float(os.getenv("QUERY_QUEUE_TIMEOUT", "2"))
+QUERY_TIMEOUT_MS = int(os.getenv("QUERY_TIMEOUT_MS", "5000"))
+QUERY_WARN_ROWS = int(os.getenv("QUERY_WARN_ROWS", "100000"))
+QUERY_MAX_ROWS = int(os.getenv("QUERY_MAX_ROWS", "2000000"))
+
+# JSON responses at least this large are compressed (Accept-Encoding: br, gzip)
+COMPRESS_MIN = int(os.getenv("COMPRESS_MIN", "1024"))
+
+# /api/query with downsample=: rows the query may read before picking
+DOWNSAMPLE_MAX_ROWS = int(os.getenv("DOWNSAMPLE_MAX_ROWS", "50000"))
+
+# /api/stream: one poller tails stats every STREAM_POLL seconds for all subscribers
+STREAM_POLL = float(os.getenv("STREAM_POLL", "1"))
+STREAM_BUFFER = int(os.getenv("STREAM_BUFFER", "5000"))
+STREAM_QUEUE = int(os.getenv("STREAM_QUEUE", "64"))
+STREAM_KEEPALIVE = float(os.getenv("STREAM_KEEPALIVE", "15"))
+
+# /api/export: rows per keyset page (one pooled connection and statement each)
+EXPORT_PAGE_ROWS = int(os.getenv("EXPORT_PAGE_ROWS", "10000"))
+
+# /api/summary: the whole-window aggregate reads the source series() would use
+# for window / SUMMARY_BUCKETS; percentiles scan raw rows, so only up to
+# SUMMARY_PCT_WINDOW seconds
+SUMMARY_BUCKETS = int(os.getenv("SUMMARY_BUCKETS", "60"))
+SUMMARY_PCT_WINDOW = int(os.getenv("SUMMARY_PCT_WINDOW", "86400"))
+# time window of the dashboard's KPI cards
+KPI_WINDOW = int(os.getenv("KPI_WINDOW", "3600"))
+
 DEFAULT_QUERY = os.getenv(
     "DEFAULT_QUERY",
-    "SELECT memory_usage, cpu_usage, timestamp FROM stats ORDER BY timestamp DESC LIMIT 100;"
+    "SELECT id, memory_usage, cpu_usage, timestamp FROM stats ORDER BY ts DESC LIMIT 100;"
 ).strip()
 
-# simple “last query” memory for auto-refresh
-_last_sql = DEFAULT_QUERY
+HOST_QUERY = (
+    "SELECT id, memory_usage, cpu_usage, timestamp FROM stats "
+    "WHERE host_id = {host_id} ORDER BY ts DESC LIMIT 100;"
+)
+
+# same columns as the live views, oldest first; idx_id serves the id range
+DELTA_SQL = "SELECT id, memory_usage, cpu_usage, timestamp FROM stats WHERE id > %s{host} ORDER BY id LIMIT %s"
+DELTA_MAX_ROWS = 1000
+# agents insert concurrently, so a lower id can commit after a higher one: id
+# cursors (/api/delta, /api/stream) re-read this many ids behind themselves
+ID_OVERLAP = int(os.getenv("ID_OVERLAP", "64"))
 
 app = Flask(__name__, template_folder="templates", static_folder="static")
 
 
-def get_db():
-    return pymysql.connect(
+def _connect():
+    return storage.connect(
         host=DB_HOST,
         user=DB_USER,
         password=DB_PASS,
         database=DB_NAME,
-        cursorclass=pymysql.cursors.DictCursor,
-        autocommit=True,
+        dict_rows=True,
     )
 
 
-def _validate_sql(sql: str) -> Tuple[bool, str]:
-    """Only allow read-only SELECT with a LIMIT (<= 1000)."""
+POOL = dbpool.Pool(_connect, min_size=DB_POOL_MIN, max_size=DB_POOL_MAX, max_idle=DB_POOL_MAX_IDLE,
+                   max_lifetime=DB_POOL_MAX_LIFETIME, ping_after=DB_POOL_PING_AFTER, timeout=DB_POOL_TIMEOUT)
+
+
+def get_db():
+    """Pooled connection: `with get_db() as conn` checks it out and returns it."""
+    return POOL.connection()
+
+
+def _stats_max_id():
+    with get_db() as conn, conn.cursor() as cur:
+        cur.execute("SELECT MAX(id) AS id FROM stats")
+        return cur.fetchone()["id"]
+
+
+def _stats_watermark():
+    """(MAX(id), rows in the ID_OVERLAP ids below it): a lower id committing late moves the count."""
+    with get_db() as conn, conn.cursor() as cur:
+        cur.execute("SELECT m.id, (SELECT COUNT(*) FROM stats WHERE id > m.id - %s) AS n "
+                    "FROM (SELECT MAX(id) AS id FROM stats) m", (ID_OVERLAP,))
+        row = cur.fetchone()
+        return row["id"], row["n"]
+
+
+# a coalesced request waits no longer than the leader's query may take
+CACHE = resultcache.ResultCache(ttl=COLLECT_INTERVAL, watermark=_stats_watermark, check_every=CACHE_CHECK_EVERY,
+                                wait_timeout=QUERY_QUEUE_TIMEOUT + QUERY_TIMEOUT_MS / 1000)
+
+GUARD = queryguard.Guard(max_concurrent=QUERY_CONCURRENCY, queue_timeout=QUERY_QUEUE_TIMEOUT,
+                         timeout_ms=QUERY_TIMEOUT_MS, warn_rows=QUERY_WARN_ROWS, max_rows=QUERY_MAX_ROWS)
+
+STREAM = stream.Broadcaster(get_db, poll_interval=STREAM_POLL, buffer_rows=STREAM_BUFFER, overlap=ID_OVERLAP,
+                            queue_size=STREAM_QUEUE, keepalive=STREAM_KEEPALIVE)
+
+
+def _validate_sql(sql: str, max_limit: int = 1000) -> Tuple[bool, str]:
+    """Only allow read-only SELECT with a LIMIT (<= max_limit)."""
     s = sql.strip().rstrip(";")
     if not re.match(r"(?is)^\s*select\b", s):
         return False, "Only SELECT statements are allowed."
@@ -61,8 +224,8 @@ def _validate_sql(sql: str) -> Tuple[bool, str]:
         return False, "Please include a LIMIT (e.g. LIMIT 100)."
     try:
         lim = int(m.group(1))
-        if lim > 1000:
-            s = re.sub(r"(?is)\blimit\s+\d+\b", "LIMIT 1000", s)
+        if lim > max_limit:
+            s = re.sub(r"(?is)\blimit\s+\d+\b", f"LIMIT {max_limit}", s)
     except Exception:
         return False, "Invalid LIMIT value."
     return True, s + ";"
@@ -84,37 +247,342 @@ def _summarize(rows: List[Dict]) -> Dict:
     }
 
 
-def _run_sql(sql: str):
-    ok, cleaned = _validate_sql(sql)
-    if not ok:
-        abort(400, cleaned)
+def _host_id(host: str) -> int:
     with get_db() as conn, conn.cursor() as cur:
-        cur.execute(cleaned)
-        rows = cur.fetchall()
+        cur.execute("SELECT id FROM hosts WHERE name = %s", (host,))
+        row = cur.fetchone()
+    if row is None:
+        abort(400, f"Unknown host '{host}'.")
+    return int(row["id"])
+
+
+def _host_sql(host: str) -> str:
+    """Default query narrowed to one host; served by the (host_id, ts) key instead of a full scan."""
+    return HOST_QUERY.format(host_id=_host_id(host))
+
+
+def _execute(sql: str):
+    # admitted before a connection is checked out, so queued queries hold none
+    with GUARD.admit(), get_db() as conn:
+        warnings = GUARD.check(conn, sql)
+        with GUARD.limited(conn, sql) as limited, conn.cursor() as cur:
+            cur.execute(limited)
+            rows = cur.fetchall()
         cols = list(rows[0].keys()) if rows else []
-    return cols, rows, _summarize(rows)
+    return cols, rows, _summarize(rows), warnings
+
+
+def _limit(sql: str) -> int:
+    m = re.search(r"(?is)\blimit\s+(\d+)\b", sql)
+    return min(int(m.group(1)), 1000) if m else 1000
+
+
+def _pick(cols: List[str], rows: List[Dict], ds: Tuple[str, int, int]) -> List[int]:
+    """
+    Indices of the rows downsample.select() keeps over the float columns, with
+    the first DATETIME column (else ts, else row order) as x. Every row when
+    there is nothing to pick.
+    """
+    method, points, width = ds
+    col = payload.columnar(cols, rows)
+    types = dict(zip(cols, col["types"]))
+    ys = [[float("nan") if v is None else v for v in col["data"][c]] for c in cols if types[c] == "float"]
+    if not ys:
+        return list(range(len(rows)))
+    xc = next((c for c in cols if types[c] == "epoch"), "ts" if types.get("ts") == "int" else None)
+    x = col["data"][xc] if xc else None
+    if x is None or None in x or not (_monotonic(x, 1) or _monotonic(x, -1)):
+        x = list(range(len(rows)))
+    return downsample.select(x, ys, points=points, width=width, method=method).tolist()
+
+
+def _monotonic(x: List, sign: int) -> bool:
+    return all(sign * (b - a) >= 0 for a, b in zip(x, x[1:]))
+
+
+def _picked(ds: Tuple[str, int, int], before: int, after: int) -> Dict:
+    return {"method": "minmax" if ds[2] else ds[0], "from": before, "to": after}
+
+
+def _execute_downsampled(sql: str, ds: Tuple[str, int, int]):
+    cols, rows, summary, warnings = _execute(sql)
+    picked = [rows[i] for i in _pick(cols, rows, ds)]
+    if len(picked) < len(rows):
+        # summary stays over every row read
+        summary = dict(summary, downsampled=_picked(ds, len(rows), len(picked)))
+    return cols, picked, summary, warnings
+
+
+def _run_sql(sql: str, ds: Optional[Tuple[str, int, int]] = None):
+    """ds: (method, points, width) to return only the picked rows, None for every row."""
+    ok, cleaned = _validate_sql(sql, DOWNSAMPLE_MAX_ROWS if ds else 1000)
+    if not ok:
+        abort(400, cleaned)
+    run = (lambda: _execute_downsampled(cleaned, ds)) if ds else (lambda: _execute(cleaned))
+    if not QUERY_CACHE:
+        return run()
+    # identical queries from all viewers share one execution and one result
+    return CACHE.get((cleaned, ds) if ds else cleaned, run)
+
+
+def _downsample_args(args) -> Tuple[Optional[Tuple[str, int, int]], bool]:
+    """
+    ((method, points, width), reduce) from a request's points/width/downsample;
+    None when neither points nor width is set. reduce: downsample= was given,
+    so the rows themselves are picked rather than just the chart's.
+    """
+    reduce = bool(args.get("downsample"))
+    method = args.get("downsample") or "lttb"
+    try:
+        points, width = int(args.get("points") or 0), int(args.get("width") or 0)
+    except (TypeError, ValueError):
+        abort(400, "points and width must be integers.")
+    if method not in downsample.METHODS:
+        abort(400, f"downsample must be one of: {', '.join(downsample.METHODS)}.")
+    if points < 0 or width < 0:
+        abort(400, "points and width must be non-negative.")
+    return ((method, points, width) if points or width else None), reduce
 
 
 @app.route("/", methods=["GET"])
 def home():
     # NEW: pass REFRESH_MS into the template so JS can read it
     refresh_ms = int(os.getenv("REFRESH_MS", "2000"))
-    return render_template("dashboard.html", default_query=DEFAULT_QUERY, refresh_ms=refresh_ms)
+    return render_template("dashboard.html", default_query=DEFAULT_QUERY, refresh_ms=refresh_ms,
+                           kpi_window=KPI_WINDOW, stream=CONSOLE_SSE)
+
+
+def _set_validators(resp, tag: str, modified: datetime):
+    resp.set_etag(tag, weak=True)
+    resp.last_modified = modified
+    resp.cache_control.no_cache = True  # browsers revalidate every poll
+
+
+def _not_modified(tag: str, modified: datetime) -> bool:
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(tag)
+    since = request.if_modified_since
+    return since is not None and modified.replace(microsecond=0) <= since
 
 
 @app.route("/api/query", methods=["GET", "POST"])
 def api_query():
-    global _last_sql
+    live = None  # host ("" = all) when the result is a live view /api/delta can extend
     if request.method == "POST":
         data = request.get_json(silent=True) or {}
         sql = (data.get("sql") or "").strip()
+        host = (data.get("host") or "").strip()
+        fmt = data.get("format") or "rows"
+        ds, reduce = _downsample_args(data)
+        if not sql and host:
+            sql, live = _host_sql(host), host
+        elif sql == DEFAULT_QUERY:
+            live = ""
         if not sql:
             abort(400, "Missing 'sql' in JSON body.")
-        _last_sql = sql
     else:
-        sql = _last_sql
-    cols, rows, summary = _run_sql(sql)
-    return jsonify({"columns": cols, "rows": rows, "summary": summary, "sql": sql})
+        # the poll names its query: workers share no state between requests
+        host = request.args.get("host", "").strip()
+        fmt = request.args.get("format", "rows")
+        ds, reduce = _downsample_args(request.args)
+        sql = _host_sql(host) if host else (request.args.get("sql") or DEFAULT_QUERY).strip()
+        if host:
+            live = host
+        elif sql == DEFAULT_QUERY:
+            live = ""
+    if fmt not in ("rows", "columnar"):
+        abort(400, "format must be 'rows' or 'columnar'.")
+
+    validators = None
+    if request.method == "GET":
+        # same query, format and watermark -> same body: answer 304 without running it
+        tag = hashlib.sha1(f"{sql}\0{fmt}\0{ds}\0{reduce}\0{CACHE.watermark()}".encode()).hexdigest()[:20]
+        modified = datetime.fromtimestamp(int(CACHE.changed_at()), timezone.utc)
+        validators = (tag, modified)
+        if _not_modified(tag, modified):
+            resp = app.response_class(status=304)
+            _set_validators(resp, *validators)
+            return resp
+
+    cols, rows, summary, warnings = _run_sql(sql, ds if reduce else None)
+    if "downsampled" in summary:
+        live = None  # a picked subset cannot be extended row by row
+    body = {"columns": cols, "rows": rows, "summary": summary, "sql": sql}
+    if fmt == "columnar":
+        body = dict(payload.columnar(cols, rows), summary=summary, sql=sql)
+    if ds and not reduce:
+        # the table keeps every row; only the chart draws the picked ones
+        index = _pick(cols, rows, ds)
+        if len(index) < len(rows):
+            body["chart"] = dict(_picked(ds, len(rows), len(index)), index=index)
+    if warnings:
+        body["warnings"] = warnings
+    if live is not None and "id" in cols:
+        cursor = max((r["id"] for r in rows), default=None)
+        body["delta"] = {"host": live, "window": _limit(sql),
+                         "cursor": cursor if cursor is not None else (_stats_max_id() or 0)}
+    resp = jsonify(body)
+    if validators:
+        _set_validators(resp, *validators)
+    return resp
+
+
+def _delta(after: int, host_id: Optional[int], limit: int):
+    since = max(0, after - ID_OVERLAP)
+    params: list = [since]
+    if host_id is not None:
+        params.append(host_id)
+    params.append(limit)
+    with get_db() as conn, conn.cursor() as cur:
+        cur.execute(DELTA_SQL.format(host=" AND host_id = %s" if host_id is not None else ""), params)
+        rows = cur.fetchall()
+    return {"rows": rows, "from": since, "cursor": max(after, rows[-1]["id"]) if rows else after}
+
+
+@app.route("/api/delta", methods=["GET"])
+def api_delta():
+    after = request.args.get("after", "")
+    limit = request.args.get("limit", str(DELTA_MAX_ROWS))
+    if not after.isdigit() or not limit.isdigit():
+        abort(400, "after (a stats.id cursor) and limit must be non-negative integers.")
+    after, limit = int(after), min(int(limit), DELTA_MAX_ROWS)
+    host = request.args.get("host", "").strip()
+    host_id: Optional[int] = _host_id(host) if host else None
+    if not QUERY_CACHE:
+        return jsonify(_delta(after, host_id, limit))
+    # viewers converge on the same cursor, so steady-state polls share one query
+    return jsonify(CACHE.get(("delta", after, host_id, limit), lambda: _delta(after, host_id, limit)))
+
+
+@app.route("/api/stream", methods=["GET"])
+def api_stream():
+    if not CONSOLE_SSE:
+        return jsonify({"error": "Streaming is off on this server (CONSOLE_SSE); poll /api/delta."}), 503
+    after = request.headers.get("Last-Event-ID") or request.args.get("after", "")
+    if after and not after.isdigit():
+        abort(400, "after (a stats.id cursor) must be a non-negative integer.")
+    host = request.args.get("host", "").strip()
+    host_id: Optional[int] = _host_id(host) if host else None
+    return Response(STREAM.subscribe(host_id, int(after) if after else None), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route("/api/stream/stats", methods=["GET"])
+def api_stream_stats():
+    return jsonify(STREAM.stats())
+
+
+@app.route("/api/export", methods=["GET"])
+def api_export():
+    fmt = request.args.get("format", "csv")
+    if fmt not in export.FORMATS:
+        abort(400, f"format must be one of: {', '.join(export.FORMATS)}.")
+    start = request.args.get("start", "0")
+    end = request.args.get("end", str(int(time.time()) + 1))
+    limit = request.args.get("limit", "")
+    if not start.isdigit() or not end.isdigit() or (limit and not limit.isdigit()):
+        abort(400, "start, end (epoch seconds) and limit must be non-negative integers.")
+    try:
+        after = export.parse_key(request.args["after"]) if request.args.get("after") else None
+    except ValueError as e:
+        abort(400, str(e))
+    host = request.args.get("host", "").strip()
+    host_id: Optional[int] = _host_id(host) if host else None
+    body = export.stream(get_db, fmt, int(start), int(end), host_id, after, int(limit) if limit else None,
+                         page_rows=EXPORT_PAGE_ROWS)
+    name = f"stats-{host or 'all'}-{start}-{end}.{fmt}"
+    return Response(body, mimetype=export.FORMATS[fmt],
+                    headers={"Content-Disposition": f"attachment; filename={name}", "X-Accel-Buffering": "no"})
+
+
+@app.route("/api/hosts", methods=["GET"])
+def api_hosts():
+    with get_db() as conn, conn.cursor() as cur:
+        cur.execute("SELECT id, name FROM hosts ORDER BY name")
+        hosts = cur.fetchall()
+    return jsonify({"hosts": hosts})
+
+
+@app.route("/api/series", methods=["GET"])
+def api_series():
+    window = request.args.get("window", "3600")
+    points = request.args.get("points", "120")
+    if not window.isdigit() or not points.isdigit() or int(points) == 0:
+        abort(400, "window and points must be positive integers.")
+    window_s, n_points = int(window), min(int(points), 1000)
+    host = request.args.get("host", "").strip()
+    host_id: Optional[int] = _host_id(host) if host else None
+
+    resolution = max(1, window_s // n_points)
+    end = datetime.utcnow()
+    with get_db() as conn, conn.cursor() as cur:
+        rows = rollup.series(cur, end - timedelta(seconds=window_s), end, resolution, host_id)
+    return jsonify({"source": rollup.pick_source(resolution)[0], "resolution": resolution, "rows": rows})
+
+
+def _summary(window_s: int, host_id: Optional[int], bucket: int):
+    end = datetime.utcnow().replace(microsecond=0)
+    start = end - timedelta(seconds=window_s)
+    resolution = max(1, window_s // SUMMARY_BUCKETS)
+    with get_db() as conn, conn.cursor() as cur:
+        summary = rollup.summary(cur, start, end, resolution, host_id)
+        if window_s <= SUMMARY_PCT_WINDOW:
+            summary.update(rollup.percentiles(cur, start, end, host_id))
+        body = {"window": window_s, "source": rollup.pick_source(resolution)[0], "summary": summary}
+        if bucket:
+            body["bucket"] = bucket
+            body["source_buckets"] = rollup.pick_source(bucket)[0]
+            body["rows"] = rollup.series(cur, start, end, bucket, host_id)
+    return body
+
+
+@app.route("/api/summary", methods=["GET"])
+def api_summary():
+    window = request.args.get("window", "3600")
+    bucket = request.args.get("bucket", "0")
+    if not window.isdigit() or not bucket.isdigit() or int(window) == 0:
+        abort(400, "window must be a positive integer and bucket a non-negative integer (seconds).")
+    window_s, bucket_s = int(window), int(bucket)
+    if bucket_s and window_s // bucket_s > 1000:
+        abort(400, "bucket too small: at most 1000 buckets per window.")
+    host = request.args.get("host", "").strip()
+    host_id: Optional[int] = _host_id(host) if host else None
+    if not QUERY_CACHE:
+        body = _summary(window_s, host_id, bucket_s)
+    else:
+        # every dashboard polls the same KPI window; one query per new stats row
+        body = CACHE.get(("summary", window_s, host_id, bucket_s), lambda: _summary(window_s, host_id, bucket_s))
+    return jsonify(dict(body, host=host))
+
+
+@app.route("/api/pool", methods=["GET"])
+def api_pool():
+    return jsonify(POOL.stats())
+
+
+@app.route("/api/cache", methods=["GET"])
+def api_cache():
+    return jsonify(CACHE.stats())
+
+
+@app.route("/api/guard", methods=["GET"])
+def api_guard():
+    return jsonify(GUARD.stats())
+
+
+@app.after_request
+def compress_json(resp):
+    if (resp.status_code != 200 or resp.is_streamed or resp.mimetype != "application/json"
+            or "Content-Encoding" in resp.headers):
+        return resp
+    resp.vary.add("Accept-Encoding")
+    body = resp.get_data()
+    if len(body) >= COMPRESS_MIN:
+        data, coding = payload.compress(body, request.headers.get("Accept-Encoding", ""))
+        if coding:
+            resp.set_data(data)
+            resp.headers["Content-Encoding"] = coding
+    return resp
 
 
 @app.errorhandler(400)
@@ -122,5 +590,30 @@ def bad_request(e):
     return jsonify({"error": str(e)}), 400
 
 
+@app.errorhandler(queryguard.Rejected)
+@app.errorhandler(queryguard.TimedOut)
+def query_refused(e):
+    return jsonify({"error": str(e)}), 400
+
+
+@app.errorhandler(queryguard.Busy)
+def query_busy(e):
+    return jsonify({"error": str(e)}), 429, {"Retry-After": str(e.retry_after)}
+
+
+@app.errorhandler(dbpool.PoolTimeout)
+def pool_exhausted(e):
+    return jsonify({"error": str(e)}), 503
+
+
 if __name__ == "__main__":
-    app.run(host=APP_HOST, port=APP_PORT, debug=False)
+    if CONSOLE_SERVER == "dev":
+        app.run(host=APP_HOST, port=APP_PORT, debug=False)
+    elif CONSOLE_SERVER in ("gthread", "gevent"):
+        # become the gunicorn master, so systemd's MAINPID receives reload signals
+        here = os.path.dirname(os.path.abspath(__file__))
+        os.chdir(here)
+        os.execv(sys.executable, [sys.executable, "-m", "gunicorn", "-c", os.path.join(here, "gunicorn.conf.py"),
+                                  "sql_console:app"])
+    else:
+        sys.exit(f"sql_console: unknown CONSOLE_SERVER '{CONSOLE_SERVER}' (dev, gthread or gevent)")
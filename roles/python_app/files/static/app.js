@@ -1,25 +1,38 @@
 (function () {
   // NEW: read the refresh interval from the HTML data attribute
   const REFRESH_MS = Number(document.body.dataset.refreshMs || 2000);
+  // KPI cards cover this many seconds (server-side aggregate, not the table rows)
+  const KPI_WINDOW = Number(document.body.dataset.kpiWindow || 3600);
+  // the server turns /api/stream off when each open stream would hold a worker thread
+  const STREAM = document.body.dataset.stream !== '0';
 
   const sqlBox = document.getElementById('sqlBox');
   const runBtn = document.getElementById('runBtn');
+  const hostSel = document.getElementById('hostSel');
   const liveChk = document.getElementById('liveChk');
   const statusEl = document.getElementById('status');
   const kpiMem = document.getElementById('kpiMem');
   const kpiCpu = document.getElementById('kpiCpu');
+  const kpiMemDetail = document.getElementById('kpiMemDetail');
+  const kpiCpuDetail = document.getElementById('kpiCpuDetail');
   const table = document.getElementById('resultTable');
   const rowsCount = document.getElementById('rowsCount');
   const refreshLabel = document.getElementById('refreshLabel');
 
-  let lastSQL = sqlBox.value.trim();
+  const defaultSQL = sqlBox.value.trim();
+  let lastSQL = defaultSQL;
   let timer = null;
+  // live view (default / per-host query): rows newest first, extended via /api/delta
+  let view = null;
 
   // show the effective refresh rate
   if (refreshLabel) refreshLabel.textContent = REFRESH_MS;
+  const windowText = KPI_WINDOW % 3600 ? `${Math.round(KPI_WINDOW / 60)}m` : `${KPI_WINDOW / 3600}h`;
+  document.querySelectorAll('.kpiWindow').forEach(el => { el.textContent = `(${windowText})`; });
 
   // Chart.js line with 2 datasets
-  const ctx = document.getElementById('chart').getContext('2d');
+  const chartEl = document.getElementById('chart');
+  const ctx = chartEl.getContext('2d');
   const chart = new Chart(ctx, {
     type: 'line',
     data: {
@@ -58,12 +71,37 @@
     rowsCount.textContent = `Rows: ${rows.length}`;
   }
 
-  function updateKpis(summary) {
-    kpiMem.textContent = summary.avg_memory ?? '—';
-    kpiCpu.textContent = summary.avg_cpu ?? '—';
+  function updateKpis(s) {
+    const detail = k => s.n ? `min ${s[k + '_min']} · max ${s[k + '_max']} · p95 ${s[k + '_p95'] ?? '—'} · ` +
+                              `σ ${s[k + '_std']} · n ${s.n}` : 'no samples';
+    kpiMem.textContent = s.mem_avg ?? '—';
+    kpiCpu.textContent = s.cpu_avg ?? '—';
+    kpiMemDetail.textContent = detail('mem');
+    kpiCpuDetail.textContent = detail('cpu');
   }
 
-  function updateChart(columns, rows) {
+  // KPIs over KPI_WINDOW for the selected host, aggregated by the DB (/api/summary)
+  let kpiBusy = false;
+  async function loadKpis() {
+    if (kpiBusy) return;
+    kpiBusy = true;
+    try {
+      const q = new URLSearchParams({ window: KPI_WINDOW });
+      if (hostSel.value) q.set('host', hostSel.value);
+      const res = await fetch('/api/summary?' + q);
+      const data = await res.json();
+      if (!res.ok) throw new Error(data.error || res.statusText);
+      updateKpis(data.summary);
+    } catch (err) {
+      setStatus(`Error: ${err.message}`);
+    } finally {
+      kpiBusy = false;
+    }
+  }
+
+  // index: the rows the server picked for the chart (data.chart), every row without it
+  function updateChart(columns, rows, index) {
+    if (index) rows = index.map(i => rows[i]);
     const memCol = columns.find(c => c.toLowerCase().includes('memory'));
     const cpuCol = columns.find(c => c.toLowerCase().includes('cpu'));
     const tsCol  = columns.find(c => c.toLowerCase().includes('time')) || columns[0];
@@ -78,24 +116,152 @@
     chart.update();
   }
 
-  async function runQuery(sql, userInitiated=false) {
+  // append delta rows (oldest first) to the table, chart and KPIs without a redraw
+  function appendRows(newRows) {
+    const { columns, window } = view;
+    view.rows = newRows.slice().reverse().concat(view.rows).slice(0, window);
+
+    const tbody = table.tBodies[0];
+    tbody.insertAdjacentHTML('afterbegin', newRows.slice().reverse().map(r =>
+      `<tr>${columns.map(c => `<td>${r[c] ?? ''}</td>`).join('')}</tr>`).join(''));
+    while (tbody.rows.length > window) tbody.deleteRow(-1);
+    rowsCount.textContent = `Rows: ${view.rows.length}`;
+
+    const memCol = columns.find(c => c.toLowerCase().includes('memory'));
+    const cpuCol = columns.find(c => c.toLowerCase().includes('cpu'));
+    const tsCol  = columns.find(c => c.toLowerCase().includes('time')) || columns[0];
+    for (const r of newRows) {
+      chart.data.labels.push(toTimeLabel(r[tsCol]));
+      chart.data.datasets[0].data.push(Number(r[memCol] ?? null));
+      chart.data.datasets[1].data.push(Number(r[cpuCol] ?? null));
+    }
+    const extra = chart.data.labels.length - window;
+    if (extra > 0) {
+      chart.data.labels.splice(0, extra);
+      chart.data.datasets.forEach(ds => ds.data.splice(0, extra));
+    }
+    chart.update();
+  }
+
+  // the server re-sends rows from a few ids behind the cursor (a lower id can
+  // commit after a higher one): keep only ids this view has not shown, and
+  // forget ids at or below `from`, which will not be sent again
+  function fresh(v, rows, from) {
+    const out = rows.filter(r => !v.seen.has(r.id));
+    for (const r of rows) v.seen.add(r.id);
+    for (const id of v.seen) if (id <= from) v.seen.delete(id);
+    return out;
+  }
+
+  async function pollDelta() {
+    const v = view;
+    if (v.polling) return;  // a slow poll must not be overlapped with the same cursor
+    v.polling = true;
+    setStatus('Refreshing…');
+    try {
+      const q = new URLSearchParams({ after: v.cursor });
+      if (v.host) q.set('host', v.host);
+      const res = await fetch('/api/delta?' + q);
+      const data = await res.json();
+      if (!res.ok) throw new Error(data.error || res.statusText);
+      if (view !== v) return;  // the user switched queries meanwhile
+      const rows = fresh(v, data.rows, data.from);
+      if (rows.length) appendRows(rows);
+      v.cursor = data.cursor;
+      setStatus(`OK (+${rows.length} rows)`);
+    } catch (err) {
+      setStatus(`Error: ${err.message}`);
+    } finally {
+      v.polling = false;
+    }
+  }
+
+  // live views follow /api/stream where EventSource exists and the server
+  // streams (one shared server poller for all viewers); the timer falls back to
+  // /api/delta otherwise, or once the stream is refused
+  let source = null;
+  function closeStream() {
+    if (source) source.close();
+    source = null;
+  }
+  function openStream() {
+    closeStream();
+    if (!view || !STREAM || !window.EventSource || !liveChk.checked) return;
+    const v = view;
+    const q = new URLSearchParams({ after: v.cursor });
+    if (v.host) q.set('host', v.host);
+    // on reconnect the browser sends Last-Event-ID, so no rows are missed
+    source = new EventSource('/api/stream?' + q);
+    source.addEventListener('rows', e => {
+      if (view !== v) return;
+      const data = JSON.parse(e.data);
+      const rows = fresh(v, data.rows, data.from);
+      if (rows.length) appendRows(rows);
+      v.cursor = Math.max(v.cursor, Number(e.lastEventId));
+      setStatus(`OK (+${rows.length} rows, streaming)`);
+    });
+    // a non-200 answer closes the EventSource for good: poll instead
+    source.addEventListener('error', () => {
+      if (source && source.readyState === EventSource.CLOSED) source = null;
+    });
+  }
+
+  function refresh() {
+    loadKpis();
+    if (view) return source ? null : pollDelta();
+    return runQuery(lastSQL, false);
+  }
+
+  // columnar /api/query payload -> row objects; epoch columns become UTC date strings
+  function fromColumnar(data) {
+    const cols = data.columns.map((c, j) => data.types[j] === 'epoch'
+      ? data.data[c].map(v => v == null ? null : new Date(v * 1000).toUTCString())
+      : data.data[c]);
+    return Array.from({ length: data.count }, (_, i) =>
+      Object.fromEntries(data.columns.map((c, j) => [c, cols[j][i]])));
+  }
+
+  // results longer than the chart is wide come with the indices of about one
+  // row per pixel (LTTB) for the chart; the table still shows every row
+  function chartPoints() {
+    return Math.max(100, Math.round(chartEl.clientWidth || 0));
+  }
+
+  async function runQuery(sql, userInitiated=false, host='') {
     setStatus(userInitiated ? 'Running…' : 'Refreshing…');
     try {
-      const res = await fetch('/api/query', {
+      const points = chartPoints();
+      // polls are GETs naming their query (any worker may answer): the browser
+      // revalidates with the ETag and unchanged results come back as 304
+      const poll = new URLSearchParams({ sql, format: 'columnar', points });
+      const res = await fetch(userInitiated ? '/api/query' : '/api/query?' + poll, {
         method: userInitiated ? 'POST' : 'GET',
         headers: { 'Content-Type': 'application/json' },
-        body: userInitiated ? JSON.stringify({ sql }) : null
+        body: userInitiated
+          ? JSON.stringify(host ? { host, format: 'columnar', points } : { sql, format: 'columnar', points })
+          : null
       });
       const data = await res.json();
       if (!res.ok) throw new Error(data.error || res.statusText);
+      data.rows = fromColumnar(data);
 
       lastSQL = data.sql;
       if (userInitiated) sqlBox.value = lastSQL;
 
+      view = data.delta
+        ? { columns: data.columns, rows: data.rows, seen: new Set(data.rows.map(r => r.id)), ...data.delta }
+        : null;
       renderTable(data.columns, data.rows);
-      updateKpis(data.summary);
-      updateChart(data.columns, data.rows);
-      setStatus(`OK (${data.rows.length} rows)`);
+      updateChart(data.columns, data.rows, data.chart && data.chart.index);
+      if (userInitiated) {
+        openStream();
+        loadKpis();
+      }
+      // the server's cost guard ran the query but flagged it as expensive
+      const warn = data.warnings ? ` ⚠ ${data.warnings.join('; ')}` : '';
+      const ds = data.chart;
+      const shown = ds ? `, chart ${ds.to} of ${ds.from}, ${ds.method}` : '';
+      setStatus(`OK (${data.rows.length} rows${shown})${warn}`);
     } catch (err) {
       setStatus(`Error: ${err.message}`);
     }
@@ -105,14 +271,36 @@
     runQuery(sqlBox.value.trim(), true);
   });
 
+  // host picker: the server builds an indexed per-host query and returns it in data.sql
+  async function loadHosts() {
+    try {
+      const res = await fetch('/api/hosts');
+      const data = await res.json();
+      for (const h of data.hosts || []) {
+        const opt = document.createElement('option');
+        opt.value = h.name;
+        opt.textContent = h.name;
+        hostSel.appendChild(opt);
+      }
+    } catch {}
+  }
+  hostSel.addEventListener('change', () => {
+    const host = hostSel.value;
+    runQuery(host ? null : defaultSQL, true, host);
+  });
+  loadHosts();
+
   function startTimer() {
     if (timer) clearInterval(timer);
     // NEW: use REFRESH_MS rather than a hard-coded 5000
-    timer = setInterval(() => runQuery(lastSQL, false), REFRESH_MS);
+    // live views only fetch rows newer than their cursor; other queries re-run
+    timer = setInterval(refresh, REFRESH_MS);
+    openStream();
   }
   function stopTimer() {
     if (timer) clearInterval(timer);
     timer = null;
+    closeStream();
   }
   liveChk.addEventListener('change', () => liveChk.checked ? startTimer() : stopTimer());
 
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Storage backends shared by the agent, the console and the tools.
+
+  DB_BACKEND=mysql   (default) pymysql against DB_HOST / DB_NAME
+  DB_BACKEND=sqlite  a local file (SQLITE_PATH) in WAL mode: no server and no
+                     network round trips, for single-node installs, offline use
+                     and running the whole stack locally
+
+connect() returns a connection with the pymysql surface this code uses
+(cursor(), begin/commit/rollback, %s placeholders, context manager), so SQL
+shared by both backends is written once. The MySQL functions that shared SQL
+relies on (UNIX_TIMESTAMP, FLOOR, SQRT, POW, GREATEST, LEAST) are registered on
+SQLite connections; the remaining dialect differences are INSERT_IGNORE,
+epoch_datetime() and stream_cursor().
+
+The SQLite schema mirrors the compact MySQL layout (schema v2 of
+migrate_schema.py), virtual compatibility columns included, and is created on
+first connect. Rollup tables are MySQL-only; rollup.series() reads raw rows on
+SQLite.
+"""
+
+import os
+import math
+import time
+import sqlite3
+from datetime import datetime
+
+try:
+    import pymysql
+except ImportError:  # not needed with DB_BACKEND=sqlite
+    pymysql = None
+
+BACKEND = os.getenv("DB_BACKEND", "mysql").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "syslogs.db"))
+SQLITE_BUSY_MS = int(os.getenv("SQLITE_BUSY_MS", "5000"))
+
+if BACKEND not in ("mysql", "sqlite"):
+    raise SystemExit(f"storage: unknown DB_BACKEND '{BACKEND}' (mysql or sqlite)")
+
+INSERT_IGNORE = "INSERT OR IGNORE" if BACKEND == "sqlite" else "INSERT IGNORE"
+
+# driver errors callers catch around DB work
+Error = (sqlite3.Error,) + ((pymysql.err.Error,) if pymysql else ())
+
+TS_FMT = "%Y-%m-%d %H:%M:%S"
+
+SQLITE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS hosts (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
+        first_seen DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )""",
+    """CREATE TABLE IF NOT EXISTS stats (
+        id INTEGER PRIMARY KEY,
+        host_id INTEGER NOT NULL DEFAULT 0,
+        ts INTEGER NOT NULL,
+        cpu_x100 INTEGER, mem_x100 INTEGER,
+        cpu_min_x100 INTEGER, cpu_max_x100 INTEGER, cpu_last_x100 INTEGER,
+        mem_min_x100 INTEGER, mem_max_x100 INTEGER, mem_last_x100 INTEGER,
+        timestamp DATETIME AS (datetime(ts, 'unixepoch')) VIRTUAL,
+        cpu_usage REAL AS (cpu_x100 / 100.0) VIRTUAL,
+        memory_usage REAL AS (mem_x100 / 100.0) VIRTUAL,
+        cpu_min REAL AS (cpu_min_x100 / 100.0) VIRTUAL,
+        cpu_max REAL AS (cpu_max_x100 / 100.0) VIRTUAL,
+        cpu_last REAL AS (cpu_last_x100 / 100.0) VIRTUAL,
+        mem_min REAL AS (mem_min_x100 / 100.0) VIRTUAL,
+        mem_max REAL AS (mem_max_x100 / 100.0) VIRTUAL,
+        mem_last REAL AS (mem_last_x100 / 100.0) VIRTUAL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_host_ts ON stats (host_id, ts)",
+    "CREATE INDEX IF NOT EXISTS idx_ts ON stats (ts)",
+    """CREATE TABLE IF NOT EXISTS metrics (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    )""",
+    """CREATE TABLE IF NOT EXISTS metric_values (
+        host_id INTEGER NOT NULL,
+        metric_id INTEGER NOT NULL,
+        timestamp DATETIME NOT NULL,
+        value REAL,
+        PRIMARY KEY (host_id, metric_id, timestamp)
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS process_stats (
+        host_id INTEGER NOT NULL,
+        timestamp DATETIME NOT NULL,
+        pid INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        cpu_pct REAL,
+        rss_kb INTEGER,
+        PRIMARY KEY (host_id, timestamp, pid)
+    ) WITHOUT ROWID""",
+]
+
+sqlite3.register_converter("DATETIME", lambda b: datetime.strptime(b.decode()[:19], TS_FMT))
+
+
+def _greatest(*args):
+    return None if None in args else max(args)
+
+
+def _least(*args):
+    return None if None in args else min(args)
+
+
+class SQLiteCursor:
+    """pymysql-style cursor over sqlite3: %s placeholders, tuple or dict rows."""
+
+    def __init__(self, cur, dict_rows):
+        self._cur = cur
+        self._dict = dict_rows
+
+    def _row(self, row):
+        if row is None or not self._dict:
+            return None if row is None else tuple(row)
+        return dict(zip(row.keys(), row))
+
+    def execute(self, sql, args=None):
+        # like pymysql, placeholders are only substituted when args are given
+        if args is None:
+            self._cur.execute(sql)
+        else:
+            self._cur.execute(sql.replace("%s", "?").replace("%%", "%"), tuple(args))
+        return self._cur.rowcount
+
+    def executemany(self, sql, seq):
+        self._cur.executemany(sql.replace("%s", "?").replace("%%", "%"), [tuple(a) for a in seq])
+        return self._cur.rowcount
+
+    def fetchone(self):
+        return self._row(self._cur.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(r) for r in self._cur.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(r) for r in self._cur.fetchall()]
+
+    def __iter__(self):
+        return (self._row(r) for r in self._cur)
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cur.lastrowid
+
+    def close(self):
+        self._cur.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SQLiteConnection:
+    """Autocommit sqlite3 connection in WAL mode with explicit begin/commit, like pymysql's."""
+
+    def __init__(self, path, dict_rows=False):
+        self._conn = sqlite3.connect(path, timeout=SQLITE_BUSY_MS / 1000, isolation_level=None,
+                                     detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._dict = dict_rows
+        for name, narg, fn in (("UNIX_TIMESTAMP", 0, lambda: int(time.time())), ("FLOOR", 1, math.floor),
+                               ("SQRT", 1, math.sqrt), ("POW", 2, math.pow),
+                               ("GREATEST", -1, _greatest), ("LEAST", -1, _least)):
+            self._conn.create_function(name, narg, fn)
+        self._conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_MS}")
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        # WAL + NORMAL: durable across process crashes, one fsync per checkpoint
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        for ddl in SQLITE_SCHEMA:
+            self._conn.execute(ddl)
+
+    def cursor(self, dict_rows=None):
+        return SQLiteCursor(self._conn.cursor(), self._dict if dict_rows is None else dict_rows)
+
+    def begin(self):
+        self._conn.execute("BEGIN")
+
+    def commit(self):
+        if self._conn.in_transaction:
+            self._conn.execute("COMMIT")
+
+    def rollback(self):
+        if self._conn.in_transaction:
+            self._conn.execute("ROLLBACK")
+
+    def ping(self, reconnect=True):
+        pass
+
+    def set_progress_handler(self, handler, n):
+        self._conn.set_progress_handler(handler, n)
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def connect(host="127.0.0.1", user="", password="", database="syslogs", dict_rows=False, path=None, **kwargs):
+    """
+    Open a connection on the configured backend. SQLite opens `path` (default
+    SQLITE_PATH) and ignores the MySQL arguments.
+    """
+    if BACKEND == "sqlite":
+        return SQLiteConnection(path or SQLITE_PATH, dict_rows)
+    if dict_rows:
+        kwargs["cursorclass"] = pymysql.cursors.DictCursor
+    return pymysql.connect(host=host, user=user, password=password, database=database,
+                           autocommit=True, **kwargs)
+
+
+def dict_cursor(conn):
+    """A cursor returning dict rows, whatever the connection's default."""
+    if BACKEND == "sqlite":
+        return conn.cursor(dict_rows=True)
+    return conn.cursor(pymysql.cursors.DictCursor)
+
+
+def stream_cursor(conn):
+    """
+    An unbuffered cursor returning tuple rows: rows are read from the server as
+    they are fetched (pymysql SSCursor), not all at execute(). sqlite3 cursors
+    already step lazily. Fully read or close it before reusing the connection.
+    """
+    if BACKEND == "sqlite":
+        return conn.cursor(dict_rows=False)
+    return conn.cursor(pymysql.cursors.SSCursor)
+
+
+def has_column_sql(table, column):
+    """(sql, params) counting `column` in `table`: 1 if it exists, else 0."""
+    if BACKEND == "sqlite":
+        return f"SELECT COUNT(*) AS n FROM pragma_table_xinfo('{table}') WHERE name = %s", (column,)
+    return ("SELECT COUNT(*) AS n FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s", (table, column))
+
+
+def has_column(conn, table, column):
+    with conn.cursor() as cur:
+        cur.execute(*has_column_sql(table, column))
+        row = cur.fetchone()
+    return (row[0] if isinstance(row, tuple) else next(iter(row.values()))) > 0
+
+
+def epoch_datetime(expr):
+    """SQL for the UTC DATETIME of an epoch-seconds expression, independent of the session time zone."""
+    if BACKEND == "sqlite":
+        return f"datetime({expr}, 'unixepoch')"
+    return f"'1970-01-01' + INTERVAL {expr} SECOND"
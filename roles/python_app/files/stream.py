@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Server-sent event fan-out of new stats rows for the console.
+
+One poller thread tails stats by id (every poll_interval seconds, only while
+someone is subscribed) and hands each batch to every subscriber, so DB load
+does not depend on the number of open dashboards:
+
+- each batch is JSON-encoded once per host filter in use, and subscribers
+  share the encoded bytes;
+- subscribers have a bounded queue; one that falls queue_size batches behind
+  is dropped and reconnects (EventSource does this by itself);
+- every event carries the last stats.id as its SSE id, so a reconnect with
+  Last-Event-ID resumes where it stopped: from the in-memory buffer of the
+  last buffer_rows rows, or from the DB (paged, filtered by host in SQL) when
+  the buffer is still filling. A cursor more than buffer_rows ids behind the
+  live one is clamped to that lookback, so no client can make the server
+  replay or hold the whole table; /api/export is the way to read history.
+  Clients never move the shared poller's cursor.
+- agents insert concurrently, so a lower id can commit after a higher one:
+  each poll re-reads `overlap` ids behind the cursor and publishes the rows
+  it has not published yet. The SSE id stays the highest id published, and
+  a resume re-sends `overlap` ids behind Last-Event-ID ("from"); clients
+  skip ids they already have.
+
+Event payload: {"rows": [{id, host_id, timestamp, cpu_usage, memory_usage}],
+"polled_at": epoch seconds, "from": ids above this may repeat earlier events}
+(polled_at lets clients measure fan-out latency).
+"""
+
+import json
+import time
+import queue
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional
+
+ROW_SQL = ("SELECT id, host_id, timestamp, cpu_usage, memory_usage FROM stats "
+           "WHERE id > %s{until}{host} ORDER BY id LIMIT %s")
+
+
+def _json_default(v):
+    if isinstance(v, datetime):
+        return v.strftime("%Y-%m-%dT%H:%M:%SZ")  # stats timestamps are UTC
+    return float(v)
+
+
+def encode(rows: List[Dict], polled_at: float, last_id: int, since: int) -> bytes:
+    data = json.dumps({"rows": rows, "polled_at": polled_at, "from": since}, default=_json_default,
+                      separators=(",", ":"))
+    return f"id: {last_id}\nevent: rows\ndata: {data}\n\n".encode()
+
+
+class Subscriber:
+    def __init__(self, host_id: Optional[int], queue_size: int):
+        self.host_id = host_id
+        self.queue: "queue.Queue[bytes]" = queue.Queue(queue_size)
+        self.closed = False
+
+
+class Broadcaster:
+    def __init__(self, connection: Callable, poll_interval: float = 1.0, batch_rows: int = 5000,
+                 buffer_rows: int = 5000, queue_size: int = 64, keepalive: float = 15.0, overlap: int = 64):
+        self.connection = connection  # context manager yielding a dict-row DB connection
+        self.poll_interval = poll_interval
+        self.batch_rows = batch_rows
+        self.queue_size = queue_size
+        self.keepalive = keepalive
+        self.lookback_rows = buffer_rows  # how far behind the live cursor a client may resume
+        self.overlap = overlap  # ids re-read behind the cursor for rows that commit late
+        self._recent = set()  # ids published within `overlap` of the cursor
+        self._buffer = deque(maxlen=buffer_rows)  # recent rows, oldest first
+        self._cursor: Optional[int] = None  # last stats.id published; None while idle
+        self._subs = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._stats = dict(polls=0, rows=0, events=0, dropped=0, db_resumes=0, clamped=0, errors=0)
+
+    # ---- poller ----
+    def _max_id(self) -> int:
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT COALESCE(MAX(id), 0) AS id FROM stats")
+            return int(cur.fetchone()["id"])
+
+    def _start(self):
+        """Idle poller: start at the DB head; rows just below it count as published."""
+        top = self._max_id()
+        recent = {r["id"] for r in self._query(max(0, top - self.overlap), top)}
+        with self._lock:
+            if self._cursor is None:
+                self._cursor, self._recent = top, recent
+
+    def _query(self, after: int, until: Optional[int] = None, host_id: Optional[int] = None) -> List[Dict]:
+        with self.connection() as conn, conn.cursor() as cur:
+            params = [after] + ([until] if until is not None else []) + \
+                     ([host_id] if host_id is not None else []) + [self.batch_rows]
+            cur.execute(ROW_SQL.format(until=" AND id <= %s" if until is not None else "",
+                                       host=" AND host_id = %s" if host_id is not None else ""), params)
+            return cur.fetchall()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._subs:
+                    self._cursor = None  # idle: no DB queries until the next subscriber
+                    self._buffer.clear()
+                    self._recent = set()
+            if self._cursor is None and not self._subs:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            try:
+                if self._cursor is None:
+                    self._start()
+                    continue
+                started = time.time()
+                read = self._query(max(0, self._cursor - self.overlap))
+                rows = [r for r in read if r["id"] not in self._recent]
+                with self._lock:
+                    self._stats["polls"] += 1
+                if rows:
+                    self._publish(rows, started)
+                if len(read) == self.batch_rows:
+                    continue  # catching up; poll again at once
+            except Exception:
+                with self._lock:
+                    self._stats["errors"] += 1
+            time.sleep(self.poll_interval)
+
+    def _publish(self, rows: List[Dict], polled_at: float):
+        by_host: Dict[int, List[Dict]] = {}
+        for r in rows:
+            by_host.setdefault(r["host_id"], []).append(r)
+        since = self._cursor - self.overlap
+        cursor = max(self._cursor, rows[-1]["id"])
+        encoded: Dict[Optional[int], bytes] = {None: encode(rows, polled_at, cursor, since)}
+        with self._lock:
+            self._cursor = cursor
+            self._recent = {i for i in self._recent if i > cursor - self.overlap}
+            self._recent.update(r["id"] for r in rows)
+            self._buffer.extend(rows)
+            self._stats["rows"] += len(rows)
+            for sub in list(self._subs):
+                if sub.host_id is not None and sub.host_id not in by_host:
+                    continue
+                if sub.host_id not in encoded:
+                    encoded[sub.host_id] = encode(by_host[sub.host_id], polled_at, cursor, since)
+                try:
+                    sub.queue.put_nowait(encoded[sub.host_id])
+                    self._stats["events"] += 1
+                except queue.Full:
+                    # too slow: drop it; the client resumes from its Last-Event-ID
+                    sub.closed = True
+                    self._subs.discard(sub)
+                    self._stats["dropped"] += 1
+
+    # ---- subscribers ----
+    def subscribe(self, host_id: Optional[int] = None, after: Optional[int] = None) -> Iterator[bytes]:
+        """SSE byte chunks for one client: the backlog after `after`, then live batches."""
+        sub = Subscriber(host_id, self.queue_size)
+        backlog: List[Dict] = []
+        gap = None
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stats-stream", daemon=True)
+                self._thread.start()
+        while True:
+            with self._lock:
+                if after is None or self._cursor is not None:
+                    if after is not None:
+                        # the backlog ends at the live cursor; later rows arrive through the queue
+                        floor = self._cursor - self.lookback_rows
+                        if after < floor:
+                            after = floor
+                            self._stats["clamped"] += 1
+                        after = max(0, after - self.overlap)  # rows that committed after the client's cursor
+                        if self._buffer and after >= self._buffer[0]["id"] - 1:
+                            backlog = [r for r in self._buffer
+                                       if r["id"] > after and (host_id is None or r["host_id"] == host_id)]
+                        elif after < self._cursor:
+                            gap = (after, self._cursor)  # buffer still filling: read from the DB below
+                            self._stats["db_resumes"] += 1
+                    self._subs.add(sub)
+                    break
+            # poller idle: it starts from the DB head, whatever the client's cursor
+            self._start()
+        self._wake.set()
+        try:
+            for i in range(0, len(backlog), self.batch_rows):
+                page = backlog[i:i + self.batch_rows]
+                yield encode(page, time.time(), max(r["id"] for r in page), after)
+            # at most lookback_rows ids, one page in memory at a time
+            while gap is not None:
+                rows = self._query(gap[0], gap[1], host_id)
+                if rows:
+                    yield encode(rows, time.time(), rows[-1]["id"], after)
+                gap = (rows[-1]["id"], gap[1]) if len(rows) == self.batch_rows else None
+            yield b"retry: 3000\n\n"
+            while not sub.closed:
+                try:
+                    yield sub.queue.get(timeout=self.keepalive)
+                except queue.Empty:
+                    yield b": keepalive\n\n"
+        finally:
+            with self._lock:
+                self._subs.discard(sub)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, subscribers=len(self._subs), cursor=self._cursor,
+                        buffered=len(self._buffer))
@@ -0,0 +1,129 @@
+"""
+Fixtures shared by the tests. `backend` runs a test once per storage backend
+(see storage.py), each time against a new, empty database of its own:
+
+  sqlite  a file under the test's tmp_path
+  mysql   a scratch database (syslogs_test_<random>) on DB_HOST as DB_USER /
+          DB_PASS (default root, no password), created by
+          roles/mysql/files/migrate_schema.py and dropped afterwards; skipped
+          when pymysql or the server is not available
+
+The backend is fixed when storage.py is imported (BACKEND, INSERT_IGNORE and
+the SQL built from them), so the fixture re-imports the application modules
+after setting DB_BACKEND and hands them to the test.
+"""
+import os
+import sys
+import uuid
+import calendar
+import importlib
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+APP_DIR = os.path.abspath(os.path.join(ROOT, "roles", "python_app", "files"))
+MYSQL_DIR = os.path.abspath(os.path.join(ROOT, "roles", "mysql", "files"))
+sys.path[:0] = [APP_DIR, MYSQL_DIR]
+
+APP_MODULES = ("storage", "log_stats", "rollup", "export", "aiodb", "resultcache", "sql_console")
+MYSQL = dict(host=os.getenv("DB_HOST", "127.0.0.1"), user=os.getenv("DB_USER", "root"),
+             password=os.getenv("DB_PASS", ""))
+
+T0 = datetime(2026, 1, 1)
+STEP = 15  # seconds between agent rows
+N = 40  # rows per host: ten minutes
+
+
+def agent_rows(offset=0.0):
+    """ROW_COLUMNS tuples every STEP seconds from T0; cpu climbs by 1 %, memory by 0.5 %."""
+    out = []
+    for i in range(N):
+        ts = (T0 + timedelta(seconds=i * STEP)).strftime("%Y-%m-%d %H:%M:%S")
+        cpu, mem = 10.0 + i + offset, 40.0 + i / 2 + offset
+        out.append((ts, cpu, mem, cpu - 1, cpu + 1, cpu, mem - 1, mem + 1, mem))
+    return out
+
+
+def epoch(dt):
+    return calendar.timegm(dt.timetuple())
+
+
+def _fresh_imports():
+    for name, mod in list(sys.modules.items()):
+        path = getattr(mod, "__file__", None)
+        if path and os.path.dirname(os.path.abspath(path)) in (APP_DIR, MYSQL_DIR):
+            del sys.modules[name]
+    return SimpleNamespace(**{name: importlib.import_module(name) for name in APP_MODULES})
+
+
+def _mysql_server():
+    pymysql = pytest.importorskip("pymysql")
+    try:
+        return pymysql.connect(autocommit=True, connect_timeout=2, **MYSQL)
+    except pymysql.err.Error as e:
+        pytest.skip(f"no MySQL server at {MYSQL['host']}: {e}")
+
+
+@pytest.fixture(params=["sqlite", "mysql"])
+def backend(request, tmp_path, monkeypatch):
+    """The application modules, imported against a new, empty database on request.param."""
+    monkeypatch.setenv("DB_BACKEND", request.param)
+    monkeypatch.setenv("STATE_DIR", str(tmp_path))
+    monkeypatch.setenv("HOST_NAME", "agent-a")
+    monkeypatch.setenv("QUERY_CACHE", "0")
+    monkeypatch.setenv("CONSOLE_SERVER", "dev")
+    monkeypatch.setenv("ROLLUP_SETTLE", "0")
+    server = name = None
+    if request.param == "sqlite":
+        monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "syslogs.db"))
+    else:
+        server = _mysql_server()
+        name = "syslogs_test_" + uuid.uuid4().hex[:8]
+        with server.cursor() as cur:
+            cur.execute(f"CREATE DATABASE {name}")
+        monkeypatch.setenv("DB_NAME", name)
+        monkeypatch.setenv("DB_HOST", MYSQL["host"])
+        monkeypatch.setenv("DB_USER", MYSQL["user"])
+        monkeypatch.setenv("DB_PASS", MYSQL["password"])
+    try:
+        mods = _fresh_imports()
+        if server is not None:
+            migrate_schema = importlib.import_module("migrate_schema")
+            conn = mods.storage.connect(database=name, dict_rows=True, **MYSQL)
+            with conn.cursor() as cur:
+                migrate_schema.migrate(cur, migrate_schema.MIGRATIONS[-1][0])
+            conn.close()
+        yield mods
+    finally:
+        if server is not None:
+            with server.cursor() as cur:
+                cur.execute(f"DROP DATABASE IF EXISTS {name}")
+            server.close()
+
+
+@pytest.fixture
+def db(backend):
+    """Opens a dict-row connection to the test's database."""
+    return lambda: backend.storage.connect(host=MYSQL["host"], user=MYSQL["user"], password=MYSQL["password"],
+                                           database=os.environ.get("DB_NAME", "syslogs"), dict_rows=True)
+
+
+@pytest.fixture
+def hosts(backend, monkeypatch):
+    """Two agents' rows (agent_rows()) written through log_stats.Writer: {host name: hosts.id}."""
+    log_stats = backend.log_stats
+    ids = {}
+    for name, offset in (("agent-a", 0.0), ("agent-b", 0.5)):
+        monkeypatch.setattr(log_stats, "HOST_NAME", name)
+        log_stats._host_ids.clear()
+        rows = agent_rows(offset)
+        extras = [(r[0], {"load1": 0.5, "swap_pct": 1.25}) for r in rows]
+        procs = [(r[0], [(100, "python3", 12.5, 2048), (200, "mysqld", 3.0, 4096)]) for r in rows]
+        writer = log_stats.Writer()
+        assert writer.write_many(rows, extras, procs)
+        writer.close()
+        ids[name] = log_stats._host_ids[None]
+    log_stats._host_ids.clear()
+    return ids
@@ -0,0 +1,56 @@
+"""
+/api/delta (sql_console.py): rows appended after a stats.id cursor, re-read
+from ID_OVERLAP ids behind it so a lower id that commits late still arrives.
+"""
+from conftest import T0, epoch
+
+
+def max_id(db):
+    conn = db()
+    with conn.cursor() as cur:
+        cur.execute("SELECT MAX(id) AS id FROM stats")
+        top = cur.fetchone()["id"]
+    conn.close()
+    return top
+
+
+def test_delta_rereads_the_overlap(backend, db, hosts):
+    client = backend.sql_console.app.test_client()
+    top = max_id(db)
+    after = top - 10
+    data = client.get(f"/api/delta?after={after}").get_json()
+    assert data["from"] == max(0, after - backend.sql_console.ID_OVERLAP)
+    assert [r["id"] for r in data["rows"]] == list(range(data["from"] + 1, top + 1))
+    assert data["cursor"] == top
+    # nothing new: the cursor stays put
+    assert client.get(f"/api/delta?after={top}").get_json()["cursor"] == top
+
+
+def test_delta_host_and_limit(backend, db, hosts):
+    client = backend.sql_console.app.test_client()
+    after = max_id(db) - 10
+    data = client.get(f"/api/delta?after={after}&host=agent-a&limit=5").get_json()
+    assert len(data["rows"]) == 5
+    assert all(r["id"] > data["from"] for r in data["rows"])
+    assert client.get("/api/delta?after=x").status_code == 400
+
+
+def test_delta_late_commit(backend, db, hosts):
+    """A row whose id is below the client's cursor is still delivered."""
+    client = backend.sql_console.app.test_client()
+    top = max_id(db)
+    conn = db()
+    with conn.cursor() as cur:
+        # stands in for an insert that took id `top` - 2 but committed after `top`
+        cur.execute("DELETE FROM stats WHERE id = %s", (top - 2,))
+    conn.close()
+    seen = {r["id"] for r in client.get(f"/api/delta?after={top - 20}").get_json()["rows"]}
+    assert top - 2 not in seen
+    conn = db()
+    with conn.cursor() as cur:
+        cur.execute("INSERT INTO stats (id, host_id, ts, cpu_x100, mem_x100) VALUES (%s, %s, %s, 1, 1)",
+                    (top - 2, hosts["agent-a"], epoch(T0)))
+    conn.close()
+    data = client.get(f"/api/delta?after={top}").get_json()
+    assert [r["id"] for r in data["rows"] if r["id"] not in seen] == [top - 2]
+    assert data["cursor"] == top
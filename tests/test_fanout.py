@@ -0,0 +1,37 @@
+"""
+log_stats.FanoutWriter: a target that cannot take the batch within the
+writer's timeout is cut off and reported as missed, without delaying the
+flush to the others.
+"""
+import time
+import sqlite3
+
+import pytest
+
+from conftest import agent_rows
+
+
+@pytest.mark.parametrize("backend", ["sqlite"], indirect=True)
+def test_locked_target_does_not_delay_the_flush(backend, tmp_path):
+    targets = [str(tmp_path / "a.db"), str(tmp_path / "b.db")]
+    fan = backend.log_stats.FanoutWriter(targets, timeout=0.5)
+    rows = agent_rows()
+    try:
+        assert fan.write_targets(rows[:1]) == []  # connected and registered on both
+        lock = sqlite3.connect(targets[1], isolation_level=None)
+        lock.execute("BEGIN EXCLUSIVE")  # b's writes wait up to SQLITE_BUSY_MS (5 s)
+        try:
+            started = time.monotonic()
+            missed = fan.write_targets(rows[1:])
+            elapsed = time.monotonic() - started
+        finally:
+            lock.execute("ROLLBACK")
+            lock.close()
+        assert missed == [targets[1]]
+        assert elapsed < 1.5
+        # b's connection was dropped with the cut-off batch; the next flush opens a new one
+        assert fan.write_targets(rows[:1]) == []
+    finally:
+        fan.close()
+    counts = [sqlite3.connect(t).execute("SELECT COUNT(*) FROM stats").fetchone()[0] for t in targets]
+    assert counts == [len(rows) + 1, 2]
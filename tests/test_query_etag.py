@@ -0,0 +1,33 @@
+"""
+/api/query validators (sql_console.py): the weak ETag follows the stats
+watermark, so an unchanged poll gets 304 and a new row, even one committed
+late below MAX(id), gets a new body.
+"""
+from conftest import T0, epoch
+
+
+def test_query_etag_late_commit(backend, db, hosts):
+    console = backend.sql_console
+    console.CACHE.check_every = 0  # re-read the watermark on every request
+    client = console.app.test_client()
+    first = client.get("/api/query")
+    tag = first.headers["ETag"]
+    assert first.status_code == 200
+    assert client.get("/api/query", headers={"If-None-Match": tag}).status_code == 304
+
+    top, _ = console._stats_watermark()
+    conn = db()
+    with conn.cursor() as cur:
+        # stands in for an insert that took id `top` - 2 but committed after `top`
+        cur.execute("DELETE FROM stats WHERE id = %s", (top - 2,))
+    conn.close()
+    tag = client.get("/api/query").headers["ETag"]
+    conn = db()
+    with conn.cursor() as cur:
+        cur.execute("INSERT INTO stats (id, host_id, ts, cpu_x100, mem_x100) VALUES (%s, %s, %s, 1, 1)",
+                    (top - 2, hosts["agent-a"], epoch(T0)))
+    conn.close()
+    assert console._stats_watermark()[0] == top
+    late = client.get("/api/query", headers={"If-None-Match": tag})
+    assert late.status_code == 200
+    assert late.headers["ETag"] != tag
@@ -0,0 +1,55 @@
+"""
+resultcache.ResultCache: a slow high-water mark read or a stuck leader does not
+hold up the other requests.
+"""
+import threading
+import time
+
+import resultcache
+
+
+def test_watermark_read_outside_the_lock():
+    reading, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow_watermark():
+        calls.append(None)
+        value = min(len(calls), 2)
+        if len(calls) == 2:
+            reading.set()
+            release.wait(5)
+        return value
+
+    cache = resultcache.ResultCache(ttl=60, watermark=slow_watermark, check_every=0)
+    assert cache.watermark() == 1
+    reader = threading.Thread(target=cache.watermark)
+    reader.start()
+    assert reading.wait(5)
+    started = time.monotonic()
+    assert cache.watermark() == 1  # the previous value, without waiting for the read
+    assert time.monotonic() - started < 0.5
+    release.set()
+    reader.join()
+    assert cache.watermark() == 2
+    assert len(calls) == 3
+
+
+def test_waiter_falls_back_to_its_own_fetch():
+    entered, release = threading.Event(), threading.Event()
+
+    def stuck():
+        entered.set()
+        release.wait(5)
+        return "leader"
+
+    cache = resultcache.ResultCache(ttl=60, watermark=lambda: 1, wait_timeout=0.2)
+    leader = threading.Thread(target=cache.get, args=("q", stuck))
+    leader.start()
+    assert entered.wait(5)
+    started = time.monotonic()
+    assert cache.get("q", lambda: "own") == "own"
+    assert time.monotonic() - started < 1
+    assert cache.stats()["wait_timeouts"] == 1
+    release.set()
+    leader.join()
+    assert cache.get("q", lambda: "again") == "leader"
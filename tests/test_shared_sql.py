@@ -0,0 +1,88 @@
+"""
+The SQL the agent and the rollups share, run on every storage backend (see
+conftest.py: SQLite always, MySQL when a server is reachable):
+
+  python -m pytest tests
+"""
+from datetime import timedelta
+
+import pytest
+
+from conftest import N, STEP, T0, agent_rows, epoch
+
+
+def count(db, table, host_id):
+    conn = db()
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT COUNT(*) AS n FROM {table} WHERE host_id = %s", (host_id,))
+        n = cur.fetchone()["n"]
+    conn.close()
+    return n
+
+
+def test_agent_insert(backend, db, hosts):
+    conn = db()
+    with conn.cursor() as cur:
+        cur.execute("SELECT ts, timestamp, cpu_x100, mem_x100, cpu_usage, memory_usage, cpu_max_x100 "
+                    "FROM stats WHERE host_id = %s ORDER BY ts LIMIT 1", (hosts["agent-b"],))
+        first = cur.fetchone()
+    assert backend.log_stats.compact_layout(conn)
+    conn.close()
+    # percentages are stored in hundredths, read back through the generated columns
+    assert (first["ts"], first["cpu_x100"], first["mem_x100"], first["cpu_max_x100"]) == \
+        (epoch(T0), 1050, 4050, 1150)
+    assert first["timestamp"] == T0
+    # MySQL returns the generated columns as DECIMAL
+    assert (float(first["cpu_usage"]), float(first["memory_usage"])) == pytest.approx((10.5, 40.5))
+    assert count(db, "stats", hosts["agent-a"]) == N
+    assert count(db, "metric_values", hosts["agent-a"]) == 2 * N
+    assert count(db, "process_stats", hosts["agent-a"]) == 2 * N
+
+
+def test_agent_insert_ignores_repeated_metrics(backend, db, hosts):
+    log_stats = backend.log_stats
+    log_stats._host_ids[None] = hosts["agent-a"]
+    writer = log_stats.Writer()
+    row = agent_rows()[0]
+    # same (host, metric, timestamp) and (host, timestamp, pid) keys as the fixture wrote
+    assert writer.write_many([row], [(row[0], {"load1": 9.0})], [(row[0], [(100, "python3", 1.0, 1)])])
+    writer.close()
+    assert count(db, "stats", hosts["agent-a"]) == N + 1
+    assert count(db, "metric_values", hosts["agent-a"]) == 2 * N
+    assert count(db, "process_stats", hosts["agent-a"]) == 2 * N
+
+
+def rolled_up(backend):
+    """MySQL serves 60 s buckets from stats_1m: fold the rows in (settled at once, ROLLUP_SETTLE=0)."""
+    if backend.storage.BACKEND == "mysql":
+        conn = backend.rollup.get_db()
+        for _ in range(2):  # the first pass only observes the head
+            backend.rollup.update(conn)
+        conn.close()
+
+
+def test_series(backend, db, hosts):
+    rolled_up(backend)
+    conn = db()
+    with backend.storage.dict_cursor(conn) as cur:
+        rows = backend.rollup.series(cur, T0, T0 + timedelta(minutes=10), 60, hosts["agent-a"])
+    conn.close()
+    assert [r["t"] for r in rows] == [T0 + timedelta(minutes=m) for m in range(10)]
+    assert all(r["n"] == 60 // STEP for r in rows)
+    # minute m holds cpu 10 + 4m .. 13 + 4m
+    assert [float(r["cpu_avg"]) for r in rows] == pytest.approx([11.5 + 4 * m for m in range(10)])
+    assert float(rows[0]["cpu_min"]) == pytest.approx(9.0)  # cpu_min_x100 of the first row
+    assert float(rows[-1]["cpu_max"]) == pytest.approx(50.0)
+
+
+def test_summary(backend, db, hosts):
+    rolled_up(backend)
+    conn = db()
+    with backend.storage.dict_cursor(conn) as cur:
+        both = backend.rollup.summary(cur, T0, T0 + timedelta(minutes=10), 60)
+        one = backend.rollup.summary(cur, T0, T0 + timedelta(minutes=5), 60, hosts["agent-b"])
+    conn.close()
+    assert both["n"] == 2 * N
+    assert float(both["cpu_avg"]) == pytest.approx(10 + (N - 1) / 2 + 0.25)
+    assert one["n"] == N // 2
+    assert float(one["mem_avg"]) == pytest.approx(40.5 + (N // 2 - 1) / 4)
@@ -0,0 +1,11 @@
+"""
+/api/stream (sql_console.py): refused in JSON, like the other API errors, when
+the server does not stream.
+"""
+
+
+def test_stream_off(backend, monkeypatch):
+    monkeypatch.setattr(backend.sql_console, "CONSOLE_SSE", False)
+    resp = backend.sql_console.app.test_client().get("/api/stream")
+    assert resp.status_code == 503
+    assert "CONSOLE_SSE" in resp.get_json()["error"]
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+CPU cost per sample: timer model vs daemon model of log_stats.py.
+
+  timer  -> one fresh interpreter per sample (imports + connect + INSERT + exit),
+            measured from RUSAGE_CHILDREN
+  daemon -> in-process Writer with one persistent connection, measured with
+            time.process_time()
+
+Needs a reachable DB (DB_HOST/DB_USER/DB_PASS/DB_NAME, same as the agent).
+Usage: python tools/bench_agent.py [samples]
+"""
+import os
+import sys
+import time
+import resource
+import subprocess
+
+AGENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "roles", "python_app", "files")
+sys.path.insert(0, AGENT_DIR)
+
+import log_stats  # noqa: E402
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+
+def children_cpu():
+    ru = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return ru.ru_utime + ru.ru_stime
+
+
+def bench_timer():
+    script = os.path.join(AGENT_DIR, "log_stats.py")
+    before = children_cpu()
+    for _ in range(N):
+        subprocess.run([sys.executable, script], check=True)
+    return (children_cpu() - before) / N
+
+
+def bench_daemon():
+    writer = log_stats.Writer()
+    cpu_sampler = log_stats.CpuSampler()
+    writer.write(log_stats.sample(cpu_sampler))  # warm-up: connect outside the timed loop
+    before = time.process_time()
+    for _ in range(N):
+        writer.write(log_stats.sample(cpu_sampler))
+    cost = (time.process_time() - before) / N
+    writer.close()
+    return cost
+
+
+if __name__ == "__main__":
+    timer = bench_timer()
+    daemon = bench_daemon()
+    print(f"samples per model : {N}")
+    print(f"timer  CPU/sample : {timer * 1000:8.2f} ms")
+    print(f"daemon CPU/sample : {daemon * 1000:8.2f} ms")
+    print(f"speed-up          : {timer / daemon if daemon else float('inf'):8.1f}x")
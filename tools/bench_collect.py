@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Per-tick collection cost of the metrics agent (no DB needed).
+
+  base  -> CpuSampler + virtual_memory (every reading)
+  extra -> MetricsCollector.collect() (once per stored row)
+  procs -> TopProcesses.scan() (once per stored row when TOP_PROCESSES > 0)
+
+--spawn N starts N idle `sleep` processes first, to measure the process scan
+on a host with thousands of processes.
+Usage: python tools/bench_collect.py [-n iterations] [--spawn N] [--top N]
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+AGENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "roles", "python_app", "files")
+sys.path.insert(0, AGENT_DIR)
+
+import psutil  # noqa: E402
+import log_stats  # noqa: E402
+
+
+def bench(fn, n):
+    fn()  # warm-up
+    wall, cpu = time.perf_counter(), time.process_time()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - wall) / n, (time.process_time() - cpu) / n
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=200, help="iterations per path")
+    ap.add_argument("--spawn", type=int, default=0, help="idle processes to start first")
+    ap.add_argument("--top", type=int, default=10, help="N for TopProcesses")
+    args = ap.parse_args()
+
+    children = [subprocess.Popen(["sleep", "600"]) for _ in range(args.spawn)]
+    try:
+        cpu_sampler = log_stats.CpuSampler()
+        collector = log_stats.MetricsCollector()
+        top = log_stats.TopProcesses(args.top, budget=0)
+        print(f"processes: {len(psutil.pids())}, metrics per extra tick: {len(collector.collect())}")
+        print(f"{'path':<6} {'wall us':>12} {'cpu us':>12}")
+        for name, fn in (("base", lambda: log_stats.read_metrics(cpu_sampler)),
+                         ("extra", collector.collect),
+                         ("procs", top.scan)):
+            wall, cpu = bench(fn, args.n)
+            print(f"{name:<6} {wall * 1e6:>12.1f} {cpu * 1e6:>12.1f}")
+        print(f"procs scans are skipped while slower than TOP_PROC_BUDGET={log_stats.TOP_PROC_BUDGET}s")
+    finally:
+        for c in children:
+            c.kill()
+            c.wait()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Chart downsampling (downsample.py) over synthetic CPU/memory series: time to
+pick, rows kept, and how many injected spikes survive, for LTTB within
+--points rows and min/max over --width pixel columns.
+
+Each series is ROWS samples 15 s apart (a noisy daily cycle) with --spikes
+single-sample spikes to 100 % in the CPU series, spread so no two fall in the
+same bucket; a spike "survives" when its row is among those picked (always
+for min/max; LTTB keeps the largest-area point, nearly always the spike).
+"JSON KB" is the picked rows in the default query's row-dict shape, as
+/api/query would send them. Times are the best of --repeat.
+Usage: python tools/bench_downsample.py [--rows 10000,100000,1000000] [--points 800]
+                                        [--width 800] [--spikes 20] [--repeat 5]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+AGENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "roles", "python_app", "files")
+sys.path.insert(0, AGENT_DIR)
+
+import downsample  # noqa: E402
+
+
+def synthetic(n, spikes, rng):
+    x = np.arange(n) * 15.0
+    cpu = 30 + 20 * np.sin(x / 86400 * 2 * np.pi) + rng.normal(0, 3, n)
+    mem = 50 + 10 * np.sin(x / 43200 * 2 * np.pi) + rng.normal(0, 1, n)
+    # one spike near the middle of each of `spikes` equal segments, so no two share a bucket
+    seg = n // spikes
+    at = np.arange(spikes) * seg + seg // 2 + rng.integers(-seg // 4, seg // 4 + 1, spikes)
+    cpu[at] = 100.0
+    return x, cpu, mem, set(at.tolist())
+
+
+def best(fn, repeat):
+    out, times = None, []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - started)
+    return out, min(times)
+
+
+def json_kb(x, cpu, mem, idx):
+    rows = [{"id": int(i), "memory_usage": round(float(mem[i]), 2), "cpu_usage": round(float(cpu[i]), 2),
+             "timestamp": int(x[i])} for i in idx]
+    return len(json.dumps(rows)) / 1024
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", default="10000,100000,1000000")
+    ap.add_argument("--points", type=int, default=800)
+    ap.add_argument("--width", type=int, default=800)
+    ap.add_argument("--spikes", type=int, default=20)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+    rng = np.random.default_rng(1)
+    print(f"{'rows':>9} {'method':<16} {'kept':>6} {'ms':>8} {'spikes':>8} {'JSON KB':>9}")
+    for n in [int(r) for r in args.rows.split(",")]:
+        x, cpu, mem, spikes = synthetic(n, args.spikes, rng)
+        print(f"{n:>9} {'raw':<16} {n:>6} {0:>8.1f} {len(spikes):>4}/{len(spikes):<3} "
+              f"{json_kb(x, cpu, mem, range(min(n, 100000))) * n / min(n, 100000):>9.0f}")
+        for label, kw in ((f"lttb {args.points}", dict(points=args.points)),
+                          (f"minmax {args.points}", dict(points=args.points, method="minmax")),
+                          (f"minmax {args.width}px", dict(width=args.width))):
+            idx, secs = best(lambda: downsample.select(x, [cpu, mem], **kw), args.repeat)
+            kept = len(spikes & set(idx.tolist()))
+            print(f"{n:>9} {label:<16} {len(idx):>6} {secs * 1000:>8.1f} {kept:>4}/{len(spikes):<3} "
+                  f"{json_kb(x, cpu, mem, idx):>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+One agent flush of --batch rows written to several databases (as
+log_stats.py's DB_TARGETS) one after another (log_stats.Writer) against all at
+once on one event loop through aiodb.py (log_stats.FanoutWriter). Times are
+the best of --repeat.
+
+With --down, one more target that cannot be reached is added (a TEST-NET
+address that never answers; a SQLite path that cannot be opened): the
+concurrent flush then takes at most TARGET_TIMEOUT, and that target is
+reported as missed (its batch would be spooled).
+Usage: python tools/bench_fanout.py --targets db1,db2 [--batch 20] [--repeat 5] [--down]
+"""
+import os
+import sys
+import time
+import argparse
+
+AGENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "roles", "python_app", "files")
+sys.path.insert(0, AGENT_DIR)
+
+import aiodb  # noqa: E402
+import storage  # noqa: E402
+
+# a MySQL address that never answers (TEST-NET-1), or a SQLite file that cannot be opened
+UNREACHABLE = "/nonexistent/down.db" if storage.BACKEND == "sqlite" else "192.0.2.1"
+
+
+def timed(fn):
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def bench_flush(targets, batch, repeat, down):
+    os.environ["DB_TARGETS"] = ",".join(targets)
+    import log_stats
+    now = int(time.time())
+    rows = [(time.strftime(storage.TS_FMT, time.gmtime(now + i)), 10.0, 20.0, 1, 2, 3, 4, 5, 6)
+            for i in range(batch)]
+    writers = [log_stats.Writer(t) for t in targets]
+    fan = log_stats.FanoutWriter(targets)
+    try:
+        for w in writers:
+            w.write_many(rows[:1])  # connect and register outside the timing
+        fan.write_targets(rows[:1])
+        seq = min(timed(lambda: [w.write_many(rows) for w in writers]) for _ in range(repeat))
+        par = min(timed(lambda: fan.write_targets(rows)) for _ in range(repeat))
+        if down:
+            fan_down = log_stats.FanoutWriter(targets + [UNREACHABLE])
+            missed = []
+            try:
+                slow = timed(lambda: missed.extend(fan_down.write_targets(rows)))
+            finally:
+                fan_down.close()
+    finally:
+        for w in writers:
+            w.close()
+        fan.close()
+    print(f"flush of {batch} rows to {len(targets)} targets (driver {aiodb.DRIVER}, best of {repeat}):")
+    print(f"  one after another (Writer)   {seq * 1000:8.1f} ms")
+    print(f"  concurrent (FanoutWriter)    {par * 1000:8.1f} ms")
+    if down:
+        print(f"  concurrent, one target down  {slow * 1000:8.1f} ms  (missed: {', '.join(missed) or 'none'})")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--targets", required=True)
+    ap.add_argument("--batch", type=int, default=20)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--down", action="store_true", help="add an unreachable target")
+    args = ap.parse_args()
+    bench_flush(args.targets.split(","), args.batch, args.repeat, args.down)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Insert throughput of the collector's write path at different batch sizes.
+
+Writes synthetic samples into a scratch copy of the stats table (stats_bench,
+dropped afterwards) with the same executemany() call the agent's Writer uses.
+Point DB_HOST/DB_USER/DB_PASS/DB_NAME at a local MariaDB.
+Usage: python tools/bench_insert.py [rows_per_run]
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+AGENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "roles", "python_app", "files")
+sys.path.insert(0, AGENT_DIR)
+
+import log_stats  # noqa: E402
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+BATCH_SIZES = (1, 10, 100, 1000)
+
+
+def synthetic_rows(n):
+    t0 = datetime.utcnow()
+    values = (12.5, 48.25, 3.0, 97.5, 10.0, 48.0, 48.5, 48.25)
+    return [((t0 + timedelta(seconds=i)).strftime("%Y-%m-%d %H:%M:%S"),) + values for i in range(n)]
+
+
+if __name__ == "__main__":
+    conn = log_stats.connect()
+    # same statement and row shape the Writer picks for the live stats layout
+    if log_stats.compact_layout(conn):
+        sql, rows = log_stats.COMPACT_INSERT_SQL, [(0,) + log_stats.compact_row(r) for r in synthetic_rows(ROWS)]
+    else:
+        sql, rows = log_stats.INSERT_SQL, [(0,) + r for r in synthetic_rows(ROWS)]
+    BENCH_SQL = sql.replace("INTO stats ", "INTO stats_bench ")
+    with conn.cursor() as cur:
+        cur.execute("DROP TABLE IF EXISTS stats_bench")
+        cur.execute("CREATE TABLE stats_bench LIKE stats")
+        print(f"{'batch':>6} {'rows/s':>10} {'ms/flush':>10}")
+        for size in BATCH_SIZES:
+            cur.execute("TRUNCATE TABLE stats_bench")
+            started = time.perf_counter()
+            for i in range(0, ROWS, size):
+                cur.executemany(BENCH_SQL, rows[i:i + size])
+            elapsed = time.perf_counter() - started
+            flushes = -(-ROWS // size)
+            print(f"{size:>6} {ROWS / elapsed:>10.0f} {elapsed / flushes * 1000:>10.2f}")
+        cur.execute("DROP TABLE stats_bench")
+    conn.close()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Payload size and serialisation time of /api/query responses, row dicts vs the
+columnar format (payload.py), each uncompressed, gzip and brotli (when the
+brotli module is installed).
+
+Uses ROWS synthetic rows shaped like the default query (id, memory_usage,
+cpu_usage, timestamp), or the result of --sql against the configured DB.
+Bodies are serialised with Flask's JSON provider, as jsonify() does. Times are
+the best of REPEAT runs; "total" is serialisation plus compression, the work
+per uncached poll. A poll answered with 304 has an empty body.
+Usage: python tools/bench_payload.py [--rows 1000] [--repeat 20] [--sql "SELECT ... LIMIT 1000"]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+from flask import Flask
+
+AGENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "roles", "python_app", "files")
+sys.path.insert(0, AGENT_DIR)
+
+import payload  # noqa: E402
+
+
+def synthetic(n):
+    t0 = datetime.utcnow().replace(microsecond=0)
+    return ["id", "memory_usage", "cpu_usage", "timestamp"], [
+        {"id": 5000000 - i, "memory_usage": round(random.uniform(20, 90), 2),
+         "cpu_usage": round(random.uniform(0, 100), 2), "timestamp": t0 - timedelta(seconds=15 * i)}
+        for i in range(n)]
+
+
+def from_db(sql):
+    import storage
+    conn = storage.connect(host=os.getenv("DB_HOST", "127.0.0.1"), user=os.getenv("DB_USER", "devops"),
+                           password=os.getenv("DB_PASS", ""), database=os.getenv("DB_NAME", "syslogs"),
+                           dict_rows=True)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql)
+            rows = cur.fetchall()
+    finally:
+        conn.close()
+    return (list(rows[0].keys()) if rows else []), rows
+
+
+def best(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - started)
+    return out, min(times) * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=1000)
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--sql")
+    args = ap.parse_args()
+    cols, rows = from_db(args.sql) if args.sql else synthetic(args.rows)
+    summary = {"avg_memory": None, "avg_cpu": None, "count": len(rows)}
+
+    app = Flask(__name__)
+    codings = [("identity", "")] + [("gzip", "gzip")] + ([("brotli", "br")] if payload.brotli else [])
+    print(f"{len(rows)} rows, columns {', '.join(cols)}")
+    print(f"{'format':<9} {'encoding':<9} {'bytes':>9} {'ratio':>6} {'serialise ms':>13} {'compress ms':>12} {'total ms':>9}")
+    base = None
+    with app.app_context():
+        for fmt, build in (("rows", lambda: {"columns": cols, "rows": rows, "summary": summary}),
+                           ("columnar", lambda: dict(payload.columnar(cols, rows), summary=summary))):
+            body, ser_ms = best(lambda: app.json.dumps(build()).encode(), args.repeat)
+            base = base or len(body)
+            for name, accept in codings:
+                (data, _), comp_ms = best(lambda: payload.compress(body, accept), args.repeat)
+                print(f"{fmt:<9} {name:<9} {len(data):>9} {len(data) / base:>6.2f} {ser_ms:>13.2f} "
+                      f"{comp_ms:>12.2f} {ser_ms + comp_ms:>9.2f}")
+    if not payload.brotli:
+        print("(brotli not installed: pip install brotli to compare)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Same checks and throughput numbers for each storage backend (storage.py).
+
+Per backend, in a child process with DB_BACKEND set:
+  - writes synthetic rows through the agent's Writer (batches of BATCH) and
+    checks they read back through a range query and rollup.series()
+  - insert throughput (rows/s)
+  - range-query throughput: one-hour window of one host, as /api/series and
+    snapshot.py read it (queries/s)
+The rows belong to a scratch host (HOST_NAME=bench-storage) and are deleted
+afterwards. SQLite uses a temporary file unless SQLITE_PATH is set; MySQL uses
+DB_HOST/DB_USER/DB_PASS/DB_NAME.
+Usage: python tools/bench_storage.py [rows] [--backends mysql,sqlite]
+"""
+import os
+import sys
+import time
+import calendar
+import tempfile
+import argparse
+import subprocess
+from datetime import datetime, timedelta
+
+AGENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "roles", "python_app", "files")
+sys.path.insert(0, AGENT_DIR)
+
+BATCH = 100
+QUERIES = 200
+
+
+def run(rows):
+    import storage
+    import rollup
+    import log_stats
+
+    t0 = datetime.utcnow().replace(microsecond=0) - timedelta(seconds=rows)
+    values = (12.5, 48.25, 3.0, 97.5, 10.0, 48.0, 48.5, 48.25)
+    data = [((t0 + timedelta(seconds=i)).strftime(storage.TS_FMT),) + values for i in range(rows)]
+
+    writer = log_stats.Writer()
+    started = time.perf_counter()
+    for i in range(0, rows, BATCH):
+        assert writer.write_many(data[i:i + BATCH]), "insert failed"
+    insert_s = time.perf_counter() - started
+    hid = log_stats.host_id(writer.conn)
+    writer.close()
+
+    conn = log_stats.connect()
+    try:
+        lo = calendar.timegm(t0.timetuple())
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM stats WHERE host_id = %s AND ts >= %s AND ts < %s",
+                        (hid, lo, lo + rows))
+            assert cur.fetchone()[0] == rows, "row count mismatch"
+        with storage.dict_cursor(conn) as cur:
+            buckets = rollup.series(cur, t0, t0 + timedelta(seconds=rows), 30, hid)
+            assert buckets and abs(buckets[0]["cpu_avg"] - 12.5) < 0.01, "series mismatch"
+
+        window = min(rows, 3600)
+        started = time.perf_counter()
+        with conn.cursor() as cur:
+            for q in range(QUERIES):
+                start = lo + (q * 97) % max(1, rows - window + 1)
+                cur.execute("SELECT timestamp, cpu_usage, memory_usage FROM stats "
+                            "WHERE host_id = %s AND ts >= %s AND ts < %s ORDER BY ts",
+                            (hid, start, start + window))
+                cur.fetchall()
+        query_s = time.perf_counter() - started
+
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM stats WHERE host_id = %s", (hid,))
+    finally:
+        conn.close()
+    print(f"{storage.BACKEND:<8} {rows / insert_s:>10.0f} {QUERIES / query_s:>10.1f} {window:>8}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("rows", type=int, nargs="?", default=20000)
+    ap.add_argument("--backends", default="mysql,sqlite")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        run(args.rows)
+        return
+
+    print(f"{'backend':<8} {'ins rows/s':>10} {'queries/s':>10} {'rows/q':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in args.backends.split(","):
+            env = dict(os.environ, DB_BACKEND=backend, HOST_NAME="bench-storage", EXTRA_METRICS="0")
+            env.setdefault("SQLITE_PATH", os.path.join(tmp, "bench.db"))
+            # STATE_DIR keeps the agent's spool/CPU state out of the source tree
+            env.setdefault("STATE_DIR", tmp)
+            subprocess.run([sys.executable, os.path.abspath(__file__), str(args.rows), "--child"], env=env, check=False)
+
+
+if __name__ == "__main__":
+    main()
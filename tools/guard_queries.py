@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Pathological queries against the console's query cost guard (queryguard.py).
+
+Fills a scratch host (guard-bench) with ROWS stats rows unless the table
+already holds that many (and process_stats, a WITHOUT ROWID table on SQLite,
+with ROWS / 10 top-process rows), then starts roles/python_app/files/sql_console.py on a
+local port twice:
+  explain   default thresholds: each query below is sent once through
+            POST /api/query; shows status, latency and the guard's verdict
+            (rejected by EXPLAIN, run with warnings, stopped by the time limit)
+  admission QUERY_MAX_ROWS raised so the EXPLAIN check lets everything through:
+            --burst clients send expensive full-scan queries at once, while a
+            collector-like writer inserts one row every 100 ms; shows how many
+            were admitted, queued or refused with 429 (and the Retry-After
+            values), and the writer's INSERT latency with and without the burst
+The scratch rows are deleted afterwards unless --keep.
+Usage: python tools/guard_queries.py [--rows 3000000] [--burst 16] [--port 8097] [--keep]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import calendar
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+AGENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "roles", "python_app", "files")
+sys.path.insert(0, AGENT_DIR)
+
+import storage  # noqa: E402
+
+HOST_NAME = "guard-bench"
+BATCH = 10000
+
+QUERIES = [
+    ("indexed: latest rows", "SELECT id, cpu_usage, timestamp FROM stats ORDER BY ts DESC LIMIT 100"),
+    ("bare scan, stops at LIMIT", "SELECT id, cpu_usage FROM stats LIMIT 10"),
+    ("filter on unindexed column", "SELECT id, cpu_usage FROM stats WHERE cpu_x100 = 10001 LIMIT 10"),
+    ("ORDER BY unindexed column", "SELECT id, cpu_usage FROM stats ORDER BY mem_x100 DESC LIMIT 10"),
+    ("GROUP BY over every row", "SELECT cpu_x100, COUNT(*) AS n FROM stats GROUP BY cpu_x100 ORDER BY n DESC LIMIT 10"),
+    ("self-join on unindexed columns",
+     "SELECT a.id FROM stats a JOIN stats b ON a.cpu_x100 = b.mem_x100 LIMIT 10"),
+    ("correlated subquery",
+     "SELECT id, (SELECT COUNT(*) FROM stats b WHERE b.cpu_x100 > a.cpu_x100) AS rank FROM stats a LIMIT 10"),
+    ("full scan of process_stats",
+     "SELECT name, COUNT(*) AS n, MAX(cpu_pct) AS cpu FROM process_stats GROUP BY name ORDER BY cpu DESC LIMIT 10"),
+    ("self-join on process name",
+     "SELECT a.pid, b.pid FROM process_stats a JOIN process_stats b ON a.name = b.name LIMIT 10"),
+]
+PROCESS_NAMES = ["python3", "mysqld", "nginx", "sshd", "systemd", "gunicorn", "cron", "rsyslogd"]
+
+
+def db():
+    return storage.connect(host=os.getenv("DB_HOST", "127.0.0.1"), user=os.getenv("DB_USER", "devops"),
+                           password=os.getenv("DB_PASS", ""), database=os.getenv("DB_NAME", "syslogs"))
+
+
+def fill(conn, rows):
+    with conn.cursor() as cur:
+        cur.execute(storage.INSERT_IGNORE + " INTO hosts (name) VALUES (%s)", (HOST_NAME,))
+        cur.execute("SELECT id FROM hosts WHERE name = %s", (HOST_NAME,))
+        hid = cur.fetchone()[0]
+        cur.execute("SELECT COUNT(*) FROM stats")
+        missing = rows - cur.fetchone()[0]
+        t0 = calendar.timegm(datetime.utcnow().timetuple()) - max(0, missing)
+        for i in range(0, max(0, missing), BATCH):
+            n = min(BATCH, missing - i)
+            cur.executemany("INSERT INTO stats (host_id, ts, cpu_x100, mem_x100) VALUES (%s, %s, %s, %s)",
+                            [(hid, t0 + i + k, (i + k) * 7919 % 10000, (i + k) * 104729 % 10000) for k in range(n)])
+        cur.execute("SELECT COUNT(*) FROM process_stats")
+        procs = rows // 10 - cur.fetchone()[0]
+        for i in range(0, max(0, procs), BATCH):
+            cur.executemany("INSERT INTO process_stats (host_id, timestamp, pid, name, cpu_pct, rss_kb) "
+                            "VALUES (%s, %s, %s, %s, %s, %s)",
+                            [(hid, datetime.utcfromtimestamp(t0 + (i + k) // 5).strftime("%Y-%m-%d %H:%M:%S"),
+                              1000 + (i + k) % 5 + (i + k) // 5 % 997 * 5, PROCESS_NAMES[(i + k) % 8],
+                              (i + k) * 7919 % 10000 / 100, (i + k) * 104729 % 500000)
+                             for k in range(min(BATCH, procs - i))])
+    return hid, max(0, missing)
+
+
+def post(base, sql, timeout=120):
+    req = urllib.request.Request(base + "/api/query", data=json.dumps({"sql": sql}).encode(),
+                                 headers={"Content-Type": "application/json"})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as r:
+            status, body, retry = r.status, json.loads(r.read()), None
+    except urllib.error.HTTPError as e:
+        status, body, retry = e.code, json.loads(e.read() or b"{}"), e.headers.get("Retry-After")
+    return status, time.perf_counter() - started, body, retry
+
+
+def start_console(port, env):
+    env = dict(os.environ, APP_PORT=str(port), QUERY_CACHE="0", **env)
+    proc = subprocess.Popen([sys.executable, "sql_console.py"], cwd=AGENT_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/api/guard", timeout=1).read()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    sys.exit("console did not come up")
+
+
+def explain_phase(port):
+    proc = start_console(port, {})
+    try:
+        print(f"{'query':<32} {'status':>6} {'ms':>8}  verdict")
+        for label, sql in QUERIES:
+            status, elapsed, body, _ = post(f"http://127.0.0.1:{port}", sql)
+            verdict = body.get("error") or ("; ".join(body["warnings"]) if body.get("warnings") else "ok")
+            print(f"{label:<32} {status:>6} {elapsed * 1000:>8.0f}  {verdict[:110]}")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def writer_latencies(conn, hid, stop, out):
+    with conn.cursor() as cur:
+        while not stop.is_set():
+            started = time.perf_counter()
+            cur.execute("INSERT INTO stats (host_id, ts, cpu_x100, mem_x100) VALUES (%s, %s, 0, 0)",
+                        (hid, calendar.timegm(datetime.utcnow().timetuple())))
+            out.append(time.perf_counter() - started)
+            time.sleep(0.1)
+
+
+def admission_phase(port, conn, hid, burst):
+    proc = start_console(port, {"QUERY_MAX_ROWS": str(10 ** 15)})
+    base = f"http://127.0.0.1:{port}"
+    try:
+        idle, busy = [], []
+        stop = threading.Event()
+        w = threading.Thread(target=writer_latencies, args=(conn, hid, stop, idle))
+        w.start()
+        time.sleep(3)
+        stop.set()
+        w.join()
+
+        results = []
+
+        def client(i):
+            # distinct literals, so no two clients share a cached or coalesced result
+            results.append(post(base, f"SELECT cpu_x100 % {97 + i} AS k, COUNT(*) AS n FROM stats "
+                                      f"GROUP BY k ORDER BY n DESC LIMIT 5"))
+
+        stop = threading.Event()
+        w = threading.Thread(target=writer_latencies, args=(conn, hid, stop, busy))
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(burst)]
+        started = time.perf_counter()
+        w.start()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - started
+        stop.set()
+        w.join()
+        guard = json.loads(urllib.request.urlopen(base + "/api/guard").read())
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    by_status = {}
+    for status, elapsed, body, retry in results:
+        by_status.setdefault(status, []).append((elapsed, retry, body.get("error", "")))
+    print(f"\n{burst} concurrent expensive queries in {wall:.1f}s "
+          f"(QUERY_CONCURRENCY={guard['max_concurrent']}, avg query {guard['avg_ms']} ms):")
+    for status, items in sorted(by_status.items()):
+        ms = sorted(e * 1000 for e, _, _ in items)
+        retries = sorted({r for _, r, _ in items if r})
+        note = f"Retry-After {','.join(retries)}s" if retries else (items[0][2][:60] if items[0][2] else "")
+        print(f"  {status}: {len(items):>3}  latency p50 {ms[len(ms) // 2]:.0f} ms, max {ms[-1]:.0f} ms  {note}")
+    pct = lambda v, p: sorted(v)[min(len(v) - 1, int(p * len(v)))] * 1000 if v else float("nan")
+    print(f"writer INSERT latency  idle p50 {pct(idle, .5):.1f} ms p99 {pct(idle, .99):.1f} ms  |  "
+          f"under burst p50 {pct(busy, .5):.1f} ms p99 {pct(busy, .99):.1f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=3000000)
+    ap.add_argument("--burst", type=int, default=16)
+    ap.add_argument("--port", type=int, default=8097)
+    ap.add_argument("--keep", action="store_true", help="keep the scratch rows for another run")
+    args = ap.parse_args()
+    conn = db()
+    try:
+        started = time.perf_counter()
+        hid, added = fill(conn, args.rows)
+        if added:
+            print(f"inserted {added} scratch rows in {time.perf_counter() - started:.0f}s")
+        explain_phase(args.port)
+        admission_phase(args.port, conn, hid, args.burst)
+    finally:
+        if not args.keep:
+            with conn.cursor() as cur:
+                for table in ("stats", "process_stats"):
+                    cur.execute(f"DELETE FROM {table} WHERE host_id = (SELECT id FROM hosts WHERE name = %s)",
+                                (HOST_NAME,))
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Render latency and PNG cache hit rate of the legacy console's charts
+(tools/sql_console.py, charts.py) under concurrent requests.
+
+Starts tools/sql_console.py on a local port once per mode:
+  cache     rendered PNGs reused until the stats high-water mark moves
+  no cache  CHART_CACHE=0: every request queries and renders
+and points CLIENTS threads at /chart/line and /chart/pie for SECONDS each,
+picking uniformly among --hosts (plus "all hosts") and two point counts, as
+several dashboards open on the same few charts would. Meanwhile one stats row
+is inserted every --collect seconds, like an agent, so cached charts go stale
+on schedule.
+
+Reports requests/s and p50/p99 latency per chart, then the server's render
+counters (/chart/stats): renders, mean/max render time, mean wait for a render
+thread and the cache hit ratio.
+Usage: python tools/load_charts.py [--clients 16] [--seconds 20] [--collect 15] [--hosts a,b]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import subprocess
+import urllib.parse
+import urllib.request
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+AGENT_DIR = os.path.join(TOOLS_DIR, "..", "roles", "python_app", "files")
+sys.path.insert(0, AGENT_DIR)
+
+import storage  # noqa: E402
+
+MODES = [("cache", {}), ("no cache", {"CHART_CACHE": "0"})]
+
+
+def get(url, timeout=60):
+    with urllib.request.urlopen(url, timeout=timeout) as r:
+        return r.read()
+
+
+def start_console(port, overrides):
+    env = dict(os.environ, APP_HOST="127.0.0.1", APP_PORT=str(port), **overrides)
+    proc = subprocess.Popen([sys.executable, "sql_console.py"], cwd=TOOLS_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(200):
+        try:
+            get(f"http://127.0.0.1:{port}/chart/stats", timeout=1)
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    sys.exit("console did not come up")
+
+
+def collector(stop, every):
+    conn = storage.connect(host=os.getenv("DB_HOST", "127.0.0.1"), user=os.getenv("DB_USER", "devops"),
+                           password=os.getenv("DB_PASS", ""), database=os.getenv("DB_NAME", "syslogs"))
+    try:
+        while not stop.wait(every):
+            with conn.cursor() as cur:
+                cur.execute("INSERT INTO stats (host_id, ts, cpu_x100, mem_x100) VALUES (%s, %s, %s, %s)",
+                            (0, int(time.time()), random.randint(0, 10000), random.randint(0, 10000)))
+    finally:
+        conn.close()
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] * 1000 if values else float("nan")
+
+
+def run(port, label, overrides, args):
+    proc = start_console(port, overrides)
+    base = f"http://127.0.0.1:{port}"
+    hosts = [""] + [h for h in args.hosts.split(",") if h]
+    lat = {"line": [], "pie": []}
+    errors = [0]
+    stop = threading.Event()
+
+    def client():
+        while not stop.is_set():
+            host = urllib.parse.quote(random.choice(hosts))
+            chart = random.choice(("line", "line", "pie"))
+            url = f"{base}/chart/line?points={random.choice((120, 360))}&host={host}" if chart == "line" \
+                else f"{base}/chart/pie?host={host}"
+            started = time.perf_counter()
+            try:
+                get(url)
+                lat[chart].append(time.perf_counter() - started)
+            except OSError:
+                errors[0] += 1
+
+    try:
+        threads = [threading.Thread(target=collector, args=(stop, args.collect), daemon=True)]
+        threads += [threading.Thread(target=client, daemon=True) for _ in range(args.clients)]
+        for t in threads:
+            t.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        st = json.loads(get(base + "/chart/stats"))
+    finally:
+        proc.terminate()
+        proc.wait()
+    for chart, values in lat.items():
+        print(f"{label:<9} {chart:<5} {len(values) / args.seconds:>8.1f} {pct(values, 0.5):>8.1f} "
+              f"{pct(values, 0.99):>8.1f}")
+    print(f"{'':<9} renders {st['renders']}, render avg {st['render_avg_ms']} ms / max {st['render_max_ms']} ms, "
+          f"queue avg {st['queue_avg_ms']} ms, hit ratio {st['cache']['hit_ratio']}, errors {errors[0]}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--clients", type=int, default=16)
+    ap.add_argument("--seconds", type=float, default=20)
+    ap.add_argument("--collect", type=float, default=15)
+    ap.add_argument("--hosts", default="")
+    ap.add_argument("--port", type=int, default=8097)
+    args = ap.parse_args()
+    print(f"{'mode':<9} {'chart':<5} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for label, overrides in MODES:
+        run(args.port, label, overrides, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Load test for the console's DB connection pool (dbpool.py) and result cache
+(resultcache.py).
+
+Starts roles/python_app/files/sql_console.py on a local port once per mode:
+  no pool    DB_POOL_MAX=0, QUERY_CACHE=0 (a connection and a query per request)
+  pool       pooled connections, QUERY_CACHE=0
+  pool+cache pooled connections and the shared result cache
+and points CLIENTS polling threads at GET /api/query for SECONDS each; a list
+of client counts (--clients 10,50,200) shows how DB load scales with viewers.
+Reports request latency (p50/p95/p99), DB queries and new DB connections per
+second and the peak/mean number of server connections (MySQL
+Threads_connected, sampled every 200 ms; pool size on SQLite).
+Usage: python tools/load_console.py [--clients 20] [--seconds 20] [--port 8099]
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import threading
+import subprocess
+import urllib.request
+
+AGENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "roles", "python_app", "files")
+sys.path.insert(0, AGENT_DIR)
+
+import storage  # noqa: E402
+
+
+def get(url, timeout=10):
+    with urllib.request.urlopen(url, timeout=timeout) as r:
+        return r.read()
+
+
+MODES = [
+    ("no pool", {"DB_POOL_MAX": "0", "QUERY_CACHE": "0"}),
+    ("pool", {"QUERY_CACHE": "0"}),
+    ("pool+cache", {"QUERY_CACHE": "1"}),
+]
+
+
+def start_console(port, overrides):
+    env = dict(os.environ, APP_PORT=str(port), **overrides)
+    proc = subprocess.Popen([sys.executable, "sql_console.py"], cwd=AGENT_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            get(f"http://127.0.0.1:{port}/api/pool", timeout=1)
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    sys.exit("console did not come up")
+
+
+def server_status(conn, name):
+    with conn.cursor() as cur:
+        cur.execute(f"SHOW GLOBAL STATUS LIKE '{name}'")
+        return int(cur.fetchone()[1])
+
+
+def run(port, label, overrides, clients, seconds):
+    proc = start_console(port, overrides)
+    base = f"http://127.0.0.1:{port}"
+    mysql = storage.BACKEND == "mysql"
+    mon = storage.connect(host=os.getenv("DB_HOST", "127.0.0.1"), user=os.getenv("DB_USER", "devops"),
+                          password=os.getenv("DB_PASS", ""), database=os.getenv("DB_NAME", "syslogs"))
+    try:
+        connects0 = server_status(mon, "Connections") if mysql else 0
+        questions0 = server_status(mon, "Questions") if mysql else 0
+        stop = threading.Event()
+        latencies, errors, open_conns = [], [0], []
+
+        def client():
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    get(base + "/api/query")
+                    latencies.append(time.perf_counter() - started)
+                except OSError:
+                    errors[0] += 1
+
+        def monitor():
+            while not stop.is_set():
+                if mysql:
+                    open_conns.append(server_status(mon, "Threads_connected"))
+                else:
+                    open_conns.append(json.loads(get(base + "/api/pool"))["size"])
+                time.sleep(0.2)
+
+        threads = [threading.Thread(target=client) for _ in range(clients)] + [threading.Thread(target=monitor)]
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+
+        pool = json.loads(get(base + "/api/pool"))
+        cache = json.loads(get(base + "/api/cache"))
+        connects = (server_status(mon, "Connections") - connects0) if mysql else pool["created"]
+        if mysql:
+            # minus this script's own SHOW STATUS statements
+            queries = server_status(mon, "Questions") - questions0 - len(open_conns) - 4
+        elif overrides.get("QUERY_CACHE") == "1":
+            queries = cache["misses"] + cache["watermark_checks"]
+        else:
+            queries = len(latencies) + errors[0]
+    finally:
+        mon.close()
+        proc.terminate()
+        proc.wait()
+
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else float("nan")
+    print(f"{label:<10} {clients:>7} {len(latencies) / seconds:>8.0f} {pct(0.5):>8.1f} {pct(0.95):>8.1f} "
+          f"{pct(0.99):>8.1f} {queries / seconds:>8.1f} {connects / seconds:>10.1f} {max(open_conns, default=0):>6} "
+          f"{sum(open_conns) / max(1, len(open_conns)):>6.1f} {errors[0]:>6}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--clients", default="20", help="client count, or a comma-separated list")
+    ap.add_argument("--seconds", type=float, default=20)
+    ap.add_argument("--port", type=int, default=8099)
+    args = ap.parse_args()
+    print(f"{'mode':<10} {'clients':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'db q/s':>8} {'connect/s':>10} {'peak':>6} {'mean':>6} {'errors':>6}")
+    for clients in [int(c) for c in args.clients.split(",")]:
+        for label, overrides in MODES:
+            run(args.port, label, overrides, clients, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
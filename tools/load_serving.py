@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Latency of the console under concurrent dashboard pollers, per serving mode.
+
+Starts roles/python_app/files/sql_console.py on a local port once per
+CONSOLE_SERVER mode (dev: Flask's development server; gthread and gevent:
+gunicorn with --workers) and runs POLLERS concurrent pollers against it for
+SECONDS each. A poller behaves like a dashboard with live refresh on an
+ad-hoc query: every --interval seconds it re-runs the query (GET
+/api/query?sql=...&format=columnar, revalidating with If-None-Match as the browser
+does) and refreshes the KPI cards (GET /api/summary). Each request opens its
+own connection (Connection: close).
+
+With --streams N, N more clients each hold GET /api/stream open for the whole
+run, as live dashboards do; "streams" reports how many the server accepted
+(gthread refuses them with 503 by default, CONSOLE_SSE=1 forces them on to
+show what one held thread per stream costs the pollers).
+
+Pollers are asyncio tasks in this one process, so hundreds of them do not cost
+client threads. Reports requests/s, p50/p99/max latency and errors
+(connection failures, timeouts and non-2xx/304 responses).
+Usage: python tools/load_serving.py [--pollers 10,100,500] [--modes dev,gthread,gevent]
+                                    [--workers 4] [--threads 8] [--seconds 20] [--interval 1]
+                                    [--streams 0]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+import urllib.parse
+import urllib.request
+
+AGENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "roles", "python_app", "files")
+
+QUERY = "SELECT id, memory_usage, cpu_usage, timestamp FROM stats WHERE ts >= UNIX_TIMESTAMP() - 3600 ORDER BY ts DESC LIMIT 100"
+QUERY_PATH = "/api/query?" + urllib.parse.urlencode({"sql": QUERY, "format": "columnar"})
+
+
+def start_console(port, mode, workers, threads):
+    env = dict(os.environ, APP_HOST="127.0.0.1", APP_PORT=str(port), CONSOLE_SERVER=mode,
+               CONSOLE_WORKERS=str(workers), CONSOLE_THREADS=str(threads))
+    proc = subprocess.Popen([sys.executable, "sql_console.py"], cwd=AGENT_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(200):
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/api/pool", timeout=1).read()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    sys.exit(f"console ({mode}) did not come up")
+
+
+async def request(port, path, etag=None, timeout=30):
+    reader, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", port), timeout)
+    try:
+        head = f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nAccept-Encoding: gzip\r\nConnection: close\r\n"
+        if etag:
+            head += f"If-None-Match: {etag}\r\n"
+        writer.write((head + "\r\n").encode())
+        await writer.drain()
+        data = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    status_line, _, rest = data.partition(b"\r\n")
+    status = int(status_line.split()[1])
+    tag = None
+    for line in rest.split(b"\r\n\r\n", 1)[0].split(b"\r\n"):
+        if line.lower().startswith(b"etag:"):
+            tag = line.split(b":", 1)[1].strip().decode()
+    return status, tag
+
+
+async def poller(port, interval, stop_at, latencies, errors):
+    await asyncio.sleep(random.uniform(0, interval))  # spread the pollers over the interval
+    etag = None
+    while time.monotonic() < stop_at:
+        started = time.monotonic()
+        for path in (QUERY_PATH, "/api/summary?window=3600"):
+            t = time.perf_counter()
+            try:
+                status, tag = await request(port, path, etag if path.startswith("/api/query") else None)
+                if status not in (200, 304):
+                    errors.append(status)
+                    continue
+                if path.startswith("/api/query") and tag:
+                    etag = tag
+                latencies.append(time.perf_counter() - t)
+            except (OSError, asyncio.TimeoutError, IndexError, ValueError) as e:
+                errors.append(type(e).__name__)
+        await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+async def stream_holder(port, stop_at, accepted):
+    """Hold GET /api/stream open until stop_at, reading events as a browser would."""
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", port), 10)
+    except (OSError, asyncio.TimeoutError):
+        return
+    try:
+        writer.write(b"GET /api/stream HTTP/1.1\r\nHost: 127.0.0.1\r\nAccept: text/event-stream\r\n\r\n")
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), 10)
+        if b" 200 " not in status_line:
+            return
+        accepted.append(1)
+        while time.monotonic() < stop_at:
+            try:
+                if not await asyncio.wait_for(reader.read(4096), max(0.1, stop_at - time.monotonic())):
+                    return
+            except asyncio.TimeoutError:
+                pass
+    except (OSError, asyncio.TimeoutError):
+        pass
+    finally:
+        writer.close()
+
+
+def run(port, mode, pollers, workers, threads, seconds, interval, streams):
+    proc = start_console(port, mode, workers, threads)
+    accepted = []
+    try:
+        latencies, errors = [], []
+        started = time.monotonic()
+
+        async def main():
+            stop_at = time.monotonic() + seconds
+            holders = [asyncio.create_task(stream_holder(port, stop_at, accepted)) for _ in range(streams)]
+            await asyncio.sleep(0.5 if streams else 0)  # streams open before the pollers start
+            await asyncio.gather(*(poller(port, interval, stop_at, latencies, errors) for _ in range(pollers)),
+                                 *holders)
+
+        asyncio.run(main())
+        wall = time.monotonic() - started
+    finally:
+        proc.terminate()
+        proc.wait()
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else float("nan")
+    kinds = {}
+    for e in errors:
+        kinds[e] = kinds.get(e, 0) + 1
+    print(f"{mode:<8} {pollers:>7} {f'{len(accepted)}/{streams}':>8} {len(latencies) / wall:>8.0f} "
+          f"{pct(0.5):>8.1f} {pct(0.99):>9.1f} {pct(1.0):>9.1f} {len(errors):>7}  "
+          f"{', '.join(f'{k}: {v}' for k, v in kinds.items())}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pollers", default="10,100,500")
+    ap.add_argument("--modes", default="dev,gthread,gevent")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--streams", type=int, default=0)
+    ap.add_argument("--seconds", type=float, default=20)
+    ap.add_argument("--interval", type=float, default=1.0)
+    ap.add_argument("--port", type=int, default=8096)
+    args = ap.parse_args()
+    print(f"{'mode':<8} {'pollers':>7} {'streams':>8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>9} {'max ms':>9} {'errors':>7}")
+    for n in [int(p) for p in args.pollers.split(",")]:
+        for mode in args.modes.split(","):
+            run(args.port, mode, n, args.workers, args.threads, args.seconds, args.interval, args.streams)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Load test for the console's server-sent event stream (/api/stream, stream.py).
+
+Starts roles/python_app/files/sql_console.py on a local port, opens SUBSCRIBERS
+concurrent /api/stream connections (every --host-share'th one filtered to the
+scratch host, the rest unfiltered) and inserts a row for a scratch host
+(load-stream) every --interval seconds for --seconds. Reports:
+  - console memory per subscriber: RSS (/proc/<pid>/status) with everyone
+    connected, minus RSS with one subscriber, divided by the extra subscribers
+  - fan-out latency: event receipt minus the poller's query time (polled_at),
+    and end-to-end latency from the INSERT to receipt (p50/p95/p99/max)
+  - events delivered and missed, and the poller's DB queries per second, which
+    stay flat however many subscribers are connected
+Subscribers are plain sockets on one selector thread, so the client side stays
+cheap at hundreds of connections. The scratch rows are deleted afterwards.
+Usage: python tools/load_stream.py [--subscribers 100,300] [--seconds 20] [--port 8098]
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import calendar
+import selectors
+import threading
+import subprocess
+import urllib.request
+from datetime import datetime
+
+AGENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "roles", "python_app", "files")
+sys.path.insert(0, AGENT_DIR)
+
+import storage  # noqa: E402
+
+HOST_NAME = "load-stream"
+
+
+def get(url, timeout=10):
+    with urllib.request.urlopen(url, timeout=timeout) as r:
+        return r.read()
+
+
+def rss_kb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def start_console(port, poll):
+    env = dict(os.environ, APP_PORT=str(port), STREAM_POLL=str(poll))
+    proc = subprocess.Popen([sys.executable, "sql_console.py"], cwd=AGENT_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            get(f"http://127.0.0.1:{port}/api/stream/stats", timeout=1)
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    sys.exit("console did not come up")
+
+
+class Subscribers:
+    """SSE clients on one selector: records (receive time, polled_at, last id) per event."""
+
+    def __init__(self, port):
+        self.port = port
+        self.sel = selectors.DefaultSelector()
+        self.events = []  # (received, polled_at, ids)
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def open(self, host=""):
+        s = socket.create_connection(("127.0.0.1", self.port))
+        path = "/api/stream" + (f"?host={host}" if host else "")
+        # HTTP/1.0: the body arrives unchunked, so events can be split on blank lines
+        s.sendall(f"GET {path} HTTP/1.0\r\nHost: 127.0.0.1\r\nAccept: text/event-stream\r\n\r\n".encode())
+        s.setblocking(False)
+        self.sel.register(s, selectors.EVENT_READ, {"buf": b""})
+
+    def _loop(self):
+        while not self.stop.is_set():
+            for key, _ in self.sel.select(timeout=0.2):
+                try:
+                    chunk = key.fileobj.recv(65536)
+                except BlockingIOError:
+                    continue
+                if not chunk:
+                    self.sel.unregister(key.fileobj)
+                    key.fileobj.close()
+                    continue
+                now = time.time()
+                key.data["buf"] += chunk
+                *events, key.data["buf"] = key.data["buf"].split(b"\n\n")
+                for ev in events:
+                    for line in ev.split(b"\n"):
+                        if line.startswith(b"data: "):
+                            data = json.loads(line[6:])
+                            with self.lock:
+                                self.events.append((now, data["polled_at"], [r["id"] for r in data["rows"]]))
+
+    def close(self):
+        self.stop.set()
+        self.thread.join()
+        for key in list(self.sel.get_map().values()):
+            key.fileobj.close()
+
+    @property
+    def connected(self):
+        return len(self.sel.get_map())
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] * 1000 if values else float("nan")
+
+
+def run(port, n, seconds, interval, poll, host_share):
+    conn = storage.connect(host=os.getenv("DB_HOST", "127.0.0.1"), user=os.getenv("DB_USER", "devops"),
+                           password=os.getenv("DB_PASS", ""), database=os.getenv("DB_NAME", "syslogs"))
+    with conn.cursor() as cur:
+        cur.execute(storage.INSERT_IGNORE + " INTO hosts (name) VALUES (%s)", (HOST_NAME,))
+        cur.execute("SELECT id FROM hosts WHERE name = %s", (HOST_NAME,))
+        hid = cur.fetchone()[0]
+
+    proc = start_console(port, poll)
+    base = f"http://127.0.0.1:{port}"
+    subs = Subscribers(port)
+    inserted = {}  # stats.id -> insert time
+    try:
+        subs.open()
+        time.sleep(poll * 2 + 0.5)  # poller thread started, cursor initialised
+        rss_one = rss_kb(proc.pid)
+        for i in range(1, n):
+            subs.open(HOST_NAME if host_share and i % host_share == 0 else "")
+        time.sleep(1.0)
+        stats0 = json.loads(get(base + "/api/stream/stats"))
+        started = time.time()
+        with conn.cursor() as cur:
+            while time.time() - started < seconds:
+                ts = calendar.timegm(datetime.utcnow().timetuple())
+                cur.execute("INSERT INTO stats (host_id, ts, cpu_x100, mem_x100) VALUES (%s, %s, %s, %s)",
+                            (hid, ts, 1234, 5678))
+                cur.execute("SELECT MAX(id) FROM stats WHERE host_id = %s", (hid,))
+                inserted[cur.fetchone()[0]] = time.time()
+                time.sleep(interval)
+        time.sleep(poll * 2 + 0.5)
+        rss_all = rss_kb(proc.pid)
+        stats1 = json.loads(get(base + "/api/stream/stats"))
+        elapsed = time.time() - started
+        connected = subs.connected
+    finally:
+        subs.close()
+        proc.terminate()
+        proc.wait()
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM stats WHERE host_id = %s", (hid,))
+        conn.close()
+
+    with subs.lock:
+        events = list(subs.events)
+    fanout = [recv - polled for recv, polled, _ in events]
+    e2e = [recv - inserted[i] for recv, _, ids in events for i in ids if i in inserted]
+    expected = len(inserted) * n
+    delivered = sum(1 for _, _, ids in events for i in ids if i in inserted)
+    polls = (stats1["polls"] - stats0["polls"]) / elapsed
+    print(f"{n:>6} {connected:>6} {(rss_all - rss_one) / max(1, n - 1):>9.1f} {pct(fanout, 0.5):>8.1f} "
+          f"{pct(fanout, 0.95):>8.1f} {pct(fanout, 0.99):>8.1f} {pct(fanout, 1.0):>8.1f} {pct(e2e, 0.5):>8.1f} "
+          f"{pct(e2e, 0.99):>8.1f} {delivered:>9}/{expected:<9} {stats1['dropped']:>7} {polls:>7.2f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--subscribers", default="100,300", help="subscriber count, or a comma-separated list")
+    ap.add_argument("--seconds", type=float, default=20)
+    ap.add_argument("--interval", type=float, default=0.5, help="seconds between inserted rows")
+    ap.add_argument("--poll", type=float, default=1.0, help="STREAM_POLL for the console")
+    ap.add_argument("--host-share", type=int, default=4, help="every Nth subscriber filters on the scratch host (0: none)")
+    ap.add_argument("--port", type=int, default=8098)
+    args = ap.parse_args()
+    print(f"{'subs':>6} {'conn':>6} {'KiB/sub':>9} {'fan p50':>8} {'fan p95':>8} {'fan p99':>8} {'fan max':>8} "
+          f"{'e2e p50':>8} {'e2e p99':>8} {'delivered/expected':>19} {'dropped':>7} {'polls/s':>7}")
+    for n in [int(c) for c in args.subscribers.split(",")]:
+        run(args.port, n, args.seconds, args.interval, args.poll, args.host_share)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-import os, csv, pymysql
+import os, sys, csv, calendar
 import matplotlib
 matplotlib.use("Agg")
 import matplotlib.pyplot as plt
@@ -9,33 +9,102 @@ DB_USER=os.getenv("DB_USER","devops")
 DB_PASS=os.getenv("DB_PASS","DevOpsPass456")
 DB_NAME=os.getenv("DB_NAME","syslogs")
 POINTS=int(os.getenv("POINTS","120"))
+HOST=os.getenv("SNAPSHOT_HOST","")  # hosts.name; empty = all hosts
+WINDOW_HOURS=int(os.getenv("WINDOW_HOURS","24"))  # > 24: POINTS buckets from the rollups
+END=os.getenv("SNAPSHOT_END","")  # UTC "YYYY-MM-DD[ HH:MM:SS]"; empty = now
+ARCHIVE_DIR=os.getenv("ARCHIVE_DIR","")  # columnar archive (archive.py): archived days skip the DB
+# raw windows (<= 24h): every row is read, then POINTS are picked by lttb or
+# minmax (WIDTH > 0: min/max per pixel column); none = the latest POINTS rows
+DOWNSAMPLE=os.getenv("DOWNSAMPLE","lttb")
+WIDTH=int(os.getenv("WIDTH","0"))
+
+# MySQL, or DB_BACKEND=sqlite + SQLITE_PATH for a local file (storage.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "roles", "python_app", "files"))
+import storage
 
 out_dir="artifacts"
 os.makedirs(out_dir, exist_ok=True)
 
-conn = pymysql.connect(host=DB_HOST, user=DB_USER, password=DB_PASS,
-                       database=DB_NAME, autocommit=True, connect_timeout=5)
-with conn.cursor() as cur:
-    cur.execute("""
-        SELECT timestamp, cpu_usage, memory_usage
-        FROM stats
-        WHERE timestamp >= NOW() - INTERVAL 1 DAY
-        ORDER BY timestamp DESC
-        LIMIT %s
-    """, (POINTS,))
-    data = cur.fetchall()
-conn.close()
-
-rows = list(reversed(data))  # oldest -> newest
+end = datetime.fromisoformat(END) if END else datetime.utcnow()
+start = end - timedelta(hours=WINDOW_HOURS)
+
+def pick(rows):
+    """rows (timestamp, cpu, mem) oldest first, downsampled to POINTS (or WIDTH columns)."""
+    if DOWNSAMPLE == "none":
+        return rows
+    import downsample
+    x = [calendar.timegm(r[0].timetuple()) for r in rows]
+    ys = [[float("nan") if r[i] is None else float(r[i]) for r in rows] for i in (1, 2)]
+    return [rows[i] for i in downsample.select(x, ys, points=POINTS, width=WIDTH, method=DOWNSAMPLE)]
+
+def db():
+    return storage.connect(host=DB_HOST, user=DB_USER, password=DB_PASS,
+                           database=DB_NAME, connect_timeout=5)
+
+if WINDOW_HOURS > 24:
+    # long windows: POINTS buckets, not raw rows
+    res = WINDOW_HOURS * 3600 / POINTS
+    buckets = []
+    if ARCHIVE_DIR:
+        # closed days come from the memory-mapped archive, only the rest from the DB
+        import archive
+        arch = archive.Archive(ARCHIVE_DIR)
+        covered = arch.covered_until()
+        if covered and covered > start:
+            step = max(1, int(res))
+            # cut on a bucket boundary so no bucket is split between the two sources
+            split = datetime.utcfromtimestamp(calendar.timegm(min(end, covered).timetuple()) // step * step)
+            if split > start:
+                buckets += arch.series(start, split, res, HOST or None)
+                start = split
+    if start < end:
+        # the coarsest rollup that fits
+        import rollup
+        conn = db()
+        with storage.dict_cursor(conn) as cur:
+            host_id = None
+            if HOST:
+                cur.execute("SELECT id FROM hosts WHERE name = %s", (HOST,))
+                host_id = (cur.fetchone() or {}).get("id", -1)
+            buckets += rollup.series(cur, start, end, res, host_id)
+        conn.close()
+    rows = [(b["t"], b["cpu_avg"], b["mem_avg"]) for b in buckets]
+else:
+    # ts (epoch seconds): with a host the clustered (host_id, ts) key serves the
+    # range, without one idx_ts does
+    host_filter = "AND host_id = (SELECT id FROM hosts WHERE name = %s)" if HOST else ""
+    lo, hi = calendar.timegm(start.timetuple()), calendar.timegm(end.timetuple())
+    params = [lo, hi] + ([HOST] if HOST else [])
+    limit = ""
+    if DOWNSAMPLE == "none":
+        limit = "LIMIT %s"
+        params.append(POINTS)
+    conn = db()
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT timestamp, cpu_usage, memory_usage
+            FROM stats
+            WHERE ts >= %s AND ts < %s {host_filter}
+            ORDER BY ts DESC
+            {limit}
+        """, params)
+        data = cur.fetchall()
+    conn.close()
+    raw = list(reversed(data))  # oldest -> newest
+    rows = pick(raw)
+
 csv_path = os.path.join(out_dir, "stats_snapshot.csv")
 with open(csv_path, "w", newline="") as f:
     w = csv.writer(f)
     w.writerow(["timestamp","cpu_usage","memory_usage"])
     w.writerows(rows)
 
-# simple last-hour plot
-last_hr = [r for r in rows if r[0] >= datetime.utcnow() - timedelta(hours=1)]
-if not last_hr: last_hr = rows
+# simple last-hour plot (whole window for rollup snapshots)
+if WINDOW_HOURS > 24:
+    last_hr = rows
+else:
+    # picked from the hour's raw rows, so the plot keeps POINTS of detail
+    last_hr = pick([r for r in raw if r[0] >= end - timedelta(hours=1)]) or rows
 ts = [r[0] for r in last_hr]
 cpu = [r[1] for r in last_hr]
 mem = [r[2] for r in last_hr]
@@ -46,7 +115,8 @@ plt.plot(ts, mem, label="Mem %")
 plt.legend()
 plt.xlabel("Time (UTC)")
 plt.ylabel("Percent")
-plt.title("System metrics (last hour)")
+span = f"last {WINDOW_HOURS}h" if WINDOW_HOURS > 24 else "last hour"
+plt.title(f"System metrics ({span}{', ' + HOST if HOST else ''})")
 plt.xticks(rotation=30, ha="right")
 plt.tight_layout()
 png_path = os.path.join(out_dir, "stats_last_hour.png")
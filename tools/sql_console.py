@@ -1,17 +1,29 @@
 #!/usr/bin/env python3
 import os
 import io
-import pymysql
-from flask import Flask, request, send_file, render_template_string
-import matplotlib
-matplotlib.use("Agg")  # headless
-import matplotlib.pyplot as plt
+import sys
+from flask import Flask, request, send_file, render_template_string, jsonify
+
+APP_HOST = os.getenv("APP_HOST", "0.0.0.0")
+APP_PORT = int(os.getenv("APP_PORT", "8082"))
 
 DB_HOST = os.getenv("DB_HOST", "127.0.0.1")
 DB_USER = os.getenv("DB_USER", "devops")
 DB_PASS = os.getenv("DB_PASS", "DevOpsPass456")
 DB_NAME = os.getenv("DB_NAME", "syslogs")
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "roles", "python_app", "files"))
+import charts  # noqa: E402
+import dbpool  # noqa: E402
+import downsample  # noqa: E402
+import storage  # noqa: E402
+
+# chart PNGs: rendered on CHART_WORKERS threads, reused until the next collection
+# (CHART_CACHE=0 renders every request)
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", "2"))
+CHART_CACHE = int(os.getenv("CHART_CACHE", "128"))
+COLLECT_INTERVAL = float(os.getenv("COLLECT_INTERVAL", "15"))
+
 app = Flask(__name__)
 
 PAGE = """
@@ -25,22 +37,35 @@ PAGE = """
 <p>Rows: {{ rows|length }}</p>
 {{ table|safe }}
 
-<h2>Charts</h2>
-<p>Last hour (line): <img src="/chart/line?points=120" style="max-width:700px;"/></p>
-<p>Latest point (pie): <img src="/chart/pie" style="max-width:400px;"/></p>
+<h2>Charts{% if host %} ({{ host }}){% endif %}</h2>
+<p>Last hour (line): <img src="/chart/line?points=120&host={{ host|urlencode }}" style="max-width:700px;"/></p>
+<p>Latest point (pie): <img src="/chart/pie?host={{ host|urlencode }}" style="max-width:400px;"/></p>
 """
 
-def _conn():
-    return pymysql.connect(
-        host=DB_HOST, user=DB_USER, password=DB_PASS, database=DB_NAME, autocommit=True
-    )
+# host filter: the scalar subquery is resolved once, then the (host_id, ts) key serves the range
+HOST_FILTER = "host_id = (SELECT id FROM hosts WHERE name = %s)"
+
+# one pool for all requests: connections are reused and always returned
+POOL = dbpool.Pool(
+    lambda: storage.connect(host=DB_HOST, user=DB_USER, password=DB_PASS, database=DB_NAME),
+    max_size=int(os.getenv("DB_POOL_MAX", "4")),
+)
+
+def stats_watermark():
+    with POOL.connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT MAX(id) FROM stats")
+        return cur.fetchone()[0]
+
+# keyed by (chart, points, width, downsample, host) under the stats high-water mark
+CHARTS = charts.Renderer(workers=CHART_WORKERS, ttl=COLLECT_INTERVAL, watermark=stats_watermark,
+                         max_entries=CHART_CACHE)
 
 @app.route("/", methods=["GET", "POST"])
 def index():
-    q = request.form.get("q", "SELECT * FROM stats ORDER BY timestamp DESC LIMIT 20;")
+    q = request.form.get("q", "SELECT * FROM stats ORDER BY ts DESC LIMIT 20;")
     rows, cols, html = [], [], ""
     try:
-        with _conn().cursor() as cur:
+        with POOL.connection() as conn, conn.cursor() as cur:
             cur.execute(q)
             rows = cur.fetchall()
             cols = [d[0] for d in cur.description] if cur.description else []
@@ -56,59 +81,71 @@ def index():
             trs.append(f"<tr>{tds}</tr>")
         html = f"<table border=1 cellpadding=4 cellspacing=0><tr>{th}</tr>{''.join(trs)}</table>"
 
-    return render_template_string(PAGE, q=q, rows=rows, table=html)
-
-@app.get("/chart/line")
-def chart_line():
-    points = int(request.args.get("points", "120"))
-    with _conn().cursor() as cur:
-        cur.execute("""
-            SELECT timestamp, cpu_usage, memory_usage
+    host = request.args.get("host", "")
+    return render_template_string(PAGE, q=q, rows=rows, table=html, host=host)
+
+def line_data(points, host, method="lttb", width=0):
+    """
+    The last hour, downsampled to `points` rows by `method` (or min/max per
+    pixel column with `width`); method "none" plots the first `points` raw rows.
+    """
+    where, params = "ts >= UNIX_TIMESTAMP() - 3600", []
+    if host:
+        where += " AND " + HOST_FILTER
+        params.append(host)
+    limit = "LIMIT %s" if method == "none" else ""
+    if limit:
+        params.append(points)
+    with POOL.connection() as conn, conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT ts, timestamp, cpu_usage, memory_usage
             FROM stats
-            WHERE timestamp >= NOW() - INTERVAL 1 HOUR
-            ORDER BY timestamp ASC
-            LIMIT %s
-        """, (points,))
+            WHERE {where}
+            ORDER BY ts ASC
+            {limit}
+        """, params)
         data = cur.fetchall()
-
-    ts = [r[0] for r in data]
-    cpu = [r[1] for r in data]
-    mem = [r[2] for r in data]
-
-    fig = plt.figure(figsize=(8, 3))
-    plt.plot(ts, cpu, label="CPU %")
-    plt.plot(ts, mem, label="Memory %")
-    plt.legend()
-    plt.xticks(rotation=45, ha="right")
-    plt.tight_layout()
-
-    buf = io.BytesIO()
-    plt.savefig(buf, format="png")
-    plt.close(fig)
-    buf.seek(0)
-    return send_file(buf, mimetype="image/png")
-
-@app.get("/chart/pie")
-def chart_pie():
-    with _conn().cursor() as cur:
-        cur.execute("""
+    if not limit:
+        cpu = [float("nan") if r[2] is None else float(r[2]) for r in data]
+        mem = [float("nan") if r[3] is None else float(r[3]) for r in data]
+        idx = downsample.select([r[0] for r in data], [cpu, mem], points=points, width=width, method=method)
+        data = [data[i] for i in idx]
+    return [r[1] for r in data], [("CPU %", [r[2] for r in data]), ("Memory %", [r[3] for r in data])]
+
+def pie_data(host):
+    where = f"WHERE {HOST_FILTER}" if host else ""
+    with POOL.connection() as conn, conn.cursor() as cur:
+        cur.execute(f"""
             SELECT cpu_usage, memory_usage
             FROM stats
-            ORDER BY timestamp DESC
+            {where}
+            ORDER BY ts DESC
             LIMIT 1
-        """)
+        """, (host,) if host else None)
         row = cur.fetchone() or (0, 0)
-    cpu, mem = row
+    return list(row), ["CPU %", "Memory %"]
 
-    fig = plt.figure(figsize=(3.5, 3.5))
-    plt.pie([cpu, mem], labels=["CPU %", "Memory %"], autopct="%1.1f%%", startangle=140)
-    plt.tight_layout()
+@app.get("/chart/line")
+def chart_line():
+    points = int(request.args.get("points", "120"))
+    width = int(request.args.get("width", "0"))
+    method = request.args.get("downsample", "lttb")
+    if method not in downsample.METHODS + ("none",):
+        return jsonify(error=f"downsample must be one of {', '.join(downsample.METHODS)}, none"), 400
+    host = request.args.get("host", "")
+    png = CHARTS.get(("line", points, width, method, host), lambda: line_data(points, host, method, width),
+                     charts.line_png)
+    return send_file(io.BytesIO(png), mimetype="image/png")
+
+@app.get("/chart/pie")
+def chart_pie():
+    host = request.args.get("host", "")
+    png = CHARTS.get(("pie", host), lambda: pie_data(host), charts.pie_png)
+    return send_file(io.BytesIO(png), mimetype="image/png")
 
-    buf = io.BytesIO()
-    plt.savefig(buf, format="png")
-    plt.close(fig)
-    buf.seek(0)
-    return send_file(buf, mimetype="image/png")
+@app.get("/chart/stats")
+def chart_stats():
+    return jsonify(CHARTS.stats())
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8082)
+    app.run(host=APP_HOST, port=APP_PORT)